@@ -1,11 +1,16 @@
-from typing import Callable, Any, Awaitable, List, Tuple, Union
+from typing import Callable, Any, Awaitable, List, Sequence, Tuple, Type, Union
 from json import JSONDecodeError
 
 import asyncio
+from time import monotonic
 from aiohttp import ClientResponse, ContentTypeError
 
 from multidict import CIMultiDictProxy
 
+from api_test_utils.backoff import full_jitter, retry_after
+from api_test_utils.poll_history import LazyBody, PollHistory
+from api_test_utils.streaming_body import StreamedBody, body_hash, first_bytes, json_path_body, streamed_body
+
 __version__ = "0.0.0"
 
 
@@ -71,12 +76,27 @@ async def auto_load_body(resp: ClientResponse) -> Union[str, dict, list, bytes]:
     return await get_bytes_body(resp)
 
 
+async def lazy_body(resp: ClientResponse) -> LazyBody:
+    """ keep the raw bytes only, decoding is deferred until LazyBody.value is read """
+    return LazyBody(await resp.read(), resp.content_type, resp.charset)
+
+
+def _body_size(response: ClientResponse, body: Any) -> int:
+    if isinstance(body, (bytes, str, LazyBody)):
+        return len(body)
+    if isinstance(body, StreamedBody):
+        return body.size
+    if body is None:
+        return 0
+    return response.content_length or 0
+
+
 class PollTimeoutError(TimeoutError):
     """
         Wraps TimeoutError, but also has a place to hold responses
     """
 
-    def __init__(self, responses: List[Tuple[int, CIMultiDictProxy, Any]]):
+    def __init__(self, responses: Sequence[Tuple[int, CIMultiDictProxy, Any]]):
         self.responses = responses
 
         message = 'no responses received'
@@ -94,8 +114,12 @@ async def poll_until(
     until: Callable[[ClientResponse], Awaitable[bool]] = is_200,
     body_resolver: Callable[[ClientResponse], Awaitable[Any]] = auto_load_body,
     timeout: int = 5,
-    sleep_for: float = 1
-):
+    sleep_for: float = 1,
+    max_history: int = None,
+    max_history_bytes: int = None,
+    max_sleep_for: float = None,
+    retry_on: Tuple[Type[BaseException], ...] = ()
+) -> PollHistory:
     """
         repeat an api request until a specified condition is met or raise a timeout
     Args:
@@ -105,34 +129,49 @@ async def poll_until(
                         e.g.  lambda r: await r.body()
                         set to None not to retrieve the body, obviously retrieving the body will potentially have an
                         overhead, and attempt to parse or load invalid responses will break the polling
+                        for large bodies first_bytes(n), json_path_body(*paths) or body_hash() stop reading early or
+                        never hold the body, until can then decide from streamed_body(r)
 
         timeout: timeout in seconds
         sleep_for: poll frequency in seconds
+        max_history: keep only this many of the most recent responses, None to keep them all
+        max_history_bytes: keep only as many of the most recent responses as fit in this many bytes of body,
+                        use with body_resolver=lazy_body to hold bodies as raw bytes until they are read
+        max_sleep_for: when set the sleep doubles after every attempt, from sleep_for up to max_sleep_for
+        retry_on: exceptions raised by the request which count as an unsuccessful attempt rather than stopping the
+                        polling, e.g. (aiohttp.ClientConnectionError,) while a service starts up
 
     Returns:
-        List[Tuple[int, IMultiDictProxy, Any]]: responses received, (status, headers, body)
+        PollHistory: list of the responses kept, (status, headers, body), plus status counts and latencies
+                     for every response received, PollTimeoutError.responses holds the same
     """
 
-    responses = []
+    responses = PollHistory(max_entries=max_history, max_bytes=max_history_bytes)
 
     async def _poll_until():
 
+        attempt = 0
         while True:
 
-            async with make_request() as response:
+            started = monotonic()
+            try:
+                async with make_request() as response:
+                    latency = monotonic() - started
 
-                body = None
+                    body = None
 
-                if body_resolver is not None:
-                    body = await body_resolver(response)
+                    if body_resolver is not None:
+                        body = await body_resolver(response)
 
-                responses.append((response.status, response.headers, body))
-                should_stop = await until(response)
-                if not should_stop:
-                    await asyncio.sleep(sleep_for)
-                    continue
+                    responses.record(response.status, response.headers, body,
+                                     size=_body_size(response, body), latency=latency)
+                    if await until(response):
+                        return responses
+            except retry_on:
+                pass
 
-                return responses
+            await asyncio.sleep(sleep_for if max_sleep_for is None else min(sleep_for * 2 ** attempt, max_sleep_for))
+            attempt += 1
 
     try:
         return await asyncio.wait_for(_poll_until(), timeout=timeout)
@@ -140,11 +179,141 @@ async def poll_until(
         raise PollTimeoutError(responses) from e
 
 
+class MultiPollTimeoutError(PollTimeoutError):
+    """
+        Raised when polling several targets runs out of time, holds the responses for every target
+        and the indexes of the targets which never met the condition
+    """
+
+    def __init__(self, all_responses: List[List[Tuple[int, CIMultiDictProxy, Any]]], pending: List[int]):
+        self.all_responses = all_responses
+        self.pending = pending
+        super().__init__(all_responses[pending[0]] if pending else [])
+
+
+async def _poll_target(
+    make_request: Callable[[], Awaitable[ClientResponse]],
+    until: Callable[[ClientResponse], Awaitable[bool]],
+    body_resolver: Callable[[ClientResponse], Awaitable[Any]],
+    responses: List[Tuple[int, CIMultiDictProxy, Any]],
+    sleep_for: float,
+    max_sleep_for: float
+):
+    attempt = 0
+    while True:
+
+        async with make_request() as response:
+
+            body = None
+
+            if body_resolver is not None:
+                body = await body_resolver(response)
+
+            responses.append((response.status, response.headers, body))
+            if await until(response):
+                return responses
+
+            delay = retry_after(response.headers)
+
+        await asyncio.sleep(full_jitter(attempt, base=sleep_for, cap=max_sleep_for) if delay is None else delay)
+        attempt += 1
+
+
+async def _poll_many(make_requests, until, body_resolver, timeout, sleep_for, max_sleep_for, return_when):
+    all_responses = [[] for _ in make_requests]
+    tasks = [
+        asyncio.ensure_future(_poll_target(make_request, until, body_resolver, responses, sleep_for, max_sleep_for))
+        for make_request, responses in zip(make_requests, all_responses)
+    ]
+    try:
+        await asyncio.wait(tasks, timeout=timeout, return_when=return_when)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+    satisfied = [not task.cancelled() for task in tasks]
+    return all_responses, satisfied
+
+
+async def poll_until_all(
+    make_requests: Sequence[Callable[[], Awaitable[ClientResponse]]],
+    until: Callable[[ClientResponse], Awaitable[bool]] = is_200,
+    body_resolver: Callable[[ClientResponse], Awaitable[Any]] = auto_load_body,
+    timeout: int = 5,
+    sleep_for: float = 0.1,
+    max_sleep_for: float = 2
+) -> List[List[Tuple[int, CIMultiDictProxy, Any]]]:
+    """
+        poll several api requests concurrently until every one of them meets the condition or raise a timeout,
+        a target stops being polled as soon as it meets the condition, an error raised by any request is raised as
+        soon as it happens
+    Args:
+        make_requests: request factories, e.g. [lambda: session.get('a'), lambda: session.get('b')]
+        until: predicate to evaluate each response, see poll_until
+        body_resolver: factory to resolve the body, see poll_until
+        timeout: timeout in seconds, shared by all the targets
+        sleep_for: base delay in seconds, each target backs off exponentially with full jitter from this
+                   or waits for as long as a Retry-After header asks
+        max_sleep_for: maximum delay in seconds between two requests to one target
+
+    Returns:
+        List[List[Tuple[int, IMultiDictProxy, Any]]]: responses received per target, in the order of make_requests
+    """
+    all_responses, satisfied = await _poll_many(
+        # a target whose request raises stops the polling straight away rather than once the timeout runs out
+        make_requests, until, body_resolver, timeout, sleep_for, max_sleep_for, asyncio.FIRST_EXCEPTION
+    )
+    if not all(satisfied):
+        raise MultiPollTimeoutError(all_responses, [i for i, ok in enumerate(satisfied) if not ok])
+    return all_responses
+
+
+async def poll_until_any(
+    make_requests: Sequence[Callable[[], Awaitable[ClientResponse]]],
+    until: Callable[[ClientResponse], Awaitable[bool]] = is_200,
+    body_resolver: Callable[[ClientResponse], Awaitable[Any]] = auto_load_body,
+    timeout: int = 5,
+    sleep_for: float = 0.1,
+    max_sleep_for: float = 2
+) -> Tuple[int, List[Tuple[int, CIMultiDictProxy, Any]]]:
+    """
+        poll several api requests concurrently until one of them meets the condition or raise a timeout,
+        arguments are the same as for poll_until_all
+
+    Returns:
+        Tuple[int, List[Tuple[int, IMultiDictProxy, Any]]]: index of the first target to meet the condition
+                                                            and the responses it received
+    """
+    all_responses, satisfied = await _poll_many(
+        make_requests, until, body_resolver, timeout, sleep_for, max_sleep_for, asyncio.FIRST_COMPLETED
+    )
+    if not any(satisfied):
+        raise MultiPollTimeoutError(all_responses, list(range(len(make_requests))))
+    index = satisfied.index(True)
+    return index, all_responses[index]
+
+
+class FriendlyError(Exception):
+    """
+        Raised by throw_friendly_error, keeps the status code so callers can tell e.g. a 404 from a 503
+    """
+
+    def __init__(self, message: str, status_code: int):
+        self.status_code = status_code
+        super().__init__(message)
+
+
 def throw_friendly_error(message: str, url: str, status_code: int, response: str, headers: dict) -> Exception:
-    raise Exception(f"\n{'*' * len(message)}\n"
+    raise FriendlyError(f"\n{'*' * len(message)}\n"
                     f"MESSAGE: {message}\n"
                     f"URL: {url}\n"
                     f"STATUS CODE: {status_code}\n"
                     f"RESPONSE: {response}\n"
                     f"HEADERS: {headers}\n"
-                    f"{'*' * len(message)}\n")
+                    f"{'*' * len(message)}\n", status_code)
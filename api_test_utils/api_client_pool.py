@@ -0,0 +1,108 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Dict
+from weakref import WeakKeyDictionary
+
+import aiohttp
+
+from api_test_utils.api_session_client import APISessionClient
+
+
+@dataclass
+class ConnectionReuseStats:
+    """ How often requests through the pool for one base uri found a kept-alive connection to reuse """
+    requests: int = 0
+    connections: int = 0
+    reused: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+
+class ApiClientPool:
+    """
+        Keep-alive connection pools for APISessionClient views, one per event loop and base uri since aiohttp
+        connections belong to the loop which opened them. Each client() is a lightweight session of its own, with
+        its own cookies and default headers, over the shared pool.
+
+        Tests share connections when they run on the same event loop; pytest-asyncio gives each test a fresh loop
+        unless its event_loop fixture is overridden with a wider scope. Pools of loops which have been closed are
+        dropped. Every pytest-xdist worker is a process of its own, so has its own pool.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, keepalive_timeout: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.stats: Dict[str, ConnectionReuseStats] = {}
+        self._connectors: "WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aiohttp.TCPConnector]]" = \
+            WeakKeyDictionary()
+        self._trace_configs: Dict[str, aiohttp.TraceConfig] = {}
+
+    def _trace_config(self, base_uri: str) -> aiohttp.TraceConfig:
+        trace_config = self._trace_configs.get(base_uri)
+        if trace_config is None:
+            stats = self.stats[base_uri] = ConnectionReuseStats()
+
+            async def _on_request_start(session, context, params):  # pylint: disable=unused-argument
+                stats.requests += 1
+
+            async def _on_connection_create_end(session, context, params):  # pylint: disable=unused-argument
+                stats.connections += 1
+
+            async def _on_connection_reuseconn(session, context, params):  # pylint: disable=unused-argument
+                stats.reused += 1
+
+            trace_config = self._trace_configs[base_uri] = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(_on_request_start)
+            trace_config.on_connection_create_end.append(_on_connection_create_end)
+            trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+            trace_config.freeze()
+        return trace_config
+
+    def _connector(self, base_uri: str) -> aiohttp.TCPConnector:
+        for loop in [loop for loop in self._connectors if loop.is_closed()]:
+            # its connections went with it
+            del self._connectors[loop]
+
+        connectors = self._connectors.setdefault(asyncio.get_running_loop(), {})
+        connector = connectors.get(base_uri)
+        if connector is None or connector.closed:
+            connector = connectors[base_uri] = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout
+            )
+        return connector
+
+    def client(self, base_uri: str, **kwargs) -> APISessionClient:
+        """ A client over the pool for the running event loop, closing it leaves the pool's connections open.
+        kwargs are passed to its aiohttp.ClientSession e.g. headers or cookies """
+        return APISessionClient(
+            base_uri,
+            connector=self._connector(base_uri),
+            connector_owner=False,
+            trace_configs=[self._trace_config(base_uri)],
+            **kwargs
+        )
+
+    async def close(self):
+        """ Close the pools of the running event loop """
+        for connector in self._connectors.pop(asyncio.get_running_loop(), {}).values():
+            await connector.close()
+
+    def close_all(self):
+        """ Close the pools of every event loop still open, from outside any running loop """
+        for loop, connectors in list(self._connectors.items()):
+            if not loop.is_closed() and not loop.is_running():
+                for connector in connectors.values():
+                    loop.run_until_complete(connector.close())
+        self._connectors.clear()
+
+    def report(self) -> str:
+        worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+        lines = [f"connection reuse ({worker}):"]
+        for base_uri, stats in self.stats.items():
+            lines.append(f"  {base_uri}: {stats.requests} requests, {stats.connections} connections opened, "
+                         f"{stats.reused} reused ({stats.reuse_ratio:.0%})")
+        return "\n".join(lines)
@@ -1,34 +1,80 @@
-import os
 import asyncio
+import functools
 from types import TracebackType
-from typing import Optional, Type, Any
-from urllib.parse import urlparse
+from typing import Dict, Optional, Type, Any
 
 import aiohttp
 from aiohttp.client import _RequestContextManager
 from aiohttp.typedefs import StrOrURL
+from yarl import URL
+
+from api_test_utils.backoff import full_jitter, retry_after
+from api_test_utils.rate_limiter import RateLimiter
 
 
 class APISessionClient:
     """Wrapper to configuration of a base url for aiohttp session client"""
 
-    def __init__(self, base_uri, **kwargs):
+    # relative urls joined to the base url are memoized, up to this many
+    max_joined_urls = 1024
+
+    def __init__(self, base_uri, session: aiohttp.ClientSession = None, rate_limiter: RateLimiter = None, **kwargs):
         self.base_uri = base_uri
-        self.session = aiohttp.ClientSession(**kwargs)
+        self.rate_limiter = rate_limiter
+        # a session passed in belongs to someone else, closing this client leaves it open
+        self._owns_session = session is None
+        self.session = aiohttp.ClientSession(**kwargs) if session is None else session
+
+    @classmethod
+    def pooled(
+        cls,
+        base_uri,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        **kwargs
+    ) -> "APISessionClient":
+        """Client backed by a keep-alive connection pool, intended to be long lived and shared between requests"""
+        connector = aiohttp.TCPConnector(
+            limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive_timeout
+        )
+        return cls(base_uri, connector=connector, **kwargs)
+
+    def with_base_uri(self, base_uri) -> "APISessionClient":
+        """Client for another base uri sharing this client's session and connection pool"""
+        return APISessionClient(base_uri, session=self.session, rate_limiter=self.rate_limiter)
+
+    @property
+    def base_uri(self) -> str:
+        return self._base_uri
+
+    @base_uri.setter
+    def base_uri(self, base_uri):
+        # parsed once here rather than on every request
+        self._base_uri = str(base_uri)
+        self.base_url = URL(self._base_uri)
+        self._base_prefix = self._base_uri if self._base_uri.endswith("/") else f"{self._base_uri}/"
+        self._joined_urls: Dict[str, URL] = {}
 
     async def __aenter__(self) -> "APISessionClient":
         return self
 
     def _full_url(self, url: StrOrURL) -> StrOrURL:
+        """ url relative to the base uri e.g. apps/my-app, or /apps/my-app relative to its host, as a parsed URL """
         if not isinstance(url, str):
             return url
 
-        parsed = urlparse(url)
-        if parsed.scheme:
-            return url
-
-        url = os.path.join(self.base_uri, url)
-        return url
+        joined = self._joined_urls.get(url)
+        if joined is None:
+            joined = URL(url)
+            if joined.is_absolute():
+                # absolute urls are not worth remembering, there is nothing to join
+                return joined
+            joined = self.base_url.join(joined) if url.startswith("/") else URL(f"{self._base_prefix}{url}")
+            if len(self._joined_urls) >= self.max_joined_urls:
+                self._joined_urls.clear()
+            self._joined_urls[url] = joined
+        return joined
 
     def _request(
         self,
@@ -41,27 +87,65 @@ class APISessionClient:
         **kwargs: Any
     ) -> "aiohttp.client._RequestContextManager":
         uri = self._full_url(url)
+
+        def make_request():
+            return self.session.request(method, uri, *args, allow_redirects=allow_redirects, **kwargs)
+
+        if self.rate_limiter is not None:
+            host = uri.host
+            make_request = functools.partial(self._rate_limited_request, host, make_request)
+
         if allow_retries:
-            resp = _RequestContextManager(self._retry_requests(
-                lambda: self.session.request(
-                    method, uri, *args, allow_redirects=allow_redirects, **kwargs
-                ),
-                max_retries=max_retries
-            ))
+            resp = _RequestContextManager(self._retry_requests(make_request, max_retries=max_retries))
+        elif self.rate_limiter is not None:
+            resp = _RequestContextManager(make_request())
         else:
-            resp = self.session.request(
-                method, uri, *args, allow_redirects=allow_redirects, **kwargs
-            )
+            resp = make_request()
+        return resp
+
+    async def _rate_limited_request(self, host, make_request):
+        started = await self.rate_limiter.acquire(host)
+        try:
+            resp = await make_request()
+        except BaseException:
+            self.rate_limiter.release(host, started)
+            raise
+
+        # the request is in flight until its body has been read and the response released, not just its headers
+        released = False
+        release, close = resp.release, resp.close
+        status, delay = resp.status, retry_after(resp.headers)
+
+        def _release_slot():
+            nonlocal released
+            if not released:
+                released = True
+                self.rate_limiter.release(host, started, status=status, retry_after=delay)
+
+        def _release():
+            _release_slot()
+            return release()
+
+        def _close():
+            _release_slot()
+            return close()
+
+        resp.release, resp.close = _release, _close
         return resp
 
     async def _retry_requests(self, make_request, max_retries):
         retry_codes = {429, 503, 409}
         for retry_number in range(max_retries):
             resp = await make_request()
-            if resp.status in retry_codes:
-                await asyncio.sleep(2**retry_number - 1)
-                continue
-            return resp
+            if resp.status not in retry_codes:
+                return resp
+
+            # released on the last attempt too, or a rate limiter's slot would never be given back
+            delay = retry_after(resp.headers)
+            resp.release()
+            if retry_number < max_retries - 1:
+                # honour the server's Retry-After, otherwise back off with full jitter
+                await asyncio.sleep(full_jitter(retry_number) if delay is None else delay)
         raise TimeoutError("Maximum retry limit hit.")
 
     def get(self, *args, **kwargs):
@@ -77,7 +161,8 @@ class APISessionClient:
         return self._request('DELETE', *args, **kwargs)
 
     async def close(self):
-        await self.session.close()
+        if self._owns_session:
+            await self.session.close()
         return self
 
     async def __aexit__(
@@ -1,16 +1,59 @@
+import asyncio
+from copy import deepcopy
+from dataclasses import dataclass
 from os import environ
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from uuid import uuid4
 
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.rate_limiter import RateLimiter
+from . import env, throw_friendly_error
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """ Outcome of one item of a batch operation, error is set when the item failed """
+    api: "ApigeeApi"
+    result: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class _CachedRead:
+    body: Any
+    etag: Optional[str]
+    fetched_at: float
+
 
 class ApigeeApi:
     """ A parent class to hold reusable methods and shared properties for the different ApigeeApi* classes"""
 
-    def __init__(self, org_name: str = "nhsd-nonprod"):
+    # seconds a read is served from the cache for, 0 always asks the server so changes made elsewhere (a proxy,
+    # another instance) are seen, None serves it until the next write made through this instance. Opt in per
+    # instance or subclass e.g. app.read_cache_ttl = 30. Identical reads in flight at the same time share one
+    # request either way
+    read_cache_ttl: Optional[float] = 0
+    # when asking the server about a cached read send its ETag, so an unchanged body is not transferred again
+    conditional_reads = False
+
+    def __init__(self, org_name: str = "nhsd-nonprod", session: APISessionClient = None):
         self.org_name = org_name
         self.name = f"apim-auto-{uuid4()}"
-        self.base_uri = f"https://api.enterprise.apigee.com/v1/organizations/{self.org_name}/"
+        self.base_uri = f"{env.apigee_api_base_uri()}/organizations/{self.org_name}/"
         self.headers = {'Authorization': f"Bearer {self._get_token()}"}
 
+        # optional long lived session, when set every request reuses its connection pool
+        self.session = session
+
+        self._read_cache: Dict[Tuple[str, str], _CachedRead] = {}
+        self._reads_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._read_generation = 0
+
     @staticmethod
     def _get_token():
         _token = environ.get('APIGEE_API_TOKEN', 'not-set').strip()
@@ -20,3 +63,114 @@ class ApigeeApi:
                                r'https://docs.apigee.com/api-platform/system-administration/using-gettoken'
                                '\n')
         return _token
+
+    @staticmethod
+    def create_pooled_session(
+        org_name: str = "nhsd-nonprod", limit_per_host: int = 10, keepalive_timeout: float = 30,
+        rate_limiter: RateLimiter = None
+    ) -> APISessionClient:
+        """ Create a keep-alive session to share between ApigeeApi* instances, the caller is responsible for
+        closing it e.g. async with ApigeeApi.create_pooled_session() as session: """
+        return APISessionClient.pooled(f"{env.apigee_api_base_uri()}/organizations/{org_name}/",
+                                       limit_per_host=limit_per_host,
+                                       keepalive_timeout=keepalive_timeout,
+                                       rate_limiter=rate_limiter)
+
+    def _session(self, base_uri: str = None) -> APISessionClient:
+        """ Client for a single operation, backed by the shared session when there is one """
+        base_uri = base_uri or self.base_uri
+        if self.session is None:
+            return APISessionClient(base_uri)
+        return self.session.with_base_uri(base_uri)
+
+    def invalidate_reads(self):
+        """ Forget every cached read, the write methods call this so reads never outlive a change made here """
+        self._read_cache.clear()
+        self._reads_in_flight.clear()
+        self._read_generation += 1
+
+    async def _cached_get(self, base_uri: str, uri: str, error_message: str) -> Any:
+        """ GET uri as json through the read cache """
+        key = (base_uri, uri)
+        cached = self._read_cache.get(key)
+        if cached is not None and (
+            self.read_cache_ttl is None or monotonic() - cached.fetched_at < self.read_cache_ttl
+        ):
+            return deepcopy(cached.body)
+
+        task = self._reads_in_flight.get(key)
+        if task is None:
+            task = self._reads_in_flight[key] = asyncio.ensure_future(
+                self._get(base_uri, uri, error_message, key, cached))
+            task.add_done_callback(lambda t: self._read_done(key, t))
+        return deepcopy(await asyncio.shield(task))
+
+    def _read_done(self, key: Tuple[str, str], task: asyncio.Future):
+        # invalidate_reads() may already have let a newer read take its place
+        if self._reads_in_flight.get(key) is task:
+            del self._reads_in_flight[key]
+
+    async def _get(
+        self, base_uri: str, uri: str, error_message: str, key: Tuple[str, str], cached: Optional[_CachedRead]
+    ) -> Any:
+        generation = self._read_generation
+        headers = self.headers
+        if self.conditional_reads and cached is not None and cached.etag:
+            headers = {**headers, "If-None-Match": cached.etag}
+
+        async with self._session(base_uri) as session:
+            async with session.get(uri, headers=headers) as resp:
+                if resp.status == 304 and cached is not None:
+                    read = _CachedRead(cached.body, cached.etag, monotonic())
+                else:
+                    body = await resp.json()
+                    if resp.status != 200:
+                        headers = dict(resp.headers.items())
+                        throw_friendly_error(message=error_message,
+                                             url=resp.url,
+                                             status_code=resp.status,
+                                             response=body,
+                                             headers=headers)
+                    read = _CachedRead(body, resp.headers.get("ETag"), monotonic())
+
+        # a write made while the read was in flight may have changed the resource
+        if generation == self._read_generation:
+            self._read_cache[key] = read
+        return read.body
+
+    @staticmethod
+    async def _run_batch(
+        apis: List["ApigeeApi"],
+        operation: Callable[..., Awaitable[Any]],
+        specs: List[dict],
+        concurrency: int = 10,
+        session: APISessionClient = None
+    ) -> List[BatchResult]:
+        """ Run operation(api, **spec) for every api concurrently, at most concurrency at a time, over one session.
+        When no session is given a pooled one is opened for the batch and the apis get their own session back after """
+        if not apis:
+            return []
+
+        owns_session = session is None
+        if owns_session:
+            session = APISessionClient.pooled(apis[0].base_uri, limit_per_host=concurrency)
+        previous_sessions = [api.session for api in apis]
+        for api in apis:
+            api.session = session
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _run(api, spec):
+            async with semaphore:
+                try:
+                    return BatchResult(api, result=await operation(api, **spec))
+                except Exception as e:  # pylint: disable=broad-except
+                    return BatchResult(api, error=e)
+
+        try:
+            return list(await asyncio.gather(*(_run(api, spec) for api, spec in zip(apis, specs))))
+        finally:
+            if owns_session:
+                await session.close()
+                for api, previous_session in zip(apis, previous_sessions):
+                    api.session = previous_session
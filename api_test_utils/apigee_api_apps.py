@@ -1,20 +1,25 @@
-from api_test_utils.apigee_api import ApigeeApi
+from typing import List
+from api_test_utils.apigee_api import ApigeeApi, BatchResult
 from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.apigee_api_cleanup import Cleanable, cleanup_registry
 from . import throw_friendly_error
 
 
-class ApigeeApiDeveloperApps(ApigeeApi):
+class ApigeeApiDeveloperApps(ApigeeApi, Cleanable):
     """ A simple class to help facilitate CRUD operations for developer apps in Apigee """
 
-    def __init__(self, org_name: str = "nhsd-nonprod", developer_email: str = "apm-testing-internal-dev@nhs.net"):
-        super().__init__(org_name)
+    cleanup_stage = 0
+
+    def __init__(self, org_name: str = "nhsd-nonprod", developer_email: str = "apm-testing-internal-dev@nhs.net",
+                 session: APISessionClient = None):
+        super().__init__(org_name, session=session)
         self.developer_email = developer_email
 
         self.client_id = None
         self.client_secret = None
         self.callback_url = None
 
-        self.app_base_uri = f"{self.base_uri}/developers/{self.developer_email}"
+        self.app_base_uri = f"{self.base_uri}developers/{self.developer_email}"
 
         self.default_params = {
             "org_name": self.org_name,
@@ -25,29 +30,56 @@ class ApigeeApiDeveloperApps(ApigeeApi):
         self, callback_url: str = "http://example.com", status: str = "approved",
         api_products: list = None, custom_attributes: dict = None
     ):
-        await self.create_new_app(callback_url, status)
-        if api_products:
+        body = await self.create_new_app(callback_url, status, api_products, custom_attributes)
+
+        # both normally go in with the create, only fall back to separate requests for what it did not apply
+        credential_products = {p["apiproduct"] for p in body.get("credentials", [{}])[0].get("apiProducts", [])}
+        if api_products and not set(api_products) <= credential_products:
             await self.add_api_product(api_products)
 
-        if custom_attributes:
+        app_attributes = {a["name"]: a["value"] for a in body.get("attributes", [])}
+        if custom_attributes and any(app_attributes.get(k) != str(v) for k, v in custom_attributes.items()):
             await self.set_custom_attributes(custom_attributes)
 
-    async def create_new_app(self, callback_url: str = "http://example.com", status: str = "approved") -> dict:
-        """ Create a new developer app in apigee """
+    def _attributes(self, attributes: dict = None) -> List[dict]:
+        custom_attributes = [{"name": "DisplayName", "value": self.name}]
+        for key, value in (attributes or {}).items():
+            custom_attributes.append({"name": key, "value": value})
+        return custom_attributes
+
+    @classmethod
+    async def setup_many(
+        cls, specs: List[dict], concurrency: int = 10, org_name: str = "nhsd-nonprod",
+        developer_email: str = "apm-testing-internal-dev@nhs.net", session: APISessionClient = None
+    ) -> List[BatchResult]:
+        """ Setup an app per spec concurrently, each spec holds keyword arguments for setup_app
+        e.g. [{"api_products": ["my-product"], "custom_attributes": {"foo": "bar"}}]
+        a failing app is reported in its own result and does not stop the rest of the batch """
+        apps = [cls(org_name, developer_email) for _ in specs]
+        return await cls._run_batch(apps, cls.setup_app, specs, concurrency=concurrency, session=session)
+
+    async def create_new_app(
+        self, callback_url: str = "http://example.com", status: str = "approved",
+        api_products: list = None, custom_attributes: dict = None
+    ) -> dict:
+        """ Create a new developer app in apigee, with its api products and custom attributes when given """
         self.callback_url = callback_url
 
         data = {
-            "attributes": [{"name": "DisplayName", "value": self.name}],
+            "attributes": self._attributes(custom_attributes),
             "callbackUrl": self.callback_url,
             "name": self.name,
             "status": status
         }
+        if api_products:
+            data["apiProducts"] = api_products
 
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.post("apps",
                                     params=self.default_params,
                                     headers=self.headers,
                                     json=data) as resp:
+                self.invalidate_reads()
 
                 if resp.status in {401, 502}:  # 401 is an expired token while 502 is an invalid token
                     raise RuntimeError("Your Apigee token has expired or is invalid")
@@ -64,12 +96,13 @@ class ApigeeApiDeveloperApps(ApigeeApi):
                                          response=body,
                                          headers=headers)
 
+                cleanup_registry.register(self)
                 self.client_id = body["credentials"][0]["consumerKey"]
                 self.client_secret = body["credentials"][0]["consumerSecret"]
                 return body
 
     async def add_api_product(self, api_products: list) -> dict:
-        """ Add a number of API Products to the app """
+        """ Add a number of API Products to the app, the products it already has are kept """
         params = self.default_params.copy()
         params['name'] = self.name
 
@@ -79,11 +112,12 @@ class ApigeeApiDeveloperApps(ApigeeApi):
             "status": "approved"
         }
 
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.put(f"apps/{self.name}/keys/{self.client_id}",
                                    params=params,
                                    headers=self.headers,
                                    json=data) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -95,21 +129,36 @@ class ApigeeApiDeveloperApps(ApigeeApi):
                                          headers=headers)
                 return body['apiProducts']
 
+    async def remove_api_product(self, api_product: str) -> dict:
+        """ Remove an API Product from the app, add_api_product only ever adds to the ones it already has """
+        async with self._session(self.app_base_uri) as session:
+            async with session.delete(f"apps/{self.name}/keys/{self.client_id}/apiproducts/{api_product}",
+                                      headers=self.headers) as resp:
+                self.invalidate_reads()
+                body = await resp.json()
+                if resp.status != 200:
+                    headers = dict(resp.headers.items())
+                    throw_friendly_error(message=f"unable to remove api product {api_product} from app: "
+                                                 f"{self.name}",
+                                         url=resp.url,
+                                         status_code=resp.status,
+                                         response=body,
+                                         headers=headers)
+                return body['apiProducts']
+
     async def set_custom_attributes(self, attributes: dict) -> dict:
         """ Replaces the current list of attributes with the attributes specified """
-        custom_attributes = [{"name": "DisplayName", "value": self.name}]
-
-        for key, value in attributes.items():
-            custom_attributes.append({"name": key, "value": value})
+        custom_attributes = self._attributes(attributes)
 
         params = self.default_params.copy()
         params['name'] = self.name
 
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.post(f"apps/{self.name}/attributes",
                                     params=params,
                                     headers=self.headers,
                                     json={"attribute": custom_attributes}) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -131,11 +180,12 @@ class ApigeeApiDeveloperApps(ApigeeApi):
             "value": attribute_value
         }
 
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.post(f"apps/{self.name}/attributes/{attribute_name}",
                                     params=params,
                                     headers=self.headers,
                                     json=data) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -152,10 +202,11 @@ class ApigeeApiDeveloperApps(ApigeeApi):
         params["name"] = self.name
         params["attribute_name"] = attribute_name
 
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.delete(f"apps/{self.name}/attributes/{attribute_name}",
                                       params=params,
                                       headers=self.headers) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -168,31 +219,13 @@ class ApigeeApiDeveloperApps(ApigeeApi):
 
     async def get_custom_attributes(self) -> dict:
         """ Get the list of custom attributes assigned to the app """
-        async with APISessionClient(self.app_base_uri) as session:
-            async with session.get(f"apps/{self.name}/attributes", headers=self.headers) as resp:
-                body = await resp.json()
-                if resp.status != 200:
-                    headers = dict(resp.headers.items())
-                    throw_friendly_error(message=f"unable to get custom attribute for app: {self.name}",
-                                         url=resp.url,
-                                         status_code=resp.status,
-                                         response=body,
-                                         headers=headers)
-                return body
+        return await self._cached_get(self.app_base_uri, f"apps/{self.name}/attributes",
+                                      f"unable to get custom attribute for app: {self.name}")
 
     async def get_app_details(self) -> dict:
         """ Return all available details for the app """
-        async with APISessionClient(self.app_base_uri) as session:
-            async with session.get(f"apps/{self.name}", headers=self.headers) as resp:
-                body = await resp.json()
-                if resp.status != 200:
-                    headers = dict(resp.headers.items())
-                    throw_friendly_error(message=f"unable to get app details for: {self.name}",
-                                         url=resp.url,
-                                         status_code=resp.status,
-                                         response=body,
-                                         headers=headers)
-                return body
+        return await self._cached_get(self.app_base_uri, f"apps/{self.name}",
+                                      f"unable to get app details for: {self.name}")
 
     def get_client_id(self):
         """ Get the client id """
@@ -217,8 +250,9 @@ class ApigeeApiDeveloperApps(ApigeeApi):
 
     async def destroy_app(self) -> dict:
         """ Delete the app """
-        async with APISessionClient(self.app_base_uri) as session:
+        async with self._session(self.app_base_uri) as session:
             async with session.delete(f"apps/{self.name}", headers=self.headers) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -227,4 +261,8 @@ class ApigeeApiDeveloperApps(ApigeeApi):
                                          status_code=resp.status,
                                          response=body,
                                          headers=headers)
+                cleanup_registry.unregister(self)
                 return body
+
+    async def _destroy(self) -> dict:
+        return await self.destroy_app()
@@ -0,0 +1,83 @@
+import asyncio
+from abc import ABC, abstractmethod
+from itertools import groupby
+from typing import Dict, List
+
+import aiohttp
+
+from api_test_utils import FriendlyError
+from api_test_utils.apigee_api import ApigeeApi, BatchResult
+
+
+class Cleanable(ABC):
+    """ Mixed into the ApigeeApi* classes whose resources the cleanup registry can delete """
+
+    # order in which the cleanup registry deletes resources, apps go before the products they reference
+    cleanup_stage = 0
+
+    @abstractmethod
+    async def _destroy(self) -> dict:
+        """ Delete the resource """
+
+
+class CleanupRegistry:
+    """ Keeps track of every apim-auto-* resource created through the ApigeeApi* classes so anything left behind
+    by a test run can be deleted in one go """
+
+    def __init__(self):
+        self._resources: Dict[int, Cleanable] = {}
+
+    def register(self, api: Cleanable):
+        if not isinstance(api, Cleanable):
+            raise TypeError(f"{type(api).__name__} resources cannot be cleaned up")
+        self._resources[id(api)] = api
+
+    def unregister(self, api: Cleanable):
+        self._resources.pop(id(api), None)
+
+    def clear(self):
+        """ Forget every registered resource without deleting it """
+        self._resources.clear()
+
+    @property
+    def resources(self) -> List[Cleanable]:
+        return list(self._resources.values())
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, FriendlyError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+    async def _destroy(self, api: Cleanable, retries: int) -> dict:
+        for attempt in range(retries):
+            try:
+                return await api._destroy()  # pylint: disable=protected-access
+            except Exception as e:  # pylint: disable=broad-except
+                if isinstance(e, FriendlyError) and e.status_code == 404:
+                    # already gone, e.g. deleted by hand or discarded by a warm pool
+                    self.unregister(api)
+                    return {}
+                if attempt == retries - 1 or not self._retryable(e):
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def cleanup(self, concurrency: int = 10, retries: int = 3) -> List[BatchResult]:
+        """ Delete every registered resource, apps before products before proxies, running up to concurrency
+        deletes at a time. Resources which are already gone count as deleted, rate limited (429), server (5xx) and
+        connection errors are retried. Anything that still fails is reported and stays registered """
+        results = []
+        by_stage = sorted(self.resources, key=lambda api: api.cleanup_stage)
+        for _, stage in groupby(by_stage, key=lambda api: api.cleanup_stage):
+            apis = list(stage)
+            results.extend(await ApigeeApi._run_batch(  # pylint: disable=protected-access
+                apis, self._destroy, [{"retries": retries}] * len(apis), concurrency=concurrency
+            ))
+
+        for result in results:
+            if not result.ok:
+                print(f"unable to delete {type(result.api).__name__}: {result.api.name}, PLEASE DELETE MANUALLY")
+        return results
+
+
+cleanup_registry = CleanupRegistry()
@@ -1,13 +1,19 @@
-from api_test_utils.apigee_api import ApigeeApi
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, List
+from api_test_utils.apigee_api import ApigeeApi, BatchResult
 from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.apigee_api_cleanup import Cleanable, cleanup_registry
 from . import throw_friendly_error
 
 
-class ApigeeApiProducts(ApigeeApi):
+class ApigeeApiProducts(ApigeeApi, Cleanable):
     """ A simple class to help facilitate CRUD operations for products in Apigee """
 
-    def __init__(self, org_name: str = "nhsd-nonprod"):
-        super().__init__(org_name)
+    cleanup_stage = 1
+
+    def __init__(self, org_name: str = "nhsd-nonprod", session: APISessionClient = None):
+        super().__init__(org_name, session=session)
 
         # Default product properties
         self.scopes = []
@@ -24,6 +30,11 @@ class ApigeeApiProducts(ApigeeApi):
         self.quota_interval = "1"
         self.quota_time_unit = "minute"
 
+        # state of an open batch(), see there
+        self._batch_depth = 0
+        self._batch_changed = False
+        self._batch_create = False
+
     def _product(self):
         return {
             "apiResources": self.api_resources,
@@ -49,8 +60,7 @@ class ApigeeApiProducts(ApigeeApi):
         self.attributes[1]["value"] = rate_limit
         return self._update_product()
 
-    def update_attributes(self, attributes: dict):
-        """ Update the product attributes """
+    def _set_attributes(self, attributes: dict):
         updated_attributes = [
             {"name": "access", "value": self.access},
             {"name": "ratelimit", "value": self.rate_limit}
@@ -58,15 +68,22 @@ class ApigeeApiProducts(ApigeeApi):
         for key, value in attributes.items():
             updated_attributes.append({"name": key, "value": value})
         self.attributes = updated_attributes
-        return self._update_product()
 
-    def update_environments(self, environments: list):
-        """ Update the product environments """
+    def _set_environments(self, environments: list):
         permitted_environments = ["internal-dev", "internal-dev-sandbox", "internal-qa", "internal-qa-sandbox", "ref"]
         if not set(environments) <= set(permitted_environments):
             raise RuntimeError(f"Failed updating environments! specified environments not permitted: {environments}"
                                f"\n Please specify valid environments: {permitted_environments}")
         self.environments = environments
+
+    def update_attributes(self, attributes: dict):
+        """ Update the product attributes """
+        self._set_attributes(attributes)
+        return self._update_product()
+
+    def update_environments(self, environments: list):
+        """ Update the product environments """
+        self._set_environments(environments)
         return self._update_product()
 
     def update_scopes(self, scopes: list):
@@ -84,12 +101,83 @@ class ApigeeApiProducts(ApigeeApi):
         self.api_resources = paths
         return self._update_product()
 
+    async def setup_product(
+        self, scopes: list = None, proxies: list = None, paths: list = None,
+        environments: list = None, attributes: dict = None
+    ) -> dict:
+        """ Configure the product and create it in a single request """
+        self.configure(scopes, proxies, paths, environments, attributes)
+        return await self.create_new_product()
+
+    def configure(
+        self, scopes: list = None, proxies: list = None, paths: list = None,
+        environments: list = None, attributes: dict = None
+    ):
+        """ Change the product locally without sending anything """
+        if scopes is not None:
+            self.scopes = scopes
+        if proxies is not None:
+            self.proxies = proxies
+        if paths is not None:
+            self.api_resources = paths
+        if environments is not None:
+            self._set_environments(environments)
+        if attributes is not None:
+            self._set_attributes(attributes)
+
+    @classmethod
+    async def setup_many(
+        cls, specs: List[dict], concurrency: int = 10, org_name: str = "nhsd-nonprod",
+        session: APISessionClient = None
+    ) -> List[BatchResult]:
+        """ Setup a product per spec concurrently, each spec holds keyword arguments for setup_product
+        e.g. [{"scopes": ["urn:nhsd:apim:app:level3:my-api"], "proxies": ["my-proxy"]}]
+        a failing product is reported in its own result and does not stop the rest of the batch """
+        products = [cls(org_name) for _ in specs]
+        return await cls._run_batch(products, cls.setup_product, specs, concurrency=concurrency, session=session)
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator["ApigeeApiProducts"]:
+        """ Collect the changes made inside async with product.batch(): and send them in a single request on exit.
+        The update_* methods only change the product locally, and a create_new_product() inside the block is held
+        back so the changes go out with the create instead of a PUT. Nothing is sent when the block raises """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._batch_depth == 1:
+                self._batch_changed = self._batch_create = False
+            raise
+        finally:
+            self._batch_depth -= 1
+
+        if self._batch_depth == 0:
+            create, changed = self._batch_create, self._batch_changed
+            self._batch_changed = self._batch_create = False
+            if create:
+                await self._create_product()
+            elif changed:
+                await self._put_product()
+
+    def _pending(self) -> Awaitable[dict]:
+        # what the product will look like once the batch is sent
+        result = asyncio.get_running_loop().create_future()
+        result.set_result(self._product())
+        return result
+
     async def create_new_product(self) -> dict:
         """ Create a new developer product in apigee """
-        async with APISessionClient(self.base_uri) as session:
+        if self._batch_depth:
+            self._batch_create = True
+            return await self._pending()
+        return await self._create_product()
+
+    async def _create_product(self) -> dict:
+        async with self._session() as session:
             async with session.post("apiproducts",
                                     headers=self.headers,
                                     json=self._product()) as resp:
+                self.invalidate_reads()
 
                 if resp.status in {401, 502}:  # 401 is an expired token while 502 is an invalid token
                     raise RuntimeError("Your Apigee token has expired or is invalid")
@@ -105,14 +193,22 @@ class ApigeeApiProducts(ApigeeApi):
                                          status_code=resp.status,
                                          response=body,
                                          headers=headers)
+                cleanup_registry.register(self)
                 return body
 
-    async def _update_product(self) -> dict:
-        """ Update product """
-        async with APISessionClient(self.base_uri) as session:
+    def _update_product(self) -> Awaitable[dict]:
+        """ Update product, or just record the change while a batch() is open """
+        if self._batch_depth:
+            self._batch_changed = True
+            return self._pending()
+        return self._put_product()
+
+    async def _put_product(self) -> dict:
+        async with self._session() as session:
             async with session.put(f"apiproducts/{self.name}",
                                    headers=self.headers,
                                    json=self._product()) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -126,22 +222,14 @@ class ApigeeApiProducts(ApigeeApi):
 
     async def get_product_details(self) -> dict:
         """ Return all available details for the product """
-        async with APISessionClient(self.base_uri) as session:
-            async with session.get(f"apiproducts/{self.name}", headers=self.headers) as resp:
-                body = await resp.json()
-                if resp.status != 200:
-                    headers = dict(resp.headers.items())
-                    throw_friendly_error(message=f"unable to get product details for: {self.name}",
-                                         url=resp.url,
-                                         status_code=resp.status,
-                                         response=body,
-                                         headers=headers)
-                return body
+        return await self._cached_get(self.base_uri, f"apiproducts/{self.name}",
+                                      f"unable to get product details for: {self.name}")
 
     async def destroy_product(self) -> dict:
         """ Delete the product """
-        async with APISessionClient(self.base_uri) as session:
+        async with self._session() as session:
             async with session.delete(f"apiproducts/{self.name}", headers=self.headers) as resp:
+                self.invalidate_reads()
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -151,4 +239,8 @@ class ApigeeApiProducts(ApigeeApi):
                                          status_code=resp.status,
                                          response=body,
                                          headers=headers)
+                cleanup_registry.unregister(self)
                 return body
+
+    async def _destroy(self) -> dict:
+        return await self.destroy_product()
@@ -1,19 +1,21 @@
 from types import TracebackType
 from typing import Optional, Type
 from api_test_utils.apigee_api import ApigeeApi
-from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.apigee_api_cleanup import Cleanable, cleanup_registry
 from . import throw_friendly_error
 
 
-class ApigeeApiProxies(ApigeeApi):
+class ApigeeApiProxies(ApigeeApi, Cleanable):
     """ Create dummy Apigee proxies for testing purposes """
 
+    cleanup_stage = 2
+
     async def __aenter__(self):
         await self._create_proxy()
         return self
 
     async def _create_proxy(self):
-        async with APISessionClient(self.base_uri) as session:
+        async with self._session() as session:
             async with session.post("apis", headers=self.headers, json={'name': self.name}) as resp:
                 body = await resp.json()
                 if resp.status != 201:
@@ -24,10 +26,11 @@ class ApigeeApiProxies(ApigeeApi):
                                          response=body,
                                          headers=headers)
 
+                cleanup_registry.register(self)
                 return body
 
     async def _destroy_proxy(self):
-        async with APISessionClient(self.base_uri) as session:
+        async with self._session() as session:
             async with session.delete(f"apis/{self.name}", headers=self.headers) as resp:
                 body = await resp.json()
                 if resp.status != 200:
@@ -38,8 +41,12 @@ class ApigeeApiProxies(ApigeeApi):
                                          response=body,
                                          headers=headers)
 
+                cleanup_registry.unregister(self)
                 return body
 
+    async def _destroy(self) -> dict:
+        return await self._destroy_proxy()
+
     async def __aexit__(self,
                         exc_type: Optional[Type[BaseException]],
                         exc_val: Optional[BaseException],
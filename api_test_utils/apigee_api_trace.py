@@ -1,6 +1,11 @@
-from ast import literal_eval
+import asyncio
+from time import monotonic
+from typing import AsyncIterator, Callable, List, Tuple
 from api_test_utils.apigee_api import ApigeeApi
 from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.apigee_revision_cache import revision_cache
+from api_test_utils.apigee_trace_index import TraceIndex
+from api_test_utils.trace_profiler import TraceProfile
 from . import throw_friendly_error
 
 
@@ -8,8 +13,8 @@ class ApigeeApiTraceDebug(ApigeeApi):
     """ Create and collect Apigee Trace information for debugging purposes """
 
     def __init__(self, proxy: str, environment: str = "internal-dev", timeout: int = 30,
-                 org_name: str = "nhsd-nonprod"):
-        super().__init__(org_name)
+                 org_name: str = "nhsd-nonprod", session: APISessionClient = None):
+        super().__init__(org_name, session=session)
 
         self.proxy = proxy
         self.env = environment
@@ -19,11 +24,32 @@ class ApigeeApiTraceDebug(ApigeeApi):
         }
         self.revision = None
         self.transaction_id = None
+        self._trace_indexes = {}
+
+    @property
+    def _revision_key(self) -> tuple:
+        return self.base_uri, self.proxy, self.env
+
+    async def _get_deployed_revision(self) -> str:
+        """ The revision deployed to the environment, or the latest revision when the proxy is not deployed there """
+        async with self._session() as session:
+            async with session.get(f"environments/{self.env}/apis/{self.proxy}/deployments",
+                                   headers=self.headers) as resp:
+                body = await resp.json(content_type=None)
+                if resp.status == 200:
+                    deployed = [r["name"] for r in body.get("revision", []) if r.get("state", "deployed") == "deployed"]
+                    if deployed:
+                        return max(deployed, key=int)
+                elif resp.status not in (400, 404):
+                    headers = dict(resp.headers.items())
+                    throw_friendly_error(message=f"unable to get deployments for: {self.proxy} on {self.env}",
+                                         url=resp.url,
+                                         status_code=resp.status,
+                                         response=body,
+                                         headers=headers)
 
-    async def _set_latest_revision(self):
-        async with APISessionClient(self.base_uri) as session:
             async with session.get(f"apis/{self.proxy}/revisions", headers=self.headers) as resp:
-                body = await resp.read()
+                body = await resp.json(content_type=None)
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
                     throw_friendly_error(message=f"unable to get revision for: {self.proxy} on {self.env}",
@@ -33,24 +59,33 @@ class ApigeeApiTraceDebug(ApigeeApi):
                                          headers=headers)
 
                 # Get and validate revision number
-                revision = literal_eval(body.decode("UTF-8"))[-1]
+                revision = max(body, key=lambda r: int(r) if r.isnumeric() else -1)
                 assert revision.isnumeric(), f"Revision must be a number: {revision}"
+                return revision
 
-                self.revision = revision
+    async def _set_latest_revision(self):
+        self.revision = await revision_cache.get(self._revision_key, self._get_deployed_revision)
+
+    def invalidate_revision(self):
+        """ Look the deployed revision up again on the next start_trace(), e.g. after deploying the proxy """
+        revision_cache.invalidate(self._revision_key)
 
     def _has_timed_out(self, resp):
         if resp.get("message", "") == f"DebugSession {self.name} not found":
             raise TimeoutError("Your session has timed out, please rerun the start_trace() method again")
 
     async def start_trace(self) -> dict:
+        self._trace_indexes = {}
         await self._set_latest_revision()
-        async with APISessionClient(self.base_uri) as session:
+        async with self._session() as session:
             async with session.post(
                     f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/debugsessions",
                     params=self.default_params,
                     headers=self.headers) as resp:
                 body = await resp.json()
                 if resp.status != 201:
+                    # the cached revision may no longer be deployed
+                    self.invalidate_revision()
                     headers = dict(resp.headers.items())
                     throw_friendly_error(message=f"unable to start trace on proxy: {self.proxy}",
                                          url=resp.url,
@@ -59,23 +94,58 @@ class ApigeeApiTraceDebug(ApigeeApi):
                                          headers=headers)
                 return {'status_code': resp.status, 'body': body}
 
+    async def get_transaction_ids(self) -> List[str]:
+        """ Every transaction the debug session has captured so far """
+        if not self.revision:
+            raise RuntimeError("You must run start_trace() before you can run get_transaction_ids()")
+
+        async with self._session() as session:
+            return await self._list_transaction_ids(session)
+
+    async def _list_transaction_ids(self, session: APISessionClient) -> List[str]:
+        async with session.get(f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/"
+                               f"debugsessions/{self.name}/data",
+                               headers=self.headers) as resp:
+
+            body = await resp.json()
+            if resp.status != 200:
+                self._has_timed_out(body)
+                headers = dict(resp.headers.items())
+                throw_friendly_error(message=f"unable to get transaction_id for session: {self.name}",
+                                     url=resp.url,
+                                     status_code=resp.status,
+                                     response=body,
+                                     headers=headers)
+
+            return [transaction_id.strip() for transaction_id in body or []]
+
     async def _set_transaction_id(self):
-        async with APISessionClient(self.base_uri) as session:
-            async with session.get(f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/"
-                                   f"debugsessions/{self.name}/data",
-                                   headers=self.headers) as resp:
+        transaction_ids = await self.get_transaction_ids()
+        self.transaction_id = transaction_ids[0] if transaction_ids else None
 
+    def _transaction_uri(self, transaction_id: str = None) -> str:
+        return (f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/"
+                f"debugsessions/{self.name}/data/{transaction_id or self.transaction_id}")
+
+    async def _download_trace_index(self, session: APISessionClient, transaction_id: str) -> TraceIndex:
+        index = self._trace_indexes.get(transaction_id)
+        if index is not None:
+            return index
+
+        async with session.get(self._transaction_uri(transaction_id), headers=self.headers) as resp:
+            if resp.status != 200:
                 body = await resp.json()
-                if resp.status != 200:
-                    self._has_timed_out(body)
-                    headers = dict(resp.headers.items())
-                    throw_friendly_error(message=f"unable to get transaction_id for session: {self.name}",
-                                         url=resp.url,
-                                         status_code=resp.status,
-                                         response=body,
-                                         headers=headers)
+                headers = dict(resp.headers.items())
+                throw_friendly_error(message=f"unable to get trace data for session {self.name} "
+                                             f"on proxy {self.proxy}",
+                                     url=resp.url,
+                                     status_code=resp.status,
+                                     response=body,
+                                     headers=headers)
+            index = await TraceIndex.from_response(resp)
 
-                self.transaction_id = body[0].strip() if body else None
+        self._trace_indexes[transaction_id] = index
+        return index
 
     async def get_trace_data(self) -> dict or None:
         if not self.revision:
@@ -85,10 +155,8 @@ class ApigeeApiTraceDebug(ApigeeApi):
         if not self.transaction_id:
             return None
 
-        async with APISessionClient(self.base_uri) as session:
-            async with session.get(f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/"
-                                    f"debugsessions/{self.name}/data/{self.transaction_id}",
-                                    headers=self.headers) as resp:
+        async with self._session() as session:
+            async with session.get(self._transaction_uri(), headers=self.headers) as resp:
                 body = await resp.json()
                 if resp.status != 200:
                     headers = dict(resp.headers.items())
@@ -98,13 +166,16 @@ class ApigeeApiTraceDebug(ApigeeApi):
                                          status_code=resp.status,
                                          response=body,
                                          headers=headers)
+
+                # index it now so later lookups on this transaction need no further requests
+                self._trace_indexes[self.transaction_id] = TraceIndex.from_trace(body)
                 return body
 
     async def stop_trace(self) -> dict:
         if not self.revision:
             raise RuntimeError("You must run start_trace() before you can run stop_trace()")
 
-        async with APISessionClient(self.base_uri) as session:
+        async with self._session() as session:
             async with session.delete(f"environments/{self.env}/apis/{self.proxy}/revisions/{self.revision}/"
                                       f"debugsessions/{self.name}",
                                       headers=self.headers) as resp:
@@ -121,57 +192,112 @@ class ApigeeApiTraceDebug(ApigeeApi):
                 self.revision = None
                 return {'status_code': resp.status, 'body': body}
 
-    def get_asid_from_trace(self) -> dict:
-        data = self.get_trace_data()
-        executions = [x.get('results', None) for x in data['point'] if x.get('id', "") == "Execution"]
-        executions = list(filter(lambda x: x != [], executions))
-
-        request_messages = []
-        variable_accesses = []
-        asid = {}
-
-        for execution in executions:
-            for item in execution:
-                if item.get('ActionResult', '') == 'RequestMessage':
-                    request_messages.append(item)
-                elif item.get('ActionResult', '') == 'VariableAccess':
-                    variable_accesses.append(item)
-
-        for result in request_messages:  # ASID being sent in the header
-            for item in result['headers']:
-                if item['name'] == 'NHSD-ASID':
-                    asid['request_header'] = item['value']
-                    break
-            if len(asid) > 0:
-                break
-
-        for result in variable_accesses:  # ASID configured by the application
-            for item in result['accessList']:
-                if item.get('Get', {}).get('name', '') == 'app.asid':
-                    asid['application_configured'] = item.get('Get', {}).get('value', None)
-                    break
-        return asid
+    async def get_asid_from_trace(self) -> dict:
+        """ The ASID sent in the request header and configured on the application, from the latest transaction """
+        index = await self.get_trace_index()
+        return index.asid() if index else {}
 
-    async def get_apigee_variable_from_trace(self, name: str) -> str or None:
-        data = await self.get_trace_data()
-        executions = [x.get('results', None) for x in data['point'] if x.get('id', "") == "Execution"]
-        executions = list(filter(lambda x: x != [], executions))
+    async def get_trace_index(self, refresh: bool = False) -> TraceIndex or None:
+        """ Download the latest transaction once, parsing it as it arrives, and keep the parsed index so later
+        lookups make no further requests. Use refresh=True to pick up a newer transaction """
+        if not self.revision:
+            raise RuntimeError("You must run start_trace() before you can run get_trace_index()")
+
+        if not refresh and self.transaction_id in self._trace_indexes:
+            return self._trace_indexes[self.transaction_id]
+
+        await self._set_transaction_id()
+        if not self.transaction_id:
+            return None
+
+        async with self._session() as session:
+            return await self._download_trace_index(session, self.transaction_id)
+
+    async def iter_traces(
+        self, transaction_ids: List[str] = None, concurrency: int = 10
+    ) -> AsyncIterator[Tuple[str, TraceIndex]]:
+        """ Download every transaction in the debug session, or just transaction_ids, at most concurrency at a time,
+        yielding (transaction_id, index) pairs as each download finishes. Transactions already downloaded are not
+        fetched again """
+        if not self.revision:
+            raise RuntimeError("You must run start_trace() before you can run iter_traces()")
+
+        if transaction_ids is None:
+            transaction_ids = await self.get_transaction_ids()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with self._session() as session:
+
+            async def _download(transaction_id):
+                async with semaphore:
+                    return transaction_id, await self._download_trace_index(session, transaction_id)
+
+            tasks = [asyncio.ensure_future(_download(transaction_id)) for transaction_id in transaction_ids]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                # the caller stopped early, or a download failed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def profile_traces(self, transaction_ids: List[str] = None, concurrency: int = 10) -> TraceProfile:
+        """ Latency breakdown across every transaction in the debug session, or just transaction_ids """
+        return await TraceProfile.from_traces(self.iter_traces(transaction_ids, concurrency=concurrency))
 
-        variable_accesses = []
+    async def tail(
+        self, timeout: float = None, sleep_for: float = 0.1, max_sleep_for: float = 2
+    ) -> AsyncIterator[Tuple[str, TraceIndex]]:
+        """ Yield (transaction_id, index) for every transaction the debug session captures, those already captured
+        first, as soon as Apigee lists it. The session is checked every sleep_for seconds, backing off to
+        max_sleep_for while nothing new arrives. Stops when the debug session times out or is stopped, or after
+        timeout seconds """
+        if not self.revision:
+            raise RuntimeError("You must run start_trace() before you can run tail()")
+
+        deadline = monotonic() + timeout if timeout is not None else None
+        interval = sleep_for
+        seen = set()
+
+        async with self._session() as session:
+            while self.revision:
+                try:
+                    transaction_ids = await self._list_transaction_ids(session)
+                except TimeoutError:
+                    return
 
-        for execution in executions:
-            for item in execution:
-                if item.get('ActionResult', '') == 'VariableAccess':
-                    variable_accesses.append(item)
+                new = [transaction_id for transaction_id in transaction_ids if transaction_id not in seen]
+                for transaction_id in new:
+                    seen.add(transaction_id)
+                    yield transaction_id, await self._download_trace_index(session, transaction_id)
 
-        for result in variable_accesses:  # Configured by the application
-            for item in result['accessList']:
-                if item.get('Get', {}).get('name', '') == name:
-                    return item.get('Get', {}).get('value', '')
-                if item.get('Set', {}).get('name', '') == name:
-                    return item.get('Set', {}).get('value', '')
+                interval = sleep_for if new else min(interval * 2, max_sleep_for)
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return
+                    interval = min(interval, remaining)
+                await asyncio.sleep(interval)
 
-        return None
+    async def wait_for_transaction(
+        self, predicate: Callable[[TraceIndex], bool] = None, timeout: float = 30, **kwargs
+    ) -> Tuple[str, TraceIndex]:
+        """ The first transaction the debug session captures whose index matches predicate (any transaction when
+        no predicate is given), e.g. lambda index: index.header('NHSD-ASID') == asid. kwargs are passed to tail() """
+        transactions = self.tail(timeout=timeout, **kwargs)
+        try:
+            async for transaction_id, index in transactions:
+                if predicate is None or predicate(index):
+                    return transaction_id, index
+        finally:
+            await transactions.aclose()
+
+        raise TimeoutError(f"No matching transaction was captured by debug session {self.name} on proxy {self.proxy}")
+
+    async def get_apigee_variable_from_trace(self, name: str) -> str or None:
+        index = await self.get_trace_index()
+        return index.variable(name) if index else None
 
     def add_trace_filter(self, header_name: str, header_value: str):
         self.default_params[f"header_{header_name}"]=header_value
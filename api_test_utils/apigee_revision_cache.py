@@ -0,0 +1,48 @@
+import asyncio
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class RevisionCache:
+    """
+        Proxy revisions by key, ApigeeApiTraceDebug uses (organization uri, proxy, environment).
+        A revision is reused for ttl seconds after it was looked up, and concurrent callers asking for a key
+        which is not cached share a single lookup.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._revisions: Dict[Hashable, Tuple[str, float]] = {}
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def invalidate(self, key: Hashable = None):
+        """ Forget the revision for key, or every revision when no key is given """
+        if key is None:
+            self._revisions.clear()
+        else:
+            self._revisions.pop(key, None)
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[str]]) -> str:
+        cached = self._revisions.get(key)
+        if cached is not None and monotonic() < cached[1]:
+            return cached[0]
+
+        task = self._in_flight.get(key)
+        # a lookup left pending on an event loop which has since closed never finishes, start afresh instead
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(key, fetch))
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task: asyncio.Future):
+        # a lookup on another loop may already have taken its place
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def _fetch(self, key, fetch) -> str:
+        revision = await fetch()
+        self._revisions[key] = (revision, monotonic() + self.ttl)
+        return revision
+
+
+revision_cache = RevisionCache()
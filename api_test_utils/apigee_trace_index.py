@@ -0,0 +1,244 @@
+import codecs
+from datetime import datetime
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import ClientResponse
+
+from api_test_utils.incremental_json import Incomplete, IncrementalJsonParser
+
+
+def _properties(result: dict) -> Dict[str, str]:
+    return {p.get("name"): p.get("value") for p in result.get("properties", {}).get("property", [])}
+
+
+def _timestamp(point: dict) -> Optional[datetime]:
+    """ Apigee trace timestamps look like 17-10-26 10:15:20:123 (dd-mm-yy hh:mm:ss:millis) """
+    for result in point.get("results", []):
+        value = result.get("timestamp")
+        if value:
+            try:
+                return datetime.strptime(value, "%d-%m-%y %H:%M:%S:%f")
+            except ValueError:
+                return None
+    return None
+
+
+class _PointStream(IncrementalJsonParser):
+    """
+        Pulls the items of the top level "point" array out of a trace document fed to it a piece at a time,
+        so a large trace never has to be held or parsed as one document
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._state = "start"
+        self._key = None
+        self.fields = {}
+
+    def feed(self, text: str, final: bool = False) -> List[dict]:
+        self._append(text)
+        points = []
+
+        while self._state != "done" and self._skip_whitespace():
+            char = self._buffer[self._pos]
+            try:
+                if self._state == "start":
+                    self._expect(char, "{")
+                    self._state = "key"
+                elif self._state == "key":
+                    if char in ",}":
+                        self._pos += 1
+                        self._state = "key" if char == "," else "done"
+                    else:
+                        self._key = self._decode(final)
+                        self._state = "colon"
+                elif self._state == "colon":
+                    self._expect(char, ":")
+                    self._state = "points_start" if self._key == "point" else "value"
+                elif self._state == "value":
+                    self.fields[self._key] = self._decode(final)
+                    self._state = "key"
+                elif self._state == "points_start":
+                    self._expect(char, "[")
+                    self._state = "points"
+                elif char in ",]":
+                    self._pos += 1
+                    if char == "]":
+                        self._state = "key"
+                else:
+                    points.append(self._decode(final))
+            except Incomplete:
+                break
+
+        return points
+
+
+class TraceIndex:
+    """
+        A single Apigee trace transaction parsed once into lookups: variable name to the values it was read or set
+        to, request header name to its values, the response status codes in the order they were set, policy name
+        to the time spent in it and flow state (e.g. PROXY_REQ_FLOW, REQ_SENT) to the time spent in it (ms)
+    """
+
+    # the state between the request being sent to the target and its response starting to arrive
+    TARGET_STATE = "REQ_SENT"
+
+    def __init__(self):
+        self.variables: Dict[str, List[Tuple[str, str]]] = {}
+        self.headers: Dict[str, List[str]] = {}
+        self.response_codes: List[int] = []
+        self.policy_timings: Dict[str, List[float]] = {}
+        self.flow_timings: Dict[str, List[float]] = {}
+        self.fields: dict = {}
+        self.point_count = 0
+        self.started: Optional[datetime] = None
+        self.ended: Optional[datetime] = None
+        self._pending_policy: Optional[Tuple[str, datetime]] = None
+        self._pending_flow: Optional[Tuple[str, datetime]] = None
+
+    @classmethod
+    def from_trace(cls, trace: dict) -> "TraceIndex":
+        index = cls()
+        index.add_points(trace.get("point", []))
+        index.fields = {k: v for k, v in trace.items() if k != "point"}
+        return index.finish()
+
+    @classmethod
+    def from_text(cls, chunks: Iterable[str]) -> "TraceIndex":
+        index, stream = cls(), _PointStream()
+        for chunk in chunks:
+            index.add_points(stream.feed(chunk))
+        index.add_points(stream.feed("", final=True))
+        index.fields = stream.fields
+        return index.finish()
+
+    @classmethod
+    async def from_chunks(cls, chunks: AsyncIterable[str]) -> "TraceIndex":
+        index, stream = cls(), _PointStream()
+        async for chunk in chunks:
+            index.add_points(stream.feed(chunk))
+        index.add_points(stream.feed("", final=True))
+        index.fields = stream.fields
+        return index.finish()
+
+    @classmethod
+    async def from_response(cls, resp: ClientResponse, chunk_size: int = 65536) -> "TraceIndex":
+        """ Parse a trace as it is downloaded, a point at a time """
+        decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")()
+
+        async def _chunks():
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield decoder.decode(chunk)
+            yield decoder.decode(b"", final=True)
+
+        return await cls.from_chunks(_chunks())
+
+    def add_points(self, points: Iterable[dict]):
+        for point in points:
+            self.add_point(point)
+
+    def add_point(self, point: dict):
+        self.point_count += 1
+        timestamp = _timestamp(point)
+        if timestamp is not None:
+            self.started = self.started or timestamp
+            self.ended = timestamp
+            self._close_policy(timestamp)
+
+        for result in point.get("results", []) or []:
+            action = result.get("ActionResult", "")
+            if action == "VariableAccess":
+                for item in result.get("accessList", []):
+                    for operation in ("Get", "Set"):
+                        if operation in item:
+                            name = item[operation].get("name", "")
+                            self.variables.setdefault(name, []).append((operation, item[operation].get("value", "")))
+            elif action == "RequestMessage":
+                for header in result.get("headers", []):
+                    self.headers.setdefault(header["name"].lower(), []).append(header.get("value"))
+            elif action == "ResponseMessage" and result.get("statusCode"):
+                self.response_codes.append(int(result["statusCode"]))
+            elif action == "DebugInfo" and point.get("id") == "Execution" and timestamp is not None:
+                policy = _properties(result).get("stepDefinition-name")
+                if policy:
+                    self._pending_policy = (policy, timestamp)
+            elif action == "DebugInfo" and point.get("id") == "StateChange" and timestamp is not None:
+                state = _properties(result).get("To")
+                if state:
+                    self._close_flow(timestamp)
+                    self._pending_flow = (state, timestamp)
+
+    def _close_policy(self, timestamp: datetime):
+        # a policy runs until the next point is recorded
+        if self._pending_policy is not None:
+            policy, started = self._pending_policy
+            self.policy_timings.setdefault(policy, []).append((timestamp - started).total_seconds() * 1000)
+            self._pending_policy = None
+
+    def _close_flow(self, timestamp: datetime):
+        # a flow state lasts until the next state change
+        if self._pending_flow is not None:
+            state, started = self._pending_flow
+            self.flow_timings.setdefault(state, []).append((timestamp - started).total_seconds() * 1000)
+            self._pending_flow = None
+
+    def finish(self) -> "TraceIndex":
+        if self.ended is not None:
+            self._close_policy(self.ended)
+            self._close_flow(self.ended)
+        return self
+
+    @property
+    def total_time(self) -> float:
+        """ Time (ms) from the first to the last timestamped point """
+        if self.started is None:
+            return 0.0
+        return (self.ended - self.started).total_seconds() * 1000
+
+    @property
+    def target_time(self) -> float:
+        """ Time (ms) spent waiting on the target """
+        return sum(self.flow_timings.get(self.TARGET_STATE, []))
+
+    @property
+    def proxy_overhead(self) -> float:
+        """ Time (ms) spent in the proxy itself, everything but waiting on the target """
+        return self.total_time - self.target_time
+
+    @property
+    def slowest_policy(self) -> Optional[Tuple[str, float]]:
+        """ The policy with the longest single execution and how long it took (ms) """
+        slowest = [(policy, max(timings)) for policy, timings in self.policy_timings.items()]
+        return max(slowest, key=lambda s: s[1]) if slowest else None
+
+    def variable(self, name: str) -> Optional[str]:
+        """ The first value the variable was read or set to """
+        values = self.variables.get(name)
+        return values[0][1] if values else None
+
+    def variable_values(self, name: str, operation: str = None) -> List[str]:
+        """ Every value the variable was read (operation Get) or set (operation Set) to, in order """
+        return [value for op, value in self.variables.get(name, []) if operation in (None, op)]
+
+    def header(self, name: str) -> Optional[str]:
+        values = self.headers.get(name.lower())
+        return values[0] if values else None
+
+    def header_values(self, name: str) -> List[str]:
+        return list(self.headers.get(name.lower(), []))
+
+    @property
+    def response_code(self) -> Optional[int]:
+        """ The status code the transaction finally responded with """
+        return self.response_codes[-1] if self.response_codes else None
+
+    def asid(self) -> Dict[str, str]:
+        """ The ASID sent in the NHSD-ASID request header and the one configured on the calling application """
+        asid = {}
+        request_header = self.header("NHSD-ASID")
+        if request_header is not None:
+            asid["request_header"] = request_header
+        application_configured = self.variable_values("app.asid", operation="Get")
+        if application_configured:
+            asid["application_configured"] = application_configured[-1]
+        return asid
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Set
+
+from api_test_utils import FriendlyError
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.apigee_api_apps import ApigeeApiDeveloperApps
+from api_test_utils.apigee_api_cleanup import cleanup_registry
+from api_test_utils.apigee_api_products import ApigeeApiProducts
+from api_test_utils.backoff import full_jitter
+
+# product settings put back when a pooled product is returned
+_PRODUCT_FIELDS = ("scopes", "api_resources", "environments", "access", "rate_limit", "proxies", "attributes",
+                   "quota", "quota_interval", "quota_time_unit")
+
+
+def _state_file(state_file: Optional[str]) -> str:
+    """ Every pytest-xdist worker gets a file of its own so no two workers lease the same app, by default kept in
+    the user's cache directory rather than the working tree """
+    if state_file is None:
+        cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        state_file = os.path.join(cache, "apim-test-utils", "apigee_warm_pool.json")
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        root, extension = os.path.splitext(state_file)
+        state_file = f"{root}.{worker}{extension}"
+    return state_file
+
+
+@dataclass
+class PooledApp:
+    """ A ready made app leased from a WarmPool, with its own product when the pool was given a product_spec """
+    app: ApigeeApiDeveloperApps
+    product: Optional[ApigeeApiProducts] = None
+
+
+class WarmPool:
+    """
+        Keeps size developer apps (each with its own product when product_spec is given) ready to lease to tests,
+        instead of creating and deleting them per test. A returned app has its products and attributes reset in
+        the background rather than being deleted, and an app which cannot be reset is replaced. Creating an app is
+        tried up to create_attempts times, backing off in between, before the pool gives up on that place.
+
+        product_spec holds keyword arguments for ApigeeApiProducts.setup_product, api_products and
+        custom_attributes configure every app. The names of the pooled apps, never their credentials, are written to
+        state_file (one per pytest-xdist worker) so the next test session picks them up again, call drain() to
+        delete them for good. e.g.
+
+            pool = WarmPool(size=4, product_spec={"scopes": ["urn:nhsd:apim:app:level3:my-api"]})
+            await pool.start()
+            async with pool.leased() as pooled:
+                ... pooled.app.client_id ...
+            await pool.close()
+    """
+
+    def __init__(
+        self,
+        size: int = 5,
+        state_file: str = None,
+        product_spec: dict = None,
+        api_products: List[str] = None,
+        custom_attributes: dict = None,
+        org_name: str = "nhsd-nonprod",
+        developer_email: str = "apm-testing-internal-dev@nhs.net",
+        session: APISessionClient = None,
+        create_attempts: int = 5
+    ):
+        self.size = size
+        self.state_file = _state_file(state_file)
+        self.product_spec = product_spec
+        self.api_products = api_products or []
+        self.custom_attributes = custom_attributes or {}
+        self.org_name = org_name
+        self.developer_email = developer_email
+        self.session = session
+        self.create_attempts = create_attempts
+
+        self._pool: List[PooledApp] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Future] = set()
+        self._product_settings = {}
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize() if self._idle is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def _background(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load_state(self) -> List[dict]:
+        if not os.path.exists(self.state_file):
+            return []
+        with open(self.state_file, "r") as f:
+            state = json.load(f)
+        if state.get("org_name") != self.org_name or state.get("developer_email") != self.developer_email:
+            return []
+        return state.get("apps", [])
+
+    def _save_state(self):
+        state = {
+            "org_name": self.org_name,
+            "developer_email": self.developer_email,
+            "apps": [
+                {
+                    # credentials are fetched again when the app is picked back up
+                    "name": pooled.app.name,
+                    "callback_url": pooled.app.callback_url,
+                    "product": pooled.product.name if pooled.product else None,
+                }
+                for pooled in self._pool
+            ],
+        }
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temporary, self.state_file)
+
+    def _new_product(self) -> ApigeeApiProducts:
+        return ApigeeApiProducts(self.org_name, session=self.session)
+
+    def _app_products(self, pooled: PooledApp) -> List[str]:
+        return self.api_products + ([pooled.product.name] if pooled.product else [])
+
+    async def start(self):
+        """ Take back the apps kept by the last session and start filling the pool up to size in the background """
+        self._idle = asyncio.Queue()
+        if self.product_spec is not None:
+            # what a product looks like once set up, returned products are put back to it
+            template = self._new_product()
+            template.configure(**self.product_spec)
+            self._product_settings = {field: deepcopy(getattr(template, field)) for field in _PRODUCT_FIELDS}
+
+        for entry in self._load_state()[:self.size]:
+            app = ApigeeApiDeveloperApps(self.org_name, self.developer_email, session=self.session)
+            app.name = entry["name"]
+            app.callback_url = entry["callback_url"]
+            product = None
+            if entry.get("product") and self.product_spec is not None:
+                product = self._new_product()
+                product.name = entry["product"]
+            pooled = PooledApp(app, product)
+            self._pool.append(pooled)
+            # it may have been leased when the last session stopped
+            self._background(self._reset(pooled))
+
+        for _ in range(self.size - len(self._pool)):
+            self._background(self._create())
+
+    async def _create(self):
+        for attempt in range(self.create_attempts):
+            if attempt:
+                await asyncio.sleep(full_jitter(attempt - 1))
+
+            app = ApigeeApiDeveloperApps(self.org_name, self.developer_email, session=self.session)
+            pooled = PooledApp(app, self._new_product() if self.product_spec is not None else None)
+            try:
+                if pooled.product is not None:
+                    await pooled.product.setup_product(**self.product_spec)
+                await app.setup_app(api_products=self._app_products(pooled),
+                                    custom_attributes=self.custom_attributes)
+            except Exception as e:  # pylint: disable=broad-except
+                # anything created is left to the cleanup registry
+                print(f"unable to add an app to the pool (attempt {attempt + 1} of {self.create_attempts}): {e}")
+                continue
+
+            # the pool looks after its own resources
+            for api in (app, pooled.product):
+                cleanup_registry.unregister(api)
+
+            self._pool.append(pooled)
+            self._save_state()
+            self._idle.put_nowait(pooled)
+            return
+
+    async def _reset(self, pooled: PooledApp):
+        try:
+            if pooled.product is not None:
+                for field, value in self._product_settings.items():
+                    setattr(pooled.product, field, deepcopy(value))
+                await pooled.product._update_product()  # pylint: disable=protected-access
+            await self._reset_app(pooled)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"unable to reset pooled app {pooled.app.name}, replacing it: {e}")
+            await self._discard(pooled)
+            await self._create()
+            return
+
+        self._idle.put_nowait(pooled)
+
+    async def _reset_app(self, pooled: PooledApp):
+        app = pooled.app
+        credentials = (await app.get_app_details())["credentials"]
+        credential = next((c for c in credentials if c["consumerKey"] == app.client_id), credentials[0])
+        app.client_id, app.client_secret = credential["consumerKey"], credential["consumerSecret"]
+
+        # adding products to a key keeps the ones it has, take off any a test added
+        wanted = self._app_products(pooled)
+        current = [p["apiproduct"] for p in credential.get("apiProducts", [])]
+        for product in current:
+            if product not in wanted:
+                await app.remove_api_product(product)
+        missing = [product for product in wanted if product not in current]
+        if missing:
+            await app.add_api_product(missing)
+        await app.set_custom_attributes(self.custom_attributes)
+
+    async def _discard(self, pooled: PooledApp):
+        self._pool.remove(pooled)
+        self._save_state()
+        for api in (pooled.app, pooled.product):
+            if api is None:
+                continue
+            try:
+                await api._destroy()  # pylint: disable=protected-access
+            except Exception as e:  # pylint: disable=broad-except
+                if isinstance(e, FriendlyError) and e.status_code == 404:
+                    # already gone
+                    continue
+                print(f"unable to delete {type(api).__name__}: {api.name}, PLEASE DELETE MANUALLY")
+
+    async def lease(self, timeout: Optional[float] = 60) -> PooledApp:
+        """ Wait up to timeout seconds for a ready app, it is the caller's until it is given back with release().
+        Raises RuntimeError straight away once the pool is empty and has given up creating apps for it """
+        if self._idle is None:
+            raise RuntimeError("You must run start() before you can lease from the pool")
+        return await asyncio.wait_for(self._next_idle(), timeout)
+
+    async def _next_idle(self) -> PooledApp:
+        get = asyncio.ensure_future(self._idle.get())
+        try:
+            while not get.done():
+                if not self._pool and not self._tasks:
+                    raise RuntimeError("The pool is empty, none of its apps could be created")
+                # look again whenever a create or reset finishes, it may have been the last one
+                await asyncio.wait({get, *self._tasks}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            if get.done() and not get.cancelled():
+                # handed an app just as the wait was given up on, put it back for the next caller
+                self._idle.put_nowait(get.result())
+            get.cancel()
+            raise
+        return get.result()
+
+    def release(self, pooled: PooledApp):
+        """ Give an app back, it is reset in the background before it is leased again """
+        self._background(self._reset(pooled))
+
+    @asynccontextmanager
+    async def leased(self, timeout: Optional[float] = 60) -> AsyncIterator[PooledApp]:
+        pooled = await self.lease(timeout)
+        try:
+            yield pooled
+        finally:
+            self.release(pooled)
+
+    async def wait_ready(self):
+        """ Wait for every pending create and reset, e.g. to warm the pool up front """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def close(self):
+        """ Finish resetting returned apps and record the pool for the next session, the apps are kept """
+        await self.wait_ready()
+        self._save_state()
+
+    async def drain(self):
+        """ Delete every pooled app and product and forget the pool """
+        await self.wait_ready()
+        for pooled in list(self._pool):
+            await self._discard(pooled)
+        self._idle = asyncio.Queue()
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
@@ -0,0 +1,33 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+def full_jitter(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    """
+        seconds to wait before retry number attempt (counting from 0), picked uniformly between 0 and an exponentially
+        growing ceiling so that clients retrying at the same time spread out instead of retrying in lock step
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+        seconds the server asked us to wait in its Retry-After header (either delay seconds or an http date)
+    """
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
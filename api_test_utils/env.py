@@ -36,6 +36,11 @@ def api_base_uri(
     return base_uri
 
 
+def apigee_api_base_uri() -> str:
+    base_uri = os.environ.get('APIGEE_API_BASE_URI', 'https://api.enterprise.apigee.com/v1').strip().rstrip('/')
+    return base_uri
+
+
 def source_commit_id():
     return os.environ.get('SOURCE_COMMIT_ID', 'not-set')
 
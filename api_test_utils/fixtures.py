@@ -1,11 +1,17 @@
 import os
+import asyncio
+from typing import Dict
+from weakref import WeakKeyDictionary
+
 import pytest
-import requests
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from selenium import webdriver
+from aiohttp import ClientResponse
 
+from api_test_utils.api_client_pool import ApiClientPool
 from api_test_utils.api_session_client import APISessionClient
 from api_test_utils.api_test_session_config import APITestSessionConfig
+from api_test_utils.apigee_api_cleanup import cleanup_registry, CleanupRegistry
+from api_test_utils.readiness import ReadinessProbe, wait_until_ready
+from api_test_utils.webdriver_pool import WebDriverPool
 
 
 @pytest.fixture(scope='function')
@@ -18,6 +24,57 @@ async def api_client(api_test_config: APITestSessionConfig):
     await session_client.close()
 
 
+@pytest.fixture(scope="session")
+def api_client_pool() -> ApiClientPool:
+    """Keep-alive connections shared by pooled_api_client, reports how often they were reused at the end"""
+    pool = ApiClientPool()
+
+    yield pool
+
+    pool.close_all()
+    print(f"\n{pool.report()}")
+
+
+# scope of the event_loop fixture each loop came from, see pytest_fixture_setup
+_event_loop_scopes: "WeakKeyDictionary[asyncio.AbstractEventLoop, str]" = WeakKeyDictionary()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):  # pylint: disable=unused-argument
+    """Remember the scope of every event_loop fixture, so pooled_api_client knows whether its loop outlives the
+    test. Import it into conftest.py along with pooled_api_client"""
+    outcome = yield
+    if fixturedef.argname == "event_loop" and outcome.excinfo is None:
+        _event_loop_scopes[outcome.get_result()] = fixturedef.scope
+
+
+@pytest.fixture(scope='function')
+async def pooled_api_client(api_test_config: APITestSessionConfig, api_client_pool: ApiClientPool):
+    """Like api_client, with its own cookies and headers, but over connections kept open between tests on the same
+    event loop. pytest-asyncio gives every test a loop of its own by default, so by default connections are only
+    reused within a test and closed after it. To share them between tests override event_loop with a wider scope
+    and import pytest_fixture_setup from this module into conftest.py"""
+    session_client = api_client_pool.client(api_test_config.base_uri)
+
+    yield session_client
+
+    await session_client.close()
+    if _event_loop_scopes.get(asyncio.get_running_loop(), "function") == "function":
+        # the loop, and every connection opened on it, goes away with this test
+        await api_client_pool.close()
+
+
+@pytest.fixture(scope="session")
+def apigee_cleanup() -> CleanupRegistry:
+    """Delete any apim-auto-* apps, products and proxies left behind once the test session ends. pytest only runs
+    this once some test has requested the fixture, so request it from every test that creates resources or make it
+    autouse in conftest.py e.g. @pytest.fixture(scope="session", autouse=True) def cleanup(apigee_cleanup): ..."""
+    yield cleanup_registry
+
+    if cleanup_registry.resources:
+        asyncio.run(cleanup_registry.cleanup())
+
+
 @pytest.fixture(scope="session")
 def docker_compose_file(pytestconfig):
     return os.path.join(os.path.dirname(__file__), "docker-compose.yml")
@@ -26,33 +83,75 @@ def docker_compose_file(pytestconfig):
 @pytest.fixture(scope="session")
 def webdriver_service(docker_ip, docker_services):
     """Ensure that HTTP service is up and responsive."""
-    def is_responsive(url):
-        try:
-            response = requests.get(url)
-        except RequestsConnectionError:
+    async def is_ready(resp: ClientResponse) -> bool:
+        if resp.status != 200:
             return False
-        else:
-            body = response.json()
-            if body['value']['ready']:
-                return True
+        body = await resp.json(content_type=None)
+        return bool(body['value']['ready'])
 
     print("Starting Webdriver service..")
     # `port_for` takes a container port and returns the corresponding host port
     port = docker_services.port_for("chromedriver", 4444)
     url = "http://{}:{}".format(docker_ip, port)
-    docker_services.wait_until_responsive(
-        timeout=30.0, pause=2, check=lambda: is_responsive(f"{url}/wd/hub/status")
+    results = asyncio.run(
+        wait_until_ready([ReadinessProbe("chromedriver", f"{url}/wd/hub/status", until=is_ready)], timeout=30)
     )
+    print("\n".join(str(result) for result in results))
     yield url
     print("Stopping Webdriver service..")
 
 
+def _new_webdriver_pool(webdriver_service: str) -> WebDriverPool:
+    urls = [webdriver_service] + [u.strip() for u in os.environ.get("WEBDRIVER_POOL_URLS", "").split(",") if u.strip()]
+    return WebDriverPool(urls, size_per_url=int(os.environ.get("WEBDRIVER_POOL_SIZE_PER_URL", "1")))
+
+
+@pytest.fixture(scope="session")
+def webdriver_pool(webdriver_service):
+    """Chrome sessions reused between tests, on the webdriver_service container plus any chromedriver urls listed,
+    comma separated, in WEBDRIVER_POOL_URLS so logins can run in parallel"""
+    pool = _new_webdriver_pool(webdriver_service)
+
+    yield pool
+
+    pool.close()
+
+
+# pools webdriver_session falls back on, by webdriver_service url, when conftest.py does not import webdriver_pool
+_default_webdriver_pools: Dict[str, WebDriverPool] = {}
+
+
+def _webdriver_pool(request, webdriver_service: str) -> WebDriverPool:
+    try:
+        return request.getfixturevalue("webdriver_pool")
+    except pytest.FixtureLookupError:
+        pass
+
+    pool = _default_webdriver_pools.get(webdriver_service)
+    if pool is None:
+        pool = _default_webdriver_pools[webdriver_service] = _new_webdriver_pool(webdriver_service)
+
+        def _close():
+            _default_webdriver_pools.pop(webdriver_service, None)
+            pool.close()
+
+        request.config.add_cleanup(_close)
+    return pool
+
+
 @pytest.fixture(scope="function")
-def webdriver_session(webdriver_service):
+def webdriver_session(request, webdriver_service):
+    """A pooled Chrome session, quit rather than reused when the test failed. Uses the webdriver_pool fixture when
+    conftest.py imports it, otherwise a pool of its own on webdriver_service which is closed when pytest exits"""
+    webdriver_pool = _webdriver_pool(request, webdriver_service)
     try:
-        wd = webdriver.Remote(command_executor=f"{webdriver_service}/wd/hub", options=webdriver.ChromeOptions())
+        wd = webdriver_pool.lease(timeout=60)
     except:
         raise Exception("Could not connect to Chromedriver.")
     else:
-        yield wd
-    wd.quit()
+        # pytest resumes the fixture the same way whether the test passed or not, but counts the failure first
+        failures = request.session.testsfailed
+        try:
+            yield wd
+        finally:
+            webdriver_pool.release(wd, failed=request.session.testsfailed != failures)
@@ -0,0 +1,69 @@
+from math import floor, log
+from typing import Dict, Iterable
+
+
+class LatencyHistogram:
+    """
+        Fixed memory histogram in the spirit of HdrHistogram, values land in buckets growing geometrically by
+        precision so any percentile is accurate to within that relative error whatever the number of samples
+    """
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-6):
+        self.precision = precision
+        self.lowest = lowest
+        self._log_growth = log(1 + precision)
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        return int(floor(log(value / self.lowest) / self._log_growth))
+
+    def _value(self, bucket: int) -> float:
+        # geometric middle of the bucket
+        return self.lowest * (1 + self.precision) ** (bucket + 0.5)
+
+    def record(self, value: float, count: int = 1):
+        bucket = self._bucket(value)
+        self._counts[bucket] = self._counts.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """ Add the samples of another histogram with the same precision and lowest value to this one """
+        if (other.precision, other.lowest) != (self.precision, self.lowest):
+            raise ValueError("can only merge histograms with the same precision and lowest value")
+        for bucket, count in other._counts.items():  # pylint: disable=protected-access
+            self._counts[bucket] = self._counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """ Value below which percentile (0 - 100) percent of the samples fall, 0 when there are no samples """
+        if not self.count:
+            return 0.0
+
+        rank = max(percentile / 100 * self.count, 1)
+        seen = 0
+        for bucket in sorted(self._counts):
+            seen += self._counts[bucket]
+            if seen >= rank:
+                return min(max(self._value(bucket), self.min), self.max)
+        return self.max
+
+    def percentiles(self, percentiles: Iterable[float] = (50, 90, 95, 99)) -> Dict[float, float]:
+        return {p: self.percentile(p) for p in percentiles}
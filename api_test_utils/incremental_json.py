@@ -0,0 +1,53 @@
+import json
+from typing import Any
+
+
+class Incomplete(Exception):
+    """ More of the document is needed before the next token can be read """
+
+
+class IncrementalJsonParser:
+    """
+        Base for parsers fed a json document a piece at a time. Only the part of the document not yet consumed is
+        kept, a token cut short by the end of what has arrived so far raises Incomplete so the caller can wait for
+        more, anything else which is not json raises json.JSONDecodeError straight away
+    """
+
+    _decoder = json.JSONDecoder()
+    _whitespace = " \t\n\r"
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+
+    def _append(self, text: str):
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+
+    def _skip_whitespace(self) -> bool:
+        """ Move past whitespace, False when nothing else has arrived yet """
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in self._whitespace:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _truncated(self, error: json.JSONDecodeError) -> bool:
+        # a string without its closing quote yet, or a literal, escape or container cut off by the end of the buffer
+        return error.msg.startswith("Unterminated string") or len(self._buffer) - error.pos <= len("false")
+
+    def _decode(self, final: bool) -> Any:
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError as e:
+            if not final and self._truncated(e):
+                raise Incomplete() from e
+            raise
+        # a number at the very end of what we have so far may still be cut short
+        if end >= len(self._buffer) and not final:
+            raise Incomplete()
+        self._pos = end
+        return value
+
+    def _expect(self, char: str, expected: str):
+        if char != expected:
+            raise json.JSONDecodeError(f"Expecting '{expected}'", self._buffer, self._pos)
+        self._pos += 1
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import jwt  # pyjwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+
+class JwtSigner:
+    """Signs Json Web Tokens with a key which is parsed once, rather than by pyjwt on every signature"""
+
+    def __init__(self, signing_key: str):
+        self.signing_key = signing_key
+        if signing_key.lstrip().startswith("-----BEGIN"):
+            self.key = load_pem_private_key(signing_key.encode(), password=None)
+        else:
+            # shared secret for the HS* algorithms
+            self.key = signing_key
+
+    def sign(self, claims: dict, algorithm: str = "RS512", headers: dict = None) -> str:
+        return jwt.encode(claims, self.key, algorithm=algorithm, headers=headers)
+
+
+_signers_by_key: Dict[str, JwtSigner] = {}
+_signers_by_path: Dict[str, JwtSigner] = {}
+_lock = threading.Lock()
+
+
+def signer_for_key(signing_key: str) -> JwtSigner:
+    """Get the cached signer for a key"""
+    signer = _signers_by_key.get(signing_key)
+    if signer is None:
+        with _lock:
+            signer = _signers_by_key.get(signing_key)
+            if signer is None:
+                signer = _signers_by_key[signing_key] = JwtSigner(signing_key)
+    return signer
+
+
+def signer_for_path(path: str) -> JwtSigner:
+    """Get the cached signer for a key file, the file is only read the first time"""
+    signer = _signers_by_path.get(path)
+    if signer is None:
+        with open(path, "r") as f:
+            contents = f.read()
+        if not contents:
+            raise RuntimeError(f"Contents of file {path} is empty.")
+        signer = _signers_by_path[path] = signer_for_key(contents)
+    return signer
+
+
+def clear_signer_cache():
+    """Forget every parsed key, e.g. after rotating a key file"""
+    with _lock:
+        _signers_by_key.clear()
+        _signers_by_path.clear()
+
+
+_process_signer: JwtSigner = None
+
+
+def _init_process_signer(signing_key: str):
+    global _process_signer  # pylint: disable=global-statement
+    _process_signer = JwtSigner(signing_key)
+
+
+def _sign_in_process(args: Tuple[dict, str, dict]) -> str:
+    claims, algorithm, headers = args
+    return _process_signer.sign(claims, algorithm=algorithm, headers=headers)
+
+
+def sign_many(
+    signer: JwtSigner, claims: List[dict], algorithm: str = "RS512", headers: dict = None,
+    executor: Executor = None, processes: int = None
+) -> List[str]:
+    """
+        Sign many sets of claims, on the threads of executor when given or in a pool of that many processes
+        when processes is set (each process parses the key once), otherwise one after another
+    """
+    if processes:
+        with ProcessPoolExecutor(processes, initializer=_init_process_signer,
+                                 initargs=(signer.signing_key,)) as pool:
+            return list(pool.map(_sign_in_process, [(c, algorithm, headers) for c in claims],
+                                 chunksize=max(len(claims) // (processes * 4), 1)))
+
+    if executor is not None:
+        return list(executor.map(lambda c: signer.sign(c, algorithm=algorithm, headers=headers), claims))
+
+    return [signer.sign(c, algorithm=algorithm, headers=headers) for c in claims]
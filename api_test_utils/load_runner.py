@@ -0,0 +1,138 @@
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Optional
+
+import aiohttp
+from aiohttp import ClientResponse
+
+from api_test_utils import is_200ish
+from api_test_utils.histogram import LatencyHistogram
+
+
+@dataclass
+class LoadReport:
+    """ Outcome of a load run, latencies are in seconds; status None counts requests which got no response """
+    elapsed: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    status_counts: Counter = field(default_factory=Counter)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    def percentiles(self, percentiles=(50, 90, 95, 99)) -> Dict[float, float]:
+        return self.latency.percentiles(percentiles)
+
+    def summary(self) -> str:
+        latencies = ", ".join(f"p{p:g}: {v * 1000:.1f}ms" for p, v in self.percentiles().items())
+        return (f"{self.requests} requests in {self.elapsed:.2f}s ({self.throughput:.1f}/s), "
+                f"error rate {self.error_rate:.2%}, {latencies}, statuses {dict(self.status_counts)}")
+
+
+class LoadRunner:
+    """
+        Drive a request factory, the same shape poll_until accepts e.g. lambda: session.get('ping'), for a duration
+        in seconds, either with concurrency requests always in flight or, when rps is set, starting rps requests a
+        second with at most concurrency in flight. Use one pooled session for the factory, e.g.
+        APISessionClient.pooled(base_uri, limit_per_host=concurrency), so connections are reused.
+
+        In rps mode latency is measured from when a request was due to start, so a server which falls behind
+        is not hidden by requests queueing up on the client.
+    """
+
+    def __init__(
+        self,
+        make_request: Callable[[], Awaitable[ClientResponse]],
+        duration: float,
+        rps: Optional[float] = None,
+        concurrency: int = 10,
+        success: Callable[[ClientResponse], Awaitable[bool]] = is_200ish,
+        read_body: bool = True
+    ):
+        self.make_request = make_request
+        self.duration = duration
+        self.rps = rps
+        self.concurrency = concurrency
+        self.success = success
+        self.read_body = read_body
+        self.report = LoadReport()
+
+    async def _send(self, started: float):
+        status = None
+        try:
+            async with self.make_request() as response:
+                if self.read_body:
+                    await response.read()
+                status = response.status
+                ok = await self.success(response)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            ok = False
+
+        self.report.latency.record(monotonic() - started)
+        self.report.requests += 1
+        self.report.status_counts[status] += 1
+        if not ok:
+            self.report.errors += 1
+
+    async def _closed_loop(self, deadline: float):
+
+        async def _worker():
+            while monotonic() < deadline:
+                await self._send(monotonic())
+
+        await asyncio.gather(*(_worker() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, started: float, deadline: float):
+        interval = 1 / self.rps
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # only the requests still in flight are held on to, so a long soak does not keep a task per request
+        in_flight = set()
+        errors = []
+
+        async def _send(due):
+            try:
+                await self._send(due)
+            finally:
+                semaphore.release()
+
+        def _done(task: asyncio.Future):
+            in_flight.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        for n in range(int(self.duration * self.rps)):
+            due = started + n * interval
+            if due >= deadline:
+                break
+            delay = due - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await semaphore.acquire()
+            task = asyncio.ensure_future(_send(due))
+            in_flight.add(task)
+            task.add_done_callback(_done)
+
+        await asyncio.gather(*in_flight)
+        if errors:
+            raise errors[0]
+
+    async def run(self) -> LoadReport:
+        self.report = LoadReport()
+        started = monotonic()
+        deadline = started + self.duration
+
+        if self.rps:
+            await self._open_loop(started, deadline)
+        else:
+            await self._closed_loop(deadline)
+
+        self.report.elapsed = monotonic() - started
+        return self.report
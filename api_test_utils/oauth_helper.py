@@ -2,19 +2,27 @@ from os import environ
 import re
 import requests
 import json
+import hashlib
 from lxml import html
 from uuid import uuid4
 from time import time
 from ast import literal_eval
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, urljoin
+from html.parser import HTMLParser
 import asyncio
+import codecs
 import urllib
-import jwt  # pyjwt
+import aiohttp
+from concurrent.futures import Executor
+from typing import List
 from aiohttp.client_exceptions import ContentTypeError
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.backoff import full_jitter, retry_after
+from api_test_utils.oauth_token_cache import token_cache
+from api_test_utils.jwt_signer import JwtSigner, signer_for_key, signer_for_path, sign_many
 from . import throw_friendly_error
 from . import env
 
@@ -45,30 +53,19 @@ class OauthHelper:
         return f"{_uri}/{self.proxy}"
 
     @staticmethod
-    def _read_file(file):
-        with open(file, "r") as f:
-            contents = f.read()
-        if not contents:
-            raise RuntimeError(f"Contents of file {file} is empty.")
-        return contents
-
-    def _get_private_key(self):
-        """Return the contents of a private key"""
-        _path = environ.get("JWT_PRIVATE_KEY_ABSOLUTE_PATH", "not-set").strip()
+    def _get_key_path(variable: str) -> str:
+        _path = environ.get(variable, "not-set").strip()
         if _path == "not-set":
             raise RuntimeError(
-                "\nJWT_PRIVATE_KEY_ABSOLUTE_PATH is missing from environment variables\n"
+                f"\n{variable} is missing from environment variables\n"
             )
-        return self._read_file(_path)
+        return _path
 
-    def _get_id_token_private_key(self):
-        """Return the contents of a private key"""
-        _path = environ.get("ID_TOKEN_PRIVATE_KEY_ABSOLUTE_PATH", "not-set").strip()
-        if _path == "not-set":
-            raise RuntimeError(
-                "\nID_TOKEN_PRIVATE_KEY_ABSOLUTE_PATH is missing from environment variables\n"
-            )
-        return self._read_file(_path)
+    def _get_signer(self, signing_key: str = None) -> JwtSigner:
+        """Return a cached signer for the key, or for the default private key when none is given"""
+        if signing_key:
+            return signer_for_key(signing_key)
+        return signer_for_path(self._get_key_path("JWT_PRIVATE_KEY_ABSOLUTE_PATH"))
 
     async def get_authenticated_with_simulated_auth(self, auth_scope: str = ""):
         """Get the code parameter value required to post to the oauth /token endpoint"""
@@ -119,8 +116,34 @@ class OauthHelper:
         )
         return resp3.json()
 
+    async def get_authenticated_with_mock_auth_async(
+        self, user: str = "9999999999", connector: aiohttp.BaseConnector = None
+    ) -> dict:
+        """Same as get_authenticated_with_mock_auth without blocking the event loop, every login gets its own
+        cookie jar so many can run at once, optionally sharing the connection pool of connector"""
+        authenticator = _MockAuthFlow(
+            self.base_uri, self.client_id, self.client_secret, self.redirect_uri
+        )
+        return await authenticator.authenticate(user, connector=connector)
+
+    async def get_authenticated_with_mock_auth_many(
+        self, users: List[str], concurrency: int = 10
+    ) -> List[dict]:
+        """Log every user in with mock auth concurrently, returns the token responses in the order of users"""
+        connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _authenticate(user):
+            async with semaphore:
+                return await self.get_authenticated_with_mock_auth_async(user, connector=connector)
+
+        try:
+            return list(await asyncio.gather(*(_authenticate(user) for user in users)))
+        finally:
+            await connector.close()
+
     async def _get_default_authorization_code_request_data(
-        self, grant_type, timeout: int = 5000, refresh_token: str = None
+        self, grant_type, timeout: int = 5000, refresh_token: str = None, auth_scope: str = ""
     ) -> dict:
         """Get the default data required for an authorization_code or refresh_token request"""
         form_data = {
@@ -133,7 +156,7 @@ class OauthHelper:
             form_data["_refresh_token_expiry_ms"] = timeout
         else:
             form_data["redirect_uri"] = self.redirect_uri
-            form_data["code"] = await self.get_authenticated_with_simulated_auth()
+            form_data["code"] = await self.get_authenticated_with_simulated_auth(auth_scope=auth_scope)
             form_data["_access_token_expiry_ms"] = timeout
         return form_data
 
@@ -165,10 +188,13 @@ class OauthHelper:
         retry_codes = {429, 503, 409}
         for retry_number in range(max_retries):
             resp = await make_request()
-            if resp.status in retry_codes:
-                await asyncio.sleep(2 ** retry_number - 1)
-                continue
-            return resp
+            if resp.status not in retry_codes:
+                return resp
+
+            delay = retry_after(resp.headers)
+            resp.release()
+            if retry_number < max_retries - 1:
+                await asyncio.sleep(full_jitter(retry_number) if delay is None else delay)
         raise TimeoutError("Maximum retry limit hit.")
 
     async def hit_oauth_endpoint(
@@ -227,6 +253,32 @@ class OauthHelper:
             kwargs["data"] = await func(grant_type, **kwargs)
         return await self.hit_oauth_endpoint("post", "token", data=kwargs["data"])
 
+    async def get_cached_token_response(
+        self, grant_type: str, scope: str = "", kid: str = None, **kwargs
+    ) -> dict:
+        """Get a token response like get_token_response, reusing a live token for the same token endpoint,
+        client_id, grant_type, scope, kid and request arguments (e.g. the id_token_jwt exchanged, or data). Tokens
+        are renewed in the background before they expire, using the refresh_token when there is one, and concurrent
+        callers share a single request to the token endpoint"""
+        jwt_grant = grant_type in ("client_credentials", "token_exchange")
+        # whatever else shapes the request, e.g. the subject of a token exchange, must not share a token
+        request_digest = hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode()).hexdigest()
+        key = (self.base_uri, self.client_id, grant_type, scope, kid, request_digest)
+
+        async def fetch():
+            fetch_kwargs = dict(kwargs)
+            if jwt_grant and "data" not in fetch_kwargs and "_jwt" not in fetch_kwargs:
+                # client assertions are short lived, sign a new one for every request
+                fetch_kwargs["_jwt"] = self.create_jwt(kid=kid)
+            if not jwt_grant and scope:
+                fetch_kwargs["auth_scope"] = scope
+            return await self.get_token_response(grant_type, **fetch_kwargs)
+
+        async def refresh(refresh_token: str):
+            return await self.get_token_response("refresh_token", refresh_token=refresh_token)
+
+        return await token_cache.get(key, fetch, refresh)
+
     def create_jwt(
         self,
         kid: str,
@@ -240,25 +292,46 @@ class OauthHelper:
         if client_id is None:
             # Get default client id
             client_id = self.client_id
-        if not signing_key:
-            # Get default key
-            signing_key = self._get_private_key()
 
         if not claims:
             # Get default claims
-            claims = {
-                "sub": client_id,
-                "iss": client_id,
-                "jti": str(uuid4()),
-                "aud": f"{self.base_uri}/token",
-                "exp": int(time()) + 5,
-            }
+            claims = self._default_jwt_claims(client_id)
 
         headers = ({}, {"kid": kid})[kid is not None]
 
         if kwargs.get("headers", None):
             headers = {**headers, **kwargs["headers"]}
-        return jwt.encode(claims, signing_key, algorithm=algorithm, headers=headers)
+        return self._get_signer(signing_key).sign(claims, algorithm=algorithm, headers=headers)
+
+    def create_jwts(
+        self,
+        n: int,
+        kid: str,
+        signing_key: str = None,
+        algorithm: str = "RS512",
+        client_id: str = None,
+        headers: dict = None,
+        executor: Executor = None,
+        processes: int = None,
+    ) -> List[str]:
+        """Create n client assertion JWTs with the default claims, each with its own jti, for load generation.
+        Signing runs on the threads of executor or in a pool of processes when either is given"""
+        if client_id is None:
+            client_id = self.client_id
+
+        headers = {**({}, {"kid": kid})[kid is not None], **(headers or {})}
+        claims = [self._default_jwt_claims(client_id) for _ in range(n)]
+        return sign_many(self._get_signer(signing_key), claims, algorithm=algorithm, headers=headers,
+                         executor=executor, processes=processes)
+
+    def _default_jwt_claims(self, client_id: str) -> dict:
+        return {
+            "sub": client_id,
+            "iss": client_id,
+            "jti": str(uuid4()),
+            "aud": f"{self.base_uri}/token",
+            "exp": int(time()) + 5,
+        }
 
     def create_id_token_jwt(
         self,
@@ -271,7 +344,7 @@ class OauthHelper:
         """Get the default ID token JWT"""
         if not signing_key:
             # Get default key
-            signing_key = self._get_id_token_private_key()
+            signing_key = signer_for_path(self._get_key_path("ID_TOKEN_PRIVATE_KEY_ABSOLUTE_PATH")).signing_key
 
         if not claims:
             # Get defaults
@@ -404,6 +477,100 @@ class _SimulatedAuthFlow:
                     return params["code"]
 
 
+class _LoginFormParser(HTMLParser):
+    """Finds the action of the mock auth login form, fed a page a chunk at a time"""
+
+    def __init__(self, form_id: str = "kc-form-login"):
+        super().__init__()
+        self.form_id = form_id
+        self.action = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.action is None and tag == "form":
+            attrs = dict(attrs)
+            if attrs.get("id") == self.form_id:
+                self.action = attrs.get("action", "")
+
+
+class _MockAuthFlow:
+    def __init__(
+        self, base_uri: str, client_id: str, client_secret: str, redirect_uri: str
+    ):
+        self.base_uri = base_uri
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+
+    async def _get_login_form_action(self, session: APISessionClient) -> str:
+        """Send an authorize request and read the login page only as far as the login form"""
+        params = {
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "response_type": "code",
+            "state": "1234567890",
+        }
+        async with session.get("authorize", params=params, ssl=False) as resp:
+            if resp.status != 200:
+                raise RuntimeError(json.dumps(await resp.json(), indent=2))
+
+            parser = _LoginFormParser()
+            decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")(errors="replace")
+            async for chunk in resp.content.iter_chunked(16384):
+                parser.feed(decoder.decode(chunk))
+                if parser.action is not None:
+                    return urljoin(str(resp.url), parser.action)
+
+        raise RuntimeError("unable to find the login form kc-form-login")
+
+    async def _get_code(self, session: APISessionClient, form_action: str, user: str) -> str:
+        """Log in and follow the redirects until the one back to the redirect uri, which carries the code"""
+        url, data = form_action, {"username": user}
+        for _ in range(10):
+            request = session.post(url, data=data, allow_redirects=False) if data else \
+                session.get(url, allow_redirects=False)
+            async with request as resp:
+                location = resp.headers.get("Location")
+                if resp.status not in {301, 302, 303, 307, 308} or not location:
+                    headers = dict(resp.headers.items())
+                    throw_friendly_error(
+                        message="unexpected response, unable to authenticate with mock auth",
+                        url=resp.url,
+                        status_code=resp.status,
+                        response=await resp.text(),
+                        headers=headers,
+                    )
+                location = urljoin(str(resp.url), location)
+
+            if location.startswith(self.redirect_uri):
+                return parse_qs(urlparse(location).query)["code"][0]
+            url, data = location, None
+
+        raise RuntimeError("too many redirects, unable to authenticate with mock auth")
+
+    async def authenticate(self, user: str, connector: aiohttp.BaseConnector = None) -> dict:
+        """Authenticate and exchange the code for a token response"""
+        async with APISessionClient(
+            self.base_uri,
+            connector=connector,
+            connector_owner=connector is None,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        ) as session:
+            form_action = await self._get_login_form_action(session)
+            code = await self._get_code(session, form_action, user)
+
+            async with session.post(
+                "token",
+                data={
+                    "grant_type": "authorization_code",
+                    "code": code,
+                    "redirect_uri": self.redirect_uri,
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                },
+            ) as resp:
+                return await resp.json()
+
+
 class _RealAuthFlow:
     def __init__(
         self, base_uri: str, client_id: str, client_secret: str, redirect_uri: str
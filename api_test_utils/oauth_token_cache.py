@@ -0,0 +1,101 @@
+import asyncio
+from time import monotonic
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _CachedToken:
+
+    def __init__(self, response: dict, expires_in: float, expiry_margin: float, refresh_ratio: float):
+        now = monotonic()
+        self.response = response
+        self.expires_at = now + expires_in - expiry_margin
+        self.refresh_at = now + expires_in * refresh_ratio
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        body = self.response.get("body")
+        return body.get("refresh_token") if isinstance(body, dict) else None
+
+
+def _expires_in(response: dict) -> Optional[float]:
+    body = response.get("body")
+    if response.get("status_code") != 200 or not isinstance(body, dict) or "access_token" not in body:
+        return None
+    try:
+        return float(body.get("expires_in"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenCache:
+    """
+        Token responses (as returned by OauthHelper.get_token_response) by key.
+        A token is handed out until expiry_margin seconds before it expires; once refresh_ratio of its lifetime has
+        passed it is renewed in the background, with its refresh_token when it has one. Concurrent callers asking
+        for a key with no usable token share a single request.
+    """
+
+    def __init__(self, expiry_margin: float = 5, refresh_ratio: float = 0.75):
+        self.expiry_margin = expiry_margin
+        self.refresh_ratio = refresh_ratio
+        self._tokens: Dict[Hashable, _CachedToken] = {}
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def invalidate(self, key: Hashable = None):
+        """ Forget the token for key, or every token when no key is given """
+        if key is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(key, None)
+
+    async def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[dict]],
+        refresh: Callable[[str], Awaitable[dict]] = None
+    ) -> dict:
+        """
+            fetch() gets a brand new token response, refresh(refresh_token) exchanges a refresh token for one
+        """
+        cached = self._tokens.get(key)
+        now = monotonic()
+        if cached is not None and now < cached.expires_at:
+            if now >= cached.refresh_at:
+                self._renew(key, fetch, refresh, cached)
+            return cached.response
+
+        return await asyncio.shield(self._renew(key, fetch, refresh, cached))
+
+    def _renew(self, key, fetch, refresh, cached: Optional[_CachedToken]) -> asyncio.Future:
+        task = self._in_flight.get(key)
+        # the cache outlives event loops, e.g. pytest-asyncio's loop per test, which can be closed with a refresh
+        # still pending. Such a task never finishes and cannot be awaited from another loop, start afresh instead
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(key, fetch, refresh, cached))
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # background refreshes nobody waits for must not log 'exception never retrieved'
+            task.exception()
+
+    async def _fetch(self, key, fetch, refresh, cached: Optional[_CachedToken]) -> dict:
+        response = None
+        if refresh is not None and cached is not None and cached.refresh_token:
+            response = await refresh(cached.refresh_token)
+            if _expires_in(response) is None:
+                response = None
+
+        if response is None:
+            response = await fetch()
+
+        expires_in = _expires_in(response)
+        if expires_in is not None:
+            self._tokens[key] = _CachedToken(response, expires_in, self.expiry_margin, self.refresh_ratio)
+        return response
+
+
+token_cache = TokenCache()
@@ -0,0 +1,88 @@
+import json
+from collections import Counter, deque
+from typing import Any, Optional, Union
+
+from multidict import CIMultiDictProxy
+
+from api_test_utils.histogram import LatencyHistogram
+
+
+class LazyBody:
+    """ A response body kept as raw bytes, only decoded when value is read """
+
+    __slots__ = ("raw", "content_type", "charset")
+
+    def __init__(self, raw: bytes, content_type: str, charset: Optional[str]):
+        self.raw = raw
+        self.content_type = content_type.lower()
+        self.charset = charset or "utf-8"
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def value(self) -> Union[str, dict, list, bytes]:
+        """ Decode the body the same way auto_load_body would """
+        if 'json' in self.content_type:
+            try:
+                return json.loads(self.raw.decode(self.charset))
+            except ValueError:
+                return self.raw.decode(self.charset, errors="replace")
+
+        if 'text' in self.content_type or 'xml' in self.content_type:
+            return self.raw.decode(self.charset, errors="replace")
+
+        return self.raw
+
+    def __repr__(self):
+        return f"LazyBody({self.content_type}, {len(self.raw)} bytes)"
+
+    def __str__(self):
+        return str(self.value)
+
+
+class PollHistory(list):
+    """
+        Responses received while polling, oldest first, as (status, headers, body) tuples. A plain list of them
+        unless max_entries or max_bytes is set, then only the most recent max_entries responses, and as many as fit
+        into max_bytes of body, are kept; the status counts and latency histogram cover every response received
+        whatever has been dropped.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizes = deque()
+        self._bytes = 0
+        self.received = 0
+        self.status_counts = Counter()
+        self.latency = LatencyHistogram()
+
+    @property
+    def dropped(self) -> int:
+        return self.received - len(self)
+
+    def record(self, status: int, headers: CIMultiDictProxy, body: Any, size: int = 0, latency: float = None):
+        """ Add a response received and count it, dropping the oldest responses which no longer fit """
+        self.received += 1
+        self.status_counts[status] += 1
+        if latency is not None:
+            self.latency.record(latency)
+
+        self.append((status, headers, body))
+        if self.max_entries is None and self.max_bytes is None:
+            return
+
+        self._sizes.append(size)
+        self._bytes += size
+
+        # always keep the latest response, it is the one reported on a timeout
+        drop = 0
+        while len(self) - drop > 1 and (
+            (self.max_entries is not None and len(self) - drop > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._bytes -= self._sizes.popleft()
+            drop += 1
+        del self[:drop]
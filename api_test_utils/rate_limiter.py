@@ -0,0 +1,129 @@
+import asyncio
+from dataclasses import dataclass, replace
+from time import monotonic
+from typing import Dict, Optional
+
+
+THROTTLED_STATUS_CODES = {429, 503}
+
+
+@dataclass
+class RateLimiterStats:
+    """ Counters for one host, waited is the total seconds requests spent queued for a token or a retry-after """
+    requests: int = 0
+    throttled: int = 0
+    in_flight: int = 0
+    concurrency_limit: float = 0
+    waited: float = 0
+
+
+class _HostLimiter:
+
+    def __init__(self, rate: float, burst: int, concurrency: float, min_concurrency: float, max_concurrency: float,
+                 decrease_factor: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = monotonic()
+        self.paused_until = 0.0
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.decreased_at = 0.0
+        self.waiters = []
+        self.stats = RateLimiterStats(concurrency_limit=concurrency)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _wake(self):
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def acquire(self) -> float:
+        while self.stats.in_flight >= max(int(self.stats.concurrency_limit), 1):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            await waiter
+        self.stats.in_flight += 1
+
+        try:
+            while True:
+                now = monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.stats.requests += 1
+                    return now
+                wait = max(wait, (1 - self.tokens) / self.rate)
+                self.stats.waited += wait
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.stats.in_flight -= 1
+            self._wake()
+            raise
+
+    def release(self, started: float, status: Optional[int], retry_after: Optional[float]):
+        self.stats.in_flight -= 1
+        now = monotonic()
+
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+        if status in THROTTLED_STATUS_CODES:
+            self.stats.throttled += 1
+            # only back off once per round of requests that were already in flight when the throttling started
+            if started > self.decreased_at:
+                self.stats.concurrency_limit = max(
+                    self.min_concurrency, self.stats.concurrency_limit * self.decrease_factor
+                )
+                self.decreased_at = now
+        elif status is not None and status < 500:
+            self.stats.concurrency_limit = min(
+                self.max_concurrency, self.stats.concurrency_limit + 1 / self.stats.concurrency_limit
+            )
+
+        self._wake()
+
+
+class RateLimiter:
+    """
+        Client side throttling which can be shared between APISessionClient instances.
+        Every host gets a token bucket allowing rate requests per second (with bursts of up to burst requests) and a
+        concurrency limit which grows by one per round trip while requests succeed and is cut by decrease_factor when
+        the server answers 429 or 503 (AIMD), a Retry-After header pauses all requests to the host.
+    """
+
+    def __init__(self, rate: float = 10, burst: int = None, concurrency: float = 4, min_concurrency: float = 1,
+                 max_concurrency: float = 64, decrease_factor: float = 0.5):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self._hosts: Dict[str, _HostLimiter] = {}
+
+    def _host(self, host: str) -> _HostLimiter:
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = _HostLimiter(
+                self.rate, self.burst, self.concurrency, self.min_concurrency, self.max_concurrency,
+                self.decrease_factor
+            )
+        return limiter
+
+    async def acquire(self, host: str) -> float:
+        """ Wait for a concurrency slot and a token, returns the start time to hand back to release """
+        return await self._host(host).acquire()
+
+    def release(self, host: str, started: float, status: Optional[int] = None, retry_after: Optional[float] = None):
+        """ Give back the concurrency slot, status None means the request failed without a response """
+        self._host(host).release(started, status, retry_after)
+
+    def stats(self) -> Dict[str, RateLimiterStats]:
+        return {host: replace(limiter.stats) for host, limiter in self._hosts.items()}
@@ -0,0 +1,91 @@
+import asyncio
+from dataclasses import dataclass
+from time import monotonic
+from typing import Awaitable, Callable, List, Optional
+
+import aiohttp
+from aiohttp import ClientResponse
+
+from api_test_utils import PollTimeoutError, is_200, poll_until
+from api_test_utils.api_session_client import APISessionClient
+
+
+@dataclass(frozen=True)
+class ReadinessProbe:
+    """ A service is ready once a GET of url satisfies until, e.g. a docker compose service's health endpoint """
+    name: str
+    url: str
+    until: Callable[[ClientResponse], Awaitable[bool]] = is_200
+
+
+@dataclass
+class ReadinessResult:
+    """ How long a service took to become ready (seconds), time_to_ready is None when it never did """
+    name: str
+    url: str
+    time_to_ready: Optional[float] = None
+    attempts: int = 0
+    last_status: Optional[int] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.time_to_ready is not None
+
+    def __str__(self):
+        if self.ready:
+            return f"{self.name} ready in {self.time_to_ready:.2f}s after {self.attempts} attempts"
+        return f"{self.name} not ready after {self.attempts} attempts, last status {self.last_status}"
+
+
+class ServiceNotReadyError(TimeoutError):
+    """ Raised when services are still not ready once the timeout runs out, holds the result for every service """
+
+    def __init__(self, results: List[ReadinessResult]):
+        self.results = results
+        super().__init__("; ".join(str(result) for result in results if not result.ready))
+
+
+async def _probe(session: APISessionClient, probe: ReadinessProbe, timeout: float, sleep_for: float,
+                 max_sleep_for: float) -> ReadinessResult:
+    result = ReadinessResult(probe.name, probe.url)
+    started = monotonic()
+
+    def make_request():
+        result.attempts += 1
+        return session.get(probe.url)
+
+    async def until(resp: ClientResponse) -> bool:
+        result.last_status = resp.status
+        return await probe.until(resp)
+
+    try:
+        # a service which is not listening yet refuses the connection, keep trying
+        await poll_until(make_request, until=until, body_resolver=None, timeout=timeout, sleep_for=sleep_for,
+                         max_sleep_for=max_sleep_for, retry_on=(aiohttp.ClientConnectionError, asyncio.TimeoutError),
+                         max_history=1)
+    except PollTimeoutError:
+        return result
+
+    result.time_to_ready = monotonic() - started
+    return result
+
+
+async def wait_until_ready(
+    probes: List[ReadinessProbe],
+    timeout: float = 30,
+    sleep_for: float = 0.05,
+    max_sleep_for: float = 1
+) -> List[ReadinessResult]:
+    """
+        Probe every service concurrently until all of them are ready or raise ServiceNotReadyError.
+        Each is first probed after sleep_for seconds, backing off exponentially to max_sleep_for, so a service which
+        comes up quickly is noticed quickly without hammering a slow one.
+    """
+    async with APISessionClient.pooled("", limit_per_host=2) as session:
+        results = list(await asyncio.gather(
+            *(_probe(session, probe, timeout, sleep_for, max_sleep_for) for probe in probes)
+        ))
+
+    if not all(result.ready for result in results):
+        raise ServiceNotReadyError(results)
+    return results
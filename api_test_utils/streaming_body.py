@@ -0,0 +1,285 @@
+import codecs
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple, Union
+from weakref import WeakKeyDictionary
+
+from aiohttp import ClientResponse
+
+from api_test_utils.incremental_json import Incomplete, IncrementalJsonParser
+
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+# the body each streaming resolver produced, so predicates can decide from it without reading the response again
+_streamed: "WeakKeyDictionary[ClientResponse, StreamedBody]" = WeakKeyDictionary()
+
+
+class StreamedBody:
+    """ What a streaming resolver kept of a response body, complete is False when it stopped reading early """
+
+    __slots__ = ("bytes_read", "complete")
+
+    def __init__(self, bytes_read: int = 0, complete: bool = False):
+        self.bytes_read = bytes_read
+        self.complete = complete
+
+    @property
+    def size(self) -> int:
+        """ Bytes of the body held in memory """
+        return 0
+
+
+class PartialBody(StreamedBody):
+    """ Up to the first limit bytes of a response body """
+
+    __slots__ = ("raw", "content_type", "charset")
+
+    def __init__(self, raw: bytes, content_type: str, charset: Optional[str], complete: bool):
+        super().__init__(len(raw), complete)
+        self.raw = raw
+        self.content_type = content_type.lower()
+        self.charset = charset or "utf-8"
+
+    @property
+    def size(self) -> int:
+        return len(self.raw)
+
+    @property
+    def text(self) -> str:
+        # the limit may cut a multi-byte character in half
+        return self.raw.decode(self.charset, errors="replace")
+
+    def __repr__(self):
+        return f"PartialBody({self.content_type}, {len(self.raw)} bytes{'' if self.complete else ', truncated'})"
+
+    def __str__(self):
+        return self.text
+
+
+class JsonPathBody(StreamedBody):
+    """
+        The values found at the json paths asked for, reading stopped once every one of them had been found or
+        as soon as the body turned out not to be json (is_json False)
+    """
+
+    __slots__ = ("values", "is_json")
+
+    def __init__(self, values: Dict[str, Any], bytes_read: int, complete: bool, is_json: bool = True):
+        super().__init__(bytes_read, complete)
+        self.values = values
+        self.is_json = is_json
+
+    def get(self, path: str, default: Any = None) -> Any:
+        return self.values.get(path, default)
+
+    def __getitem__(self, path: str) -> Any:
+        return self.values[path]
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.values
+
+    def __repr__(self):
+        return f"JsonPathBody({self.values}, {self.bytes_read} bytes read{'' if self.is_json else ', not json'})"
+
+
+class HashedBody(StreamedBody):
+    """ The digest of a whole response body, which is never held """
+
+    __slots__ = ("algorithm", "hexdigest")
+
+    def __init__(self, algorithm: str, hexdigest: str, bytes_read: int):
+        super().__init__(bytes_read, complete=True)
+        self.algorithm = algorithm
+        self.hexdigest = hexdigest
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self.hexdigest == other
+        if isinstance(other, HashedBody):
+            return (self.algorithm, self.hexdigest) == (other.algorithm, other.hexdigest)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.algorithm, self.hexdigest))
+
+    def __repr__(self):
+        return f"HashedBody({self.algorithm}:{self.hexdigest}, {self.bytes_read} bytes)"
+
+    def __str__(self):
+        return self.hexdigest
+
+
+def streamed_body(resp: ClientResponse) -> Optional[StreamedBody]:
+    """ The body a streaming resolver read from this response, e.g. in an until predicate:
+
+        async def has_results(resp):
+            return resp.status == 200 and streamed_body(resp).get("total", 0) > 0
+
+        await poll_until(make_request, until=has_results, body_resolver=json_path_body("total"))
+    """
+    return _streamed.get(resp)
+
+
+def _keep(resp: ClientResponse, body: StreamedBody) -> StreamedBody:
+    _streamed[resp] = body
+    return body
+
+
+def first_bytes(limit: int, chunk_size: int = 65536) -> Callable[[ClientResponse], Awaitable[PartialBody]]:
+    """ Resolver reading no more than the first limit bytes of the body, the rest is never downloaded """
+
+    async def _first_bytes(resp: ClientResponse) -> PartialBody:
+        chunks, read = [], 0
+        while read < limit:
+            chunk = await resp.content.read(min(chunk_size, limit - read))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            read += len(chunk)
+
+        return _keep(resp, PartialBody(b"".join(chunks), resp.content_type, resp.charset, resp.content.at_eof()))
+
+    return _first_bytes
+
+
+def _split_path(path: Union[str, Sequence[Union[str, int]]]) -> Tuple[str, ...]:
+    return tuple(str(part) for part in (path.split(".") if isinstance(path, str) else path))
+
+
+class _JsonPathScanner(IncrementalJsonParser):
+    """
+        Walks a json document fed to it a piece at a time, keeping track of where in the document it is and
+        decoding only the values at the paths asked for, everything else is skipped without being decoded
+    """
+
+    def __init__(self, paths: Dict[Tuple[str, ...], str]):
+        super().__init__()
+        self.paths = paths
+        self.values: Dict[str, Any] = {}
+        self.complete = False
+        # [container, key or index] per level we are inside
+        self._stack = []
+        self._state = "value"
+
+    @property
+    def done(self) -> bool:
+        return self.complete or len(self.values) == len(self.paths)
+
+    def _string(self) -> str:
+        match = _STRING.match(self._buffer, self._pos)
+        if match is None:
+            # the closing quote has not arrived yet
+            raise Incomplete()
+        self._pos = match.end()
+        return match.group()
+
+    def feed(self, text: str, final: bool = False) -> bool:
+        """ Raises json.JSONDecodeError as soon as the document turns out not to be json """
+        self._append(text)
+
+        while not self.done and self._skip_whitespace():
+            try:
+                self._step(self._buffer[self._pos], final)
+            except Incomplete:
+                break
+
+        return self.done
+
+    def _step(self, char: str, final: bool):
+        if self._state == "value":
+            path = self.paths.get(tuple(str(frame[1]) for frame in self._stack))
+            if path is not None:
+                self.values[path] = self._decode(final)
+                self._state = "after_value"
+            elif char in "{[":
+                self._pos += 1
+                self._stack.append([char, None if char == "{" else 0])
+                self._state = "key" if char == "{" else "first_item"
+            else:
+                if char == '"':
+                    self._string()
+                else:
+                    # numbers, true, false and null are short, decoding them checks they are valid
+                    self._decode(final)
+                self._state = "after_value"
+                self.complete = not self._stack
+        elif self._state == "first_item":
+            if char == "]":
+                self._pos += 1
+                self._close()
+            else:
+                self._state = "value"
+        elif self._state == "key":
+            if char == "}":
+                self._pos += 1
+                self._close()
+            else:
+                if char != '"':
+                    raise json.JSONDecodeError("Expecting property name", self._buffer, self._pos)
+                self._stack[-1][1] = json.loads(self._string())
+                self._state = "colon"
+        elif self._state == "colon":
+            self._expect(char, ":")
+            self._state = "value"
+        elif char == ",":
+            self._pos += 1
+            if self._stack[-1][0] == "[":
+                self._stack[-1][1] += 1
+                self._state = "value"
+            else:
+                self._state = "key"
+        else:
+            self._expect(char, "]" if self._stack[-1][0] == "[" else "}")
+            self._close()
+
+    def _close(self):
+        self._stack.pop()
+        self._state = "after_value"
+        if not self._stack:
+            self.complete = True
+
+
+def json_path_body(
+    *paths: Union[str, Sequence[Union[str, int]]],
+    chunk_size: int = 65536
+) -> Callable[[ClientResponse], Awaitable[JsonPathBody]]:
+    """
+        Resolver parsing a json body as it arrives and stopping as soon as a value has been found at every path,
+        paths are dotted keys and list indexes e.g. "entry.0.resource.id", or a sequence of them when a key has
+        a dot in it. A body in which a path does not occur is read to its end, one which is not json only until
+        that becomes clear.
+    """
+    wanted = {_split_path(path): path if isinstance(path, str) else ".".join(map(str, path)) for path in paths}
+
+    async def _json_path_body(resp: ClientResponse) -> JsonPathBody:
+        scanner = _JsonPathScanner(wanted)
+        decoder = codecs.getincrementaldecoder(resp.charset or "utf-8")(errors="replace")
+        read, is_json = 0, True
+        try:
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                read += len(chunk)
+                if scanner.feed(decoder.decode(chunk)):
+                    break
+            else:
+                scanner.feed(decoder.decode(b"", final=True), final=True)
+        except json.JSONDecodeError:
+            # not json after all, stop reading and keep whatever was found before it went wrong
+            is_json = False
+
+        return _keep(resp, JsonPathBody(scanner.values, read, resp.content.at_eof(), is_json))
+
+    return _json_path_body
+
+
+def body_hash(algorithm: str = "sha256", chunk_size: int = 65536) -> Callable[[ClientResponse], Awaitable[HashedBody]]:
+    """ Resolver hashing the whole body as it streams past, e.g. to see whether a large document changed """
+
+    async def _body_hash(resp: ClientResponse) -> HashedBody:
+        digest, read = hashlib.new(algorithm), 0
+        async for chunk in resp.content.iter_chunked(chunk_size):
+            digest.update(chunk)
+            read += len(chunk)
+        return _keep(resp, HashedBody(algorithm, digest.hexdigest(), read))
+
+    return _body_hash
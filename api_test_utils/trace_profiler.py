@@ -0,0 +1,100 @@
+from collections import Counter
+from typing import AsyncIterable, Dict, Iterable, Tuple
+
+from api_test_utils.apigee_trace_index import TraceIndex
+from api_test_utils.histogram import LatencyHistogram
+
+
+class TraceProfile:
+    """
+        Latency breakdown of many trace transactions (ms): total time, time waiting on the target, proxy overhead
+        and time per policy and per flow state, each as a histogram so percentiles can be asserted on e.g.
+        assert profile.proxy_overhead.percentile(95) < 50
+    """
+
+    def __init__(self, precision: float = 0.01):
+        self.precision = precision
+        self.transactions = 0
+        self.total = LatencyHistogram(precision)
+        self.target = LatencyHistogram(precision)
+        self.proxy_overhead = LatencyHistogram(precision)
+        self.policies: Dict[str, LatencyHistogram] = {}
+        self.flows: Dict[str, LatencyHistogram] = {}
+        # how many transactions each policy was the slowest in
+        self.slowest_policies = Counter()
+
+    @classmethod
+    def from_indexes(cls, indexes: Iterable[TraceIndex], **kwargs) -> "TraceProfile":
+        profile = cls(**kwargs)
+        for index in indexes:
+            profile.add(index)
+        return profile
+
+    @classmethod
+    async def from_traces(cls, traces: AsyncIterable[Tuple[str, TraceIndex]], **kwargs) -> "TraceProfile":
+        """ Profile the (transaction_id, index) pairs yielded by ApigeeApiTraceDebug.iter_traces() or tail() """
+        profile = cls(**kwargs)
+        async for _, index in traces:
+            profile.add(index)
+        return profile
+
+    def _histogram(self, histograms: Dict[str, LatencyHistogram], name: str) -> LatencyHistogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = LatencyHistogram(self.precision)
+        return histogram
+
+    def add(self, index: TraceIndex) -> "TraceProfile":
+        if index.started is None:
+            # nothing was timed
+            return self
+
+        self.transactions += 1
+        self.total.record(index.total_time)
+        self.target.record(index.target_time)
+        self.proxy_overhead.record(index.proxy_overhead)
+        for policy, timings in index.policy_timings.items():
+            histogram = self._histogram(self.policies, policy)
+            for timing in timings:
+                histogram.record(timing)
+        for state, timings in index.flow_timings.items():
+            # a flow state can be entered more than once, e.g. around a service callout
+            self._histogram(self.flows, state).record(sum(timings))
+
+        slowest = index.slowest_policy
+        if slowest is not None:
+            self.slowest_policies[slowest[0]] += 1
+        return self
+
+    def merge(self, other: "TraceProfile") -> "TraceProfile":
+        self.transactions += other.transactions
+        self.total.merge(other.total)
+        self.target.merge(other.target)
+        self.proxy_overhead.merge(other.proxy_overhead)
+        for histograms, others in ((self.policies, other.policies), (self.flows, other.flows)):
+            for name, histogram in others.items():
+                self._histogram(histograms, name).merge(histogram)
+        self.slowest_policies.update(other.slowest_policies)
+        return self
+
+    def table(self, percentiles: Iterable[float] = (50, 90, 95, 99)) -> Dict[str, Dict[float, float]]:
+        """ Row name to percentile to ms, the policy rows are slowest p95 first """
+        percentiles = list(percentiles)
+        rows = {
+            "total": self.total.percentiles(percentiles),
+            "target": self.target.percentiles(percentiles),
+            "proxy overhead": self.proxy_overhead.percentiles(percentiles),
+        }
+        for prefix, histograms in (("policy", self.policies), ("flow", self.flows)):
+            for name, histogram in sorted(histograms.items(), key=lambda h: -h[1].percentile(95)):
+                rows[f"{prefix} {name}"] = histogram.percentiles(percentiles)
+        return rows
+
+    def format_table(self, percentiles: Iterable[float] = (50, 90, 95, 99)) -> str:
+        percentiles = list(percentiles)
+        table = self.table(percentiles)
+        width = max(len(name) for name in table)
+        lines = [f"{'':<{width}}" + "".join(f"{f'p{p:g}':>10}" for p in percentiles)]
+        for name, row in table.items():
+            lines.append(f"{name:<{width}}" + "".join(f"{v:>10.1f}" for v in row.values()))
+        return "\n".join(lines)
@@ -0,0 +1,152 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+from typing import Callable, Deque, Dict, Iterator, List
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+
+def _remote_chrome(url: str) -> WebDriver:
+    return webdriver.Remote(command_executor=f"{url}/wd/hub", options=webdriver.ChromeOptions())
+
+
+class WebDriverPool:
+    """
+        Chrome sessions reused between tests instead of a browser started per test, spread over one or more
+        chromedriver (selenium standalone) urls with up to size_per_url sessions each, so that many logins can
+        run in parallel threads. Sessions are started when first needed.
+
+        A returned session has its cookies, storage and navigation reset before it is leased again, and is
+        replaced after max_uses leases, or when it failed or could not be reset.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        size_per_url: int = 1,
+        max_uses: int = 20,
+        factory: Callable[[str], WebDriver] = _remote_chrome
+    ):
+        if not urls:
+            raise RuntimeError("A WebDriverPool needs the url of at least one chromedriver")
+        self.urls = list(urls)
+        self.size_per_url = size_per_url
+        self.max_uses = max_uses
+        self.factory = factory
+
+        self._idle: Deque[WebDriver] = deque()
+        # guards everything below, notified whenever a session or a slot for one becomes free
+        self._available = threading.Condition()
+        # url each live session was started on, and how many times it has been leased
+        self._urls: Dict[WebDriver, str] = {}
+        self._uses: Dict[WebDriver, int] = {}
+        self._starting = 0
+        self.started = 0
+        self.recycled = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.urls) * self.size_per_url
+
+    def _least_used_url(self) -> str:
+        live = list(self._urls.values())
+        return min(self.urls, key=live.count)
+
+    def _start(self) -> WebDriver:
+        """ Start a session on the url with the fewest, a slot has already been reserved """
+        with self._available:
+            url = self._least_used_url()
+        try:
+            driver = self.factory(url)
+        except Exception:
+            with self._available:
+                self._starting -= 1
+                self._available.notify()
+            raise
+
+        with self._available:
+            self._starting -= 1
+            self._urls[driver] = url
+            self._uses[driver] = 0
+            self.started += 1
+        return driver
+
+    def lease(self, timeout: float = None) -> WebDriver:
+        """ An idle session, a new one while the pool is not full, otherwise wait up to timeout seconds for one """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._available:
+            while not self._idle and len(self._urls) + self._starting >= self.size:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No webdriver session became free within {timeout} seconds")
+                self._available.wait(remaining)
+
+            driver = self._idle.popleft() if self._idle else None
+            if driver is None:
+                self._starting += 1
+
+        if driver is None:
+            driver = self._start()
+        with self._available:
+            self._uses[driver] += 1
+        return driver
+
+    def release(self, driver: WebDriver, failed: bool = False):
+        """ Give a session back, one which failed or has been used max_uses times is quit rather than reused """
+        if failed or self._uses.get(driver, 0) >= self.max_uses or not self._reset(driver):
+            self._quit(driver)
+            with self._available:
+                self.recycled += 1
+            return
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    @contextmanager
+    def leased(self, timeout: float = None) -> Iterator[WebDriver]:
+        driver = self.lease(timeout)
+        failed = True
+        try:
+            yield driver
+            failed = False
+        finally:
+            self.release(driver, failed=failed)
+
+    @staticmethod
+    def _reset(driver: WebDriver) -> bool:
+        try:
+            try:
+                # every origin's cookies, not just the current page's, chrome only
+                driver.execute("executeCdpCommand", {"cmd": "Network.clearBrowserCookies", "params": {}})
+            except (KeyError, WebDriverException):
+                driver.delete_all_cookies()
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except WebDriverException:
+                # pages such as about:blank have no storage
+                pass
+            driver.get("about:blank")
+            return True
+        except WebDriverException:
+            return False
+
+    def _quit(self, driver: WebDriver):
+        with self._available:
+            self._urls.pop(driver, None)
+            self._uses.pop(driver, None)
+            self._available.notify()
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        """ Quit every idle session, leased ones are quit as they are given back """
+        with self._available:
+            self.max_uses = 0
+            idle, self._idle = list(self._idle), deque()
+        for driver in idle:
+            self._quit(driver)
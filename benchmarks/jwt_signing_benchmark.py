@@ -0,0 +1,58 @@
+"""
+    Client assertion signatures per second when the private key is read and parsed for every signature (as
+    create_jwt used to), with the cached JwtSigner, and with create_jwts on a thread or process pool.
+
+    usage: poetry run python -m benchmarks.jwt_signing_benchmark [signatures]
+"""
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import jwt
+
+from api_test_utils.oauth_helper import OauthHelper
+from tests.oauth_stub import generate_private_key_pem
+
+
+def _report(name: str, signatures: int, elapsed: float):
+    print(f"{name:>24}: {signatures / elapsed:8.0f} signatures/s")
+
+
+def main(signatures: int):
+    with tempfile.NamedTemporaryFile("w", suffix=".pem", delete=False) as key_file:
+        key_file.write(generate_private_key_pem())
+    os.environ["JWT_PRIVATE_KEY_ABSOLUTE_PATH"] = key_file.name
+    os.environ.setdefault("OAUTH_BASE_URI", "https://example.com")
+    os.environ.setdefault("OAUTH_PROXY", "oauth2")
+    oauth = OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+
+    started = perf_counter()
+    for _ in range(signatures):
+        with open(key_file.name, "r") as f:
+            private_key = f.read()
+        jwt.encode(oauth._default_jwt_claims("client"),  # pylint: disable=protected-access
+                   private_key, algorithm="RS512", headers={"kid": "test-1"})
+    _report("read + parse every time", signatures, perf_counter() - started)
+
+    started = perf_counter()
+    for _ in range(signatures):
+        oauth.create_jwt(kid="test-1")
+    _report("cached signer", signatures, perf_counter() - started)
+
+    workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(workers) as executor:
+        started = perf_counter()
+        oauth.create_jwts(signatures, kid="test-1", executor=executor)
+        _report(f"create_jwts {workers} threads", signatures, perf_counter() - started)
+
+    started = perf_counter()
+    oauth.create_jwts(signatures, kid="test-1", processes=workers)
+    _report(f"create_jwts {workers} processes", signatures, perf_counter() - started)
+
+    os.unlink(key_file.name)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,55 @@
+"""
+    Compare tcp connections (and so tls handshakes against the real management api) made when provisioning apps
+    and products with and without a shared pooled session, against a local stub of the Apigee management api.
+
+    usage: poetry run python -m benchmarks.pooled_session_benchmark [iterations]
+"""
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+from api_test_utils.apigee_api import ApigeeApi
+from api_test_utils.apigee_api_apps import ApigeeApiDeveloperApps
+from api_test_utils.apigee_api_products import ApigeeApiProducts
+from tests.apigee_stub import ApigeeStub
+
+
+async def _provision(session=None):
+    product = ApigeeApiProducts(session=session)
+    app = ApigeeApiDeveloperApps(session=session)
+    await product.create_new_product()
+    await app.setup_app(api_products=[product.name], custom_attributes={"foo": "bar"})
+    await app.get_app_details()
+    await app.destroy_app()
+    await product.destroy_product()
+
+
+async def _run(iterations: int, pooled: bool):
+    stub = ApigeeStub()
+    os.environ['APIGEE_API_BASE_URI'] = await stub.start()
+    os.environ.setdefault('APIGEE_API_TOKEN', 'stub-token')
+
+    started = perf_counter()
+    if pooled:
+        async with ApigeeApi.create_pooled_session() as session:
+            for _ in range(iterations):
+                await _provision(session)
+    else:
+        for _ in range(iterations):
+            await _provision()
+    elapsed = perf_counter() - started
+
+    await stub.close()
+    return len(stub.requests), stub.connections, elapsed
+
+
+async def main(iterations: int):
+    for pooled in (False, True):
+        requests, connections, elapsed = await _run(iterations, pooled)
+        print(f"{'pooled' if pooled else 'per request':>12}: {requests} requests, "
+              f"{connections} connections, {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,48 @@
+"""
+    Urls built per second for requests relative to a base uri, as _full_url used to (urlparse and os.path.join on
+    every request, then aiohttp parsing the result into a yarl.URL) and with the pre-parsed base url and its memoized
+    joins, for a few hot paths as a load test would request them.
+
+    usage: poetry run python -m benchmarks.url_join_benchmark [requests]
+"""
+import asyncio
+import os
+import sys
+from time import perf_counter
+from urllib.parse import urlparse
+
+from yarl import URL
+
+from api_test_utils.api_session_client import APISessionClient
+
+_BASE_URI = "https://internal-dev.api.service.nhs.uk/hello-world"
+_PATHS = ["hello/world", "hello/user", "hello/application", "_status", "_ping?verbose=true"]
+
+
+def _legacy_full_url(base_uri: str, url: str) -> URL:
+    if not urlparse(url).scheme:
+        url = os.path.join(base_uri, url)
+    return URL(url)
+
+
+def _report(name: str, requests: int, elapsed: float):
+    print(f"{name:>24}: {requests / elapsed:10.0f} urls/s")
+
+
+async def main(requests: int):
+    paths = [_PATHS[i % len(_PATHS)] for i in range(requests)]
+
+    started = perf_counter()
+    for path in paths:
+        _legacy_full_url(_BASE_URI, path)
+    _report("urlparse + os.path.join", requests, perf_counter() - started)
+
+    async with APISessionClient(_BASE_URI) as session:
+        started = perf_counter()
+        for path in paths:
+            session._full_url(path)  # pylint: disable=protected-access
+        _report("memoized join", requests, perf_counter() - started)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
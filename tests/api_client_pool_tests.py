@@ -0,0 +1,122 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_test_utils.api_client_pool import ApiClientPool
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.api_test_session_config import APITestSessionConfig
+
+
+async def _cookie(request):
+    response = web.json_response({"cookie": request.cookies.get("visit"), "header": request.headers.get("X-Test")})
+    response.set_cookie("visit", "seen")
+    return response
+
+
+@pytest.fixture
+async def cookie_server():
+    app = web.Application()
+    app.router.add_get("/cookie", _cookie)
+    # a host name rather than an ip address, so the cookie jar keeps cookies
+    server = TestServer(app, host="localhost")
+    await server.start_server()
+
+    yield str(server.make_url(""))
+
+    await server.close()
+
+
+@pytest.fixture
+def api_test_config(cookie_server) -> APITestSessionConfig:
+    return APITestSessionConfig(base_uri=cookie_server)
+
+
+async def _get(client: APISessionClient) -> dict:
+    async with client.get("cookie") as resp:
+        return await resp.json()
+
+
+@pytest.mark.asyncio
+async def test_views_share_connections_but_not_cookies_or_headers(cookie_server):
+    pool = ApiClientPool()
+    first = pool.client(cookie_server, headers={"X-Test": "first"})
+    second = pool.client(cookie_server)
+
+    assert await _get(first) == {"cookie": None, "header": "first"}
+    assert await _get(first) == {"cookie": "seen", "header": "first"}
+    await first.close()
+    assert await _get(second) == {"cookie": None, "header": None}
+    await second.close()
+
+    stats = pool.stats[cookie_server]
+    assert (stats.requests, stats.connections, stats.reused) == (3, 1, 2)
+    assert "3 requests, 1 connections opened, 2 reused (67%)" in pool.report()
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_new_event_loop_gets_its_own_connections(cookie_server):
+    pool = ApiClientPool()
+    async with pool.client(cookie_server) as client:
+        await _get(client)
+    await pool.close()
+
+    async with pool.client(cookie_server) as client:
+        await _get(client)
+    assert pool.stats[cookie_server].connections == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pooled_api_client_fixture(pooled_api_client: APISessionClient, api_client_pool: ApiClientPool):
+    assert await _get(pooled_api_client) == {"cookie": None, "header": None}
+    assert await _get(pooled_api_client) == {"cookie": "seen", "header": None}
+    assert api_client_pool.stats[pooled_api_client.base_uri].reused >= 1
+
+
+def test_pooled_api_client_reuses_connections_across_tests_on_a_wider_loop(pytester):
+    pytester.makeconftest("""
+        from api_test_utils.fixtures import api_client_pool, pooled_api_client, pytest_fixture_setup
+    """)
+    pytester.makepyfile(test_pooled="""
+        import asyncio
+
+        import pytest
+        from aiohttp import web
+        from aiohttp.test_utils import TestServer
+
+        from api_test_utils.api_test_session_config import APITestSessionConfig
+
+
+        @pytest.fixture(scope="module")
+        def event_loop():
+            loop = asyncio.new_event_loop()
+            yield loop
+            loop.close()
+
+
+        @pytest.fixture(scope="module")
+        async def server(event_loop):
+            app = web.Application()
+            app.router.add_get("/", lambda request: web.json_response({}))
+            server = TestServer(app)
+            await server.start_server()
+            yield str(server.make_url(""))
+            await server.close()
+
+
+        @pytest.fixture
+        def api_test_config(server):
+            return APITestSessionConfig(base_uri=server)
+
+
+        @pytest.mark.asyncio
+        @pytest.mark.parametrize("attempt", range(3))
+        async def test_get(pooled_api_client, api_client_pool, attempt):
+            async with pooled_api_client.get("") as resp:
+                assert resp.status == 200
+            stats = api_client_pool.stats[pooled_api_client.base_uri]
+            assert (stats.requests, stats.connections) == (attempt + 1, 1)
+    """)
+
+    pytester.runpytest("-p", "no:cacheprovider").assert_outcomes(passed=3)
@@ -70,3 +70,47 @@ async def test_apigee_get_call_back_url(_api):
 async def test_apigee_get_app_details(_api):
     resp = await _api.get_app_details()
     assert resp['status'] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_setup_many_apps(apigee_stub):
+    apigee_stub.latency = 0.01
+    specs = [{"api_products": ["product-a"], "custom_attributes": {"index": str(i)}} for i in range(12)]
+    specs.append({"custom_attributes": ["not", "a", "dict"]})
+
+    results = await ApigeeApiDeveloperApps.setup_many(specs, concurrency=4)
+
+    assert len(results) == 13
+    assert [r.ok for r in results] == [True] * 12 + [False]
+    assert isinstance(results[-1].error, AttributeError)
+    assert apigee_stub.max_in_flight == 4
+    assert apigee_stub.connections <= 4
+
+    for i, result in enumerate(results[:-1]):
+        app = apigee_stub.apps[result.api.name]
+        assert app["credentials"][0]["apiProducts"] == [{"apiproduct": "product-a", "status": "approved"}]
+        assert {"name": "index", "value": str(i)} in app["attributes"]
+        assert result.api.session is None
+
+
+@pytest.mark.asyncio
+async def test_setup_app_in_a_single_request(apigee_stub):
+    app = ApigeeApiDeveloperApps()
+    await app.setup_app(api_products=["product-a", "product-b"], custom_attributes={"foo": "bar"})
+
+    assert len(apigee_stub.requests) == 1
+    stored = apigee_stub.apps[app.name]
+    assert [p["apiproduct"] for p in stored["credentials"][0]["apiProducts"]] == ["product-a", "product-b"]
+    assert stored["attributes"] == [{"name": "DisplayName", "value": app.name}, {"name": "foo", "value": "bar"}]
+
+
+@pytest.mark.asyncio
+async def test_setup_app_falls_back_to_separate_requests(apigee_stub):
+    apigee_stub.inline_create = False
+    app = ApigeeApiDeveloperApps()
+    await app.setup_app(api_products=["product-a"], custom_attributes={"foo": "bar"})
+
+    assert [method for method, _ in apigee_stub.requests] == ["POST", "PUT", "POST"]
+    stored = apigee_stub.apps[app.name]
+    assert [p["apiproduct"] for p in stored["credentials"][0]["apiProducts"]] == ["product-a"]
+    assert stored["attributes"][1] == {"name": "foo", "value": "bar"}
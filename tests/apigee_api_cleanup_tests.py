@@ -0,0 +1,104 @@
+from time import monotonic
+
+import pytest
+
+from api_test_utils.apigee_api_apps import ApigeeApiDeveloperApps
+from api_test_utils.apigee_api_cleanup import cleanup_registry
+from api_test_utils.apigee_api_products import ApigeeApiProducts
+from api_test_utils.apigee_api_proxies import ApigeeApiProxies
+from api_test_utils.apigee_api_trace import ApigeeApiTraceDebug
+
+
+@pytest.fixture
+def registry():
+    cleanup_registry.clear()
+    yield cleanup_registry
+    cleanup_registry.clear()
+
+
+async def _create_resources():
+    proxy = ApigeeApiProxies()
+    await proxy._create_proxy()  # pylint: disable=protected-access
+
+    products = [ApigeeApiProducts() for _ in range(3)]
+    for product in products:
+        await product.setup_product(proxies=[proxy.name])
+
+    apps = [ApigeeApiDeveloperApps() for _ in range(5)]
+    for app in apps:
+        await app.setup_app(api_products=[p.name for p in products])
+
+    return proxy, products, apps
+
+
+@pytest.mark.asyncio
+async def test_cleanup_deletes_in_dependency_order(apigee_stub, registry):
+    await _create_resources()
+    assert len(registry.resources) == 9
+
+    apigee_stub.requests.clear()
+    results = await registry.cleanup(concurrency=3)
+
+    assert all(r.ok for r in results)
+    assert not registry.resources
+    assert not apigee_stub.apps and not apigee_stub.products and not apigee_stub.proxies
+
+    deleted = [path.split('/')[4] for method, path in apigee_stub.requests if method == 'DELETE']
+    assert deleted == ['developers'] * 5 + ['apiproducts'] * 3 + ['apis']
+
+
+@pytest.mark.asyncio
+async def test_destroyed_resources_are_unregistered(apigee_stub, registry):
+    proxy, products, apps = await _create_resources()
+    await apps[0].destroy_app()
+    await products[0].destroy_product()
+    await proxy._destroy_proxy()  # pylint: disable=protected-access
+
+    assert len(registry.resources) == 6
+
+
+@pytest.mark.asyncio
+async def test_cleanup_retries_failures(apigee_stub, registry):
+    await _create_resources()
+
+    apigee_stub.fail_requests = 1
+    results = await registry.cleanup(concurrency=1, retries=2)
+
+    assert all(r.ok for r in results)
+    assert not registry.resources
+
+
+@pytest.mark.asyncio
+async def test_cleanup_reports_resources_it_cannot_delete(apigee_stub, registry):
+    app = ApigeeApiDeveloperApps()
+    await app.create_new_app()
+
+    apigee_stub.fail_requests = 2
+    results = await registry.cleanup(retries=2)
+
+    assert len(results) == 1 and not results[0].ok
+    assert registry.resources == [app]
+
+
+@pytest.mark.asyncio
+async def test_cleanup_treats_resources_already_gone_as_deleted(apigee_stub, registry):
+    app = ApigeeApiDeveloperApps()
+    await app.create_new_app()
+    # deleted behind the registry's back
+    apigee_stub.apps.clear()
+
+    started = monotonic()
+    results = await registry.cleanup(retries=3)
+
+    assert len(results) == 1 and results[0].ok
+    assert not registry.resources
+    # not retried
+    assert monotonic() - started < 0.5
+    assert [method for method, _ in apigee_stub.requests].count('DELETE') == 1
+
+
+def test_only_resources_which_can_be_deleted_are_registered(apigee_stub, registry):
+    with pytest.raises(TypeError):
+        registry.register(ApigeeApiTraceDebug("proxy"))
+
+    assert not registry.resources
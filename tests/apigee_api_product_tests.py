@@ -113,3 +113,77 @@ async def test_apigee_product_environments_updates(_api):
 async def test_apigee_invalid_product_environments_updates(_api):
     with pytest.raises(RuntimeError):
         await _api.update_environments(["invalid"])
+
+
+@pytest.mark.asyncio
+async def test_setup_many_products(apigee_stub):
+    specs = [{"scopes": [f"scope-{i}"], "proxies": ["proxy-a"]} for i in range(5)]
+    specs.insert(2, {"environments": ["prod"]})
+
+    results = await ApigeeApiProducts.setup_many(specs, concurrency=2)
+
+    assert [r.ok for r in results] == [True, True, False, True, True, True]
+    assert isinstance(results[2].error, RuntimeError)
+    assert results[2].api.name not in apigee_stub.products
+    assert apigee_stub.max_in_flight <= 2
+
+    created = [r.api for r in results if r.ok]
+    assert [apigee_stub.products[p.name]["scopes"] for p in created] == [[f"scope-{i}"] for i in range(5)]
+
+
+def _writes(apigee_stub) -> list:
+    return [method for method, _ in apigee_stub.requests if method in ("POST", "PUT")]
+
+
+@pytest.mark.asyncio
+async def test_batch_sends_a_single_update(apigee_stub):
+    product = ApigeeApiProducts()
+    await product.create_new_product()
+
+    async with product.batch():
+        await product.update_scopes(["urn:nhsd:apim:app:level3:test"])
+        await product.update_proxies(["my-proxy"])
+        await product.update_paths(["/"])
+        pending = await product.update_attributes({"foo": "bar"})
+        await product.update_environments(["internal-qa"])
+        product.update_ratelimits(quota=1, quota_interval="1", quota_time_unit="minute", rate_limit="1ps")
+        assert pending["attributes"][2] == {"name": "foo", "value": "bar"}
+        assert _writes(apigee_stub) == ["POST"]
+
+    assert _writes(apigee_stub) == ["POST", "PUT"]
+    stored = apigee_stub.products[product.name]
+    assert stored["scopes"] == ["urn:nhsd:apim:app:level3:test"]
+    assert stored["proxies"] == ["my-proxy"]
+    assert stored["environments"] == ["internal-qa"]
+    assert stored["quota"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_folds_changes_into_create(apigee_stub):
+    product = ApigeeApiProducts()
+
+    async with product.batch():
+        await product.create_new_product()
+        async with product.batch():
+            await product.update_scopes(["urn:nhsd:apim:app:level3:test"])
+        await product.update_proxies(["my-proxy"])
+        assert product.name not in apigee_stub.products
+
+    assert _writes(apigee_stub) == ["POST"]
+    assert apigee_stub.products[product.name]["proxies"] == ["my-proxy"]
+    assert apigee_stub.products[product.name]["scopes"] == ["urn:nhsd:apim:app:level3:test"]
+
+
+@pytest.mark.asyncio
+async def test_batch_sends_nothing_when_it_fails(apigee_stub):
+    product = ApigeeApiProducts()
+    await product.create_new_product()
+
+    with pytest.raises(ValueError):
+        async with product.batch():
+            await product.update_scopes(["urn:nhsd:apim:app:level3:test"])
+            raise ValueError("changed my mind")
+
+    async with product.batch():
+        pass
+    assert _writes(apigee_stub) == ["POST"]
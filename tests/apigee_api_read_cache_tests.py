@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from api_test_utils.apigee_api_apps import ApigeeApiDeveloperApps
+from api_test_utils.apigee_api_products import ApigeeApiProducts
+
+
+def _gets(apigee_stub) -> int:
+    return sum(1 for method, _ in apigee_stub.requests if method == "GET")
+
+
+@pytest.mark.asyncio
+async def test_reads_are_not_cached_by_default(apigee_stub):
+    product = ApigeeApiProducts()
+    await product.create_new_product()
+
+    first = await product.get_product_details()
+    # changed behind our back
+    apigee_stub.products[product.name] = {**first, "scopes": ["changed"]}
+    assert (await product.get_product_details())["scopes"] == ["changed"]
+    assert _gets(apigee_stub) == 2
+
+
+@pytest.mark.asyncio
+async def test_reads_are_cached_until_a_write(apigee_stub):
+    app = ApigeeApiDeveloperApps()
+    app.read_cache_ttl = None
+    await app.setup_app(custom_attributes={"foo": "bar"})
+
+    for _ in range(3):
+        assert (await app.get_custom_attributes())["attribute"][1] == {"name": "foo", "value": "bar"}
+        assert (await app.get_app_details())["name"] == app.name
+    assert _gets(apigee_stub) == 2
+
+    await app.update_custom_attribute("foo", "baz")
+    assert (await app.get_custom_attributes())["attribute"][-1] == {"name": "foo", "value": "baz"}
+    assert _gets(apigee_stub) == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_reads_are_copies(apigee_stub):
+    product = ApigeeApiProducts()
+    product.read_cache_ttl = None
+    await product.create_new_product()
+
+    details = await product.get_product_details()
+    details["scopes"].append("changed")
+    assert (await product.get_product_details())["scopes"] == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_request(apigee_stub):
+    product = ApigeeApiProducts()
+    await product.create_new_product()
+    apigee_stub.latency = 0.05
+
+    results = await asyncio.gather(*(product.get_product_details() for _ in range(10)))
+
+    assert all(r["name"] == product.name for r in results)
+    assert _gets(apigee_stub) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_during_read_is_not_masked(apigee_stub):
+    product = ApigeeApiProducts()
+    await product.create_new_product()
+    apigee_stub.latency = 0.05
+
+    read = asyncio.ensure_future(product.get_product_details())
+    await asyncio.sleep(0.01)
+    await product.update_scopes(["urn:nhsd:apim:app:level3:test"])
+    await read
+
+    apigee_stub.latency = 0
+    assert (await product.get_product_details())["scopes"] == ["urn:nhsd:apim:app:level3:test"]
+
+
+@pytest.mark.asyncio
+async def test_conditional_reads_reuse_unchanged_body(apigee_stub):
+    product = ApigeeApiProducts()
+    product.conditional_reads = True
+    await product.create_new_product()
+
+    first = await product.get_product_details()
+    assert await product.get_product_details() == first
+    assert _gets(apigee_stub) == 2
+
+    # changed behind our back
+    apigee_stub.products[product.name] = {**first, "scopes": ["changed"]}
+    assert (await product.get_product_details())["scopes"] == ["changed"]
@@ -0,0 +1,44 @@
+import pytest
+
+from api_test_utils.apigee_api import ApigeeApi
+from api_test_utils.apigee_api_apps import ApigeeApiDeveloperApps
+from api_test_utils.apigee_api_products import ApigeeApiProducts
+
+
+@pytest.mark.asyncio
+async def test_without_session_every_call_opens_a_connection(apigee_stub):
+    app = ApigeeApiDeveloperApps()
+    await app.setup_app(custom_attributes={"foo": "bar"})
+    await app.get_app_details()
+    await app.destroy_app()
+
+    assert len(apigee_stub.requests) == 3
+    assert apigee_stub.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_pooled_session_is_reused_across_instances(apigee_stub):
+    async with ApigeeApi.create_pooled_session() as session:
+        for _ in range(3):
+            app = ApigeeApiDeveloperApps(session=session)
+            product = ApigeeApiProducts(session=session)
+            await product.create_new_product()
+            await app.setup_app(api_products=[product.name], custom_attributes={"foo": "bar"})
+            await app.destroy_app()
+            await product.destroy_product()
+
+    assert len(apigee_stub.requests) == 12
+    assert apigee_stub.connections == 1
+    assert session.session.closed
+
+
+@pytest.mark.asyncio
+async def test_shared_session_is_left_open_by_operations(apigee_stub):
+    async with ApigeeApi.create_pooled_session() as session:
+        product = ApigeeApiProducts(session=session)
+        await product.create_new_product()
+        assert not session.session.closed
+
+        details = await product.get_product_details()
+        assert details["name"] == product.name
+        await product.destroy_product()
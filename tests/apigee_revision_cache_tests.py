@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from api_test_utils.apigee_api_trace import ApigeeApiTraceDebug
+from api_test_utils.apigee_revision_cache import RevisionCache
+
+
+def _revision_lookups(apigee_stub) -> int:
+    return sum(1 for _, path in apigee_stub.requests if path.endswith(("/revisions", "/deployments")))
+
+
+@pytest.mark.asyncio
+async def test_revision_cache_shares_lookups_and_expires():
+    cache = RevisionCache(ttl=0.1)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return str(len(calls))
+
+    assert await asyncio.gather(*(cache.get("key", fetch) for _ in range(5))) == ["1"] * 5
+    assert await cache.get("key", fetch) == "1"
+    await asyncio.sleep(0.1)
+    assert await cache.get("key", fetch) == "2"
+    cache.invalidate("key")
+    assert await cache.get("key", fetch) == "3"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_not_cached():
+    cache = RevisionCache()
+
+    async def fail():
+        raise RuntimeError("unavailable")
+
+    async def fetch():
+        return "4"
+
+    with pytest.raises(RuntimeError):
+        await cache.get("key", fail)
+    assert await cache.get("key", fetch) == "4"
+
+
+def test_lookup_left_pending_on_a_closed_loop_is_not_reused():
+    cache = RevisionCache()
+
+    async def slow():
+        await asyncio.sleep(10)
+        return "1"
+
+    async def fetch():
+        return "2"
+
+    first_loop = asyncio.new_event_loop()
+    # the caller is cancelled mid-lookup and its loop closed, the shielded lookup is left pending
+    with pytest.raises(asyncio.TimeoutError):
+        first_loop.run_until_complete(asyncio.wait_for(cache.get("key", slow), timeout=0.01))
+    first_loop.close()
+
+    second_loop = asyncio.new_event_loop()
+    try:
+        assert second_loop.run_until_complete(asyncio.wait_for(cache.get("key", fetch), timeout=1)) == "2"
+    finally:
+        second_loop.close()
+
+
+@pytest.mark.asyncio
+async def test_trace_uses_revision_deployed_to_environment(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1", "9", "10"]}
+    apigee_stub.deployments[("apim-test", "internal-dev")] = "9"
+
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+    assert api.revision == "9"
+
+    other = ApigeeApiTraceDebug(proxy="apim-test", environment="internal-qa", org_name="org")
+    await other.start_trace()
+    assert other.revision == "10"
+
+
+@pytest.mark.asyncio
+async def test_revision_is_looked_up_once_across_instances(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1", "2"]}
+    apigee_stub.deployments[("apim-test", "internal-dev")] = "1"
+
+    for _ in range(5):
+        api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+        await api.start_trace()
+        assert api.revision == "1"
+        await api.stop_trace()
+    assert _revision_lookups(apigee_stub) == 1
+
+    apigee_stub.deployments[("apim-test", "internal-dev")] = "2"
+    api.invalidate_revision()
+    await api.start_trace()
+    assert api.revision == "2"
+    assert _revision_lookups(apigee_stub) == 2
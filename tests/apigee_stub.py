@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+class ApigeeStub:
+    """ In-memory stand in for the parts of the Apigee management api used by the ApigeeApi* classes """
+
+    def __init__(self):
+        self.apps = {}
+        self.products = {}
+        self.proxies = {}
+        self.deployments = {}
+        self.debug_sessions = {}
+        self.transactions = {}
+        self.requests = []
+        self.peers = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latency = 0
+        self.fail_requests = 0
+        # when False new apps ignore api products and custom attributes sent with the create
+        self.inline_create = True
+        self.server = None
+
+        org = "/v1/organizations/{org}"
+        app_uri = org + "/developers/{email}/apps"
+        debug_uri = org + "/environments/{env}/apis/{proxy}/revisions/{revision}/debugsessions"
+
+        self.app = web.Application(middlewares=[self._track])
+        self.app.add_routes([
+            web.post(app_uri, self.create_app),
+            web.get(app_uri + "/{name}", self.get_app),
+            web.delete(app_uri + "/{name}", self.delete_app),
+            web.put(app_uri + "/{name}/keys/{key}", self.add_app_products),
+            web.delete(app_uri + "/{name}/keys/{key}/apiproducts/{product}", self.remove_app_product),
+            web.get(app_uri + "/{name}/attributes", self.get_app_attributes),
+            web.post(app_uri + "/{name}/attributes", self.set_app_attributes),
+            web.post(app_uri + "/{name}/attributes/{attribute}", self.update_app_attribute),
+            web.delete(app_uri + "/{name}/attributes/{attribute}", self.delete_app_attribute),
+            web.post(org + "/apiproducts", self.create_product),
+            web.get(org + "/apiproducts/{name}", self.get_product),
+            web.put(org + "/apiproducts/{name}", self.update_product),
+            web.delete(org + "/apiproducts/{name}", self.delete_product),
+            web.post(org + "/apis", self.create_proxy),
+            web.delete(org + "/apis/{name}", self.delete_proxy),
+            web.get(org + "/apis/{name}/revisions", self.get_proxy_revisions),
+            web.get(org + "/environments/{env}/apis/{name}/deployments", self.get_proxy_deployments),
+            web.post(debug_uri, self.create_debug_session),
+            web.delete(debug_uri + "/{session}", self.delete_debug_session),
+            web.get(debug_uri + "/{session}/data", self.list_transactions),
+            web.get(debug_uri + "/{session}/data/{transaction}", self.get_transaction),
+        ])
+
+    @property
+    def connections(self) -> int:
+        """ Number of distinct tcp connections (and so handshakes) the stub has accepted """
+        return len(self.peers)
+
+    @web.middleware
+    async def _track(self, request, handler):
+        self.peers.add(request.transport.get_extra_info('peername'))
+        self.requests.append((request.method, request.path))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.fail_requests:
+                self.fail_requests -= 1
+                return web.json_response({"code": "ServiceUnavailable"}, status=503)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> str:
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return str(self.server.make_url("/v1"))
+
+    async def close(self):
+        await self.server.close()
+
+    @staticmethod
+    def _not_found(name):
+        return web.json_response({"code": "NotFound", "message": f"{name} not found"}, status=404)
+
+    @staticmethod
+    def _json_with_etag(request, data):
+        etag = '"' + hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(data, headers={"ETag": etag})
+
+    async def create_app(self, request):
+        data = await request.json()
+        if not self.inline_create:
+            data.pop("apiProducts", None)
+            data["attributes"] = [a for a in data.get("attributes", []) if a["name"] == "DisplayName"]
+        name = data["name"]
+        if name in self.apps:
+            return web.json_response({"code": "AlreadyExists"}, status=409)
+
+        app = {
+            **data,
+            "credentials": [{
+                "consumerKey": f"key-{len(self.apps)}",
+                "consumerSecret": "secret",
+                "apiProducts": [{"apiproduct": p, "status": "approved"} for p in data.get("apiProducts", [])],
+            }],
+        }
+        app.setdefault("attributes", [])
+        self.apps[name] = app
+        return web.json_response(app, status=201)
+
+    async def get_app(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        return self._json_with_etag(request, app)
+
+    async def delete_app(self, request):
+        app = self.apps.pop(request.match_info["name"], None)
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        return web.json_response(app)
+
+    async def add_app_products(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        data = await request.json()
+        credential = app["credentials"][0]
+        # like apigee, products are added to the key, the ones it already has are kept
+        current = [p["apiproduct"] for p in credential["apiProducts"]]
+        credential["apiProducts"].extend(
+            {"apiproduct": p, "status": "approved"} for p in data["apiProducts"] if p not in current
+        )
+        return web.json_response(credential)
+
+    async def remove_app_product(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        credential = app["credentials"][0]
+        product = request.match_info["product"]
+        remaining = [p for p in credential["apiProducts"] if p["apiproduct"] != product]
+        if len(remaining) == len(credential["apiProducts"]):
+            return self._not_found(product)
+        credential["apiProducts"] = remaining
+        return web.json_response(credential)
+
+    async def get_app_attributes(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        return self._json_with_etag(request, {"attribute": app["attributes"]})
+
+    async def set_app_attributes(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        app["attributes"] = (await request.json())["attribute"]
+        return web.json_response({"attribute": app["attributes"]})
+
+    async def update_app_attribute(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        name = request.match_info["attribute"]
+        attribute = {"name": name, "value": (await request.json())["value"]}
+        app["attributes"] = [a for a in app["attributes"] if a["name"] != name] + [attribute]
+        return web.json_response(attribute)
+
+    async def delete_app_attribute(self, request):
+        app = self.apps.get(request.match_info["name"])
+        if app is None:
+            return self._not_found(request.match_info["name"])
+        name = request.match_info["attribute"]
+        deleted = [a for a in app["attributes"] if a["name"] == name]
+        if not deleted:
+            return self._not_found(name)
+        app["attributes"] = [a for a in app["attributes"] if a["name"] != name]
+        return web.json_response(deleted[0])
+
+    async def create_product(self, request):
+        data = await request.json()
+        if data["name"] in self.products:
+            return web.json_response({"code": "AlreadyExists"}, status=409)
+        self.products[data["name"]] = data
+        return web.json_response(data, status=201)
+
+    async def get_product(self, request):
+        product = self.products.get(request.match_info["name"])
+        if product is None:
+            return self._not_found(request.match_info["name"])
+        return self._json_with_etag(request, product)
+
+    async def update_product(self, request):
+        name = request.match_info["name"]
+        if name not in self.products:
+            return self._not_found(name)
+        self.products[name] = await request.json()
+        return web.json_response(self.products[name])
+
+    async def delete_product(self, request):
+        product = self.products.pop(request.match_info["name"], None)
+        if product is None:
+            return self._not_found(request.match_info["name"])
+        return web.json_response(product)
+
+    async def create_proxy(self, request):
+        data = await request.json()
+        self.proxies[data["name"]] = {"name": data["name"], "revision": ["1"]}
+        return web.json_response(self.proxies[data["name"]], status=201)
+
+    async def delete_proxy(self, request):
+        proxy = self.proxies.pop(request.match_info["name"], None)
+        if proxy is None:
+            return self._not_found(request.match_info["name"])
+        return web.json_response(proxy)
+
+    def add_transaction(self, session: str, transaction_id: str, trace: dict):
+        """ Record a traced request, as Apigee would once one passes through the proxy """
+        self.debug_sessions.setdefault(session, []).append(transaction_id)
+        self.transactions[transaction_id] = trace
+
+    async def get_proxy_revisions(self, request):
+        proxy = self.proxies.get(request.match_info["name"])
+        if proxy is None:
+            return self._not_found(request.match_info["name"])
+        return web.json_response(proxy["revision"])
+
+    async def get_proxy_deployments(self, request):
+        name, environment = request.match_info["name"], request.match_info["env"]
+        revision = self.deployments.get((name, environment))
+        if revision is None:
+            return web.json_response({"code": "distribution.ApplicationNotDeployed"}, status=400)
+        return web.json_response({"environment": environment, "name": name,
+                                  "revision": [{"name": revision, "state": "deployed"}]})
+
+    async def create_debug_session(self, request):
+        name = request.query["session"]
+        self.debug_sessions.setdefault(name, [])
+        return web.json_response({"name": name}, status=201)
+
+    async def delete_debug_session(self, request):
+        name = request.match_info["session"]
+        if self.debug_sessions.pop(name, None) is None:
+            return web.json_response({"message": f"DebugSession {name} not found"}, status=404)
+        return web.json_response({"name": name})
+
+    async def list_transactions(self, request):
+        name = request.match_info["session"]
+        if name not in self.debug_sessions:
+            return web.json_response({"message": f"DebugSession {name} not found"}, status=404)
+        return web.json_response(self.debug_sessions[name])
+
+    async def get_transaction(self, request):
+        trace = self.transactions.get(request.match_info["transaction"])
+        if trace is None:
+            return self._not_found(request.match_info["transaction"])
+        return web.json_response(trace)
@@ -0,0 +1,218 @@
+import asyncio
+import json
+from time import monotonic
+
+import pytest
+
+from api_test_utils.apigee_api_trace import ApigeeApiTraceDebug
+from api_test_utils.apigee_trace_index import TraceIndex
+
+
+def _execution(timestamp: str, *results: dict) -> dict:
+    return {"id": "Execution", "results": [{"ActionResult": "DebugInfo", "timestamp": timestamp}, *results]}
+
+
+def _policy(timestamp: str, name: str) -> dict:
+    return {"id": "Execution", "results": [{
+        "ActionResult": "DebugInfo",
+        "timestamp": timestamp,
+        "properties": {"property": [{"name": "stepDefinition-name", "value": name}]},
+    }]}
+
+
+TRACE = {
+    "completed": True,
+    "point": [
+        {"id": "StateChange", "results": [{
+            "ActionResult": "RequestMessage",
+            "headers": [{"name": "NHSD-ASID", "value": "123456"}, {"name": "Accept", "value": "application/json"}],
+        }]},
+        _policy("17-10-26 10:15:20:100", "OAuthV2.VerifyAccessToken"),
+        _execution("17-10-26 10:15:20:125", {"ActionResult": "VariableAccess", "accessList": [
+            {"Get": {"name": "app.asid", "value": "123456"}},
+            {"Set": {"name": "request.header.x-flag", "value": "first"}},
+        ]}),
+        _policy("17-10-26 10:15:20:130", "AssignMessage.Strip"),
+        _execution("17-10-26 10:15:20:140", {"ActionResult": "VariableAccess", "accessList": [
+            {"Set": {"name": "request.header.x-flag", "value": "second"}},
+        ]}),
+    ],
+}
+
+
+def _assert_indexed(index: TraceIndex):
+    assert index.point_count == 5
+    assert index.fields == {"completed": True}
+    assert index.variable("app.asid") == "123456"
+    assert index.variable("request.header.x-flag") == "first"
+    assert index.variable_values("request.header.x-flag") == ["first", "second"]
+    assert index.variable_values("app.asid", operation="Set") == []
+    assert index.variable("missing") is None
+    assert index.header("nhsd-asid") == "123456"
+    assert index.header_values("ACCEPT") == ["application/json"]
+    assert index.policy_timings["OAuthV2.VerifyAccessToken"] == pytest.approx([25])
+    assert index.policy_timings["AssignMessage.Strip"] == pytest.approx([10])
+
+
+def test_index_from_trace():
+    _assert_indexed(TraceIndex.from_trace(TRACE))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 100000])
+def test_index_from_text_in_chunks(chunk_size):
+    text = json.dumps(TRACE, indent=2)
+    _assert_indexed(TraceIndex.from_text(text[i:i + chunk_size] for i in range(0, len(text), chunk_size)))
+
+
+def test_index_from_text_rejects_malformed_trace():
+    with pytest.raises(ValueError):
+        TraceIndex.from_text(['{"point": [{"id": "Execution"}', ' oops'])
+
+
+@pytest.mark.asyncio
+async def test_trace_is_downloaded_once_for_many_lookups(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1", "2"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+    apigee_stub.add_transaction(api.name, "tx-1", TRACE)
+
+    assert await api.get_apigee_variable_from_trace("app.asid") == "123456"
+    downloads = len(apigee_stub.requests)
+    assert await api.get_apigee_variable_from_trace("request.header.x-flag") == "first"
+    assert (await api.get_trace_index()).header("NHSD-ASID") == "123456"
+    assert len(apigee_stub.requests) == downloads
+
+    apigee_stub.add_transaction(api.name, "tx-2", {"point": []})
+    assert (await api.get_trace_index(refresh=True)).point_count == 5
+
+    await api.stop_trace()
+
+
+@pytest.mark.asyncio
+async def test_trace_index_without_transactions(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+
+    assert await api.get_trace_index() is None
+    assert await api.get_apigee_variable_from_trace("app.asid") is None
+
+
+@pytest.mark.asyncio
+async def test_iter_traces_downloads_every_transaction_with_bounded_concurrency(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+    for n in range(20):
+        apigee_stub.add_transaction(api.name, f"tx-{n}", TRACE)
+    apigee_stub.latency = 0.01
+
+    traces = {transaction_id: index async for transaction_id, index in api.iter_traces(concurrency=4)}
+
+    assert sorted(traces) == sorted(f"tx-{n}" for n in range(20))
+    assert all(index.variable("app.asid") == "123456" for index in traces.values())
+    assert apigee_stub.max_in_flight == 4
+
+    # already downloaded
+    requests = len(apigee_stub.requests)
+    assert [t async for t, _ in api.iter_traces(["tx-3"])] == ["tx-3"]
+    assert len(apigee_stub.requests) == requests
+
+
+@pytest.mark.asyncio
+async def test_iter_traces_stops_downloading_when_caller_stops(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+    for n in range(20):
+        apigee_stub.add_transaction(api.name, f"tx-{n}", TRACE)
+    apigee_stub.latency = 0.01
+
+    traces = api.iter_traces(concurrency=2)
+    async for _ in traces:
+        break
+    await traces.aclose()
+
+    assert len(apigee_stub.requests) < 10
+
+
+async def _traced(apigee_stub, **kwargs) -> ApigeeApiTraceDebug:
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org", **kwargs)
+    await api.start_trace()
+    return api
+
+
+@pytest.mark.asyncio
+async def test_wait_for_transaction_returns_as_soon_as_a_match_is_captured(apigee_stub):
+    api = await _traced(apigee_stub)
+    apigee_stub.add_transaction(api.name, "tx-0", {"point": []})
+
+    async def _capture():
+        await asyncio.sleep(0.2)
+        apigee_stub.add_transaction(api.name, "tx-1", TRACE)
+
+    capture = asyncio.ensure_future(_capture())
+    started = monotonic()
+    transaction_id, index = await api.wait_for_transaction(lambda i: i.header("nhsd-asid") == "123456",
+                                                           timeout=5, sleep_for=0.01)
+    await capture
+
+    assert transaction_id == "tx-1"
+    assert index.variable("app.asid") == "123456"
+    assert monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_wait_for_transaction_times_out(apigee_stub):
+    api = await _traced(apigee_stub)
+    apigee_stub.add_transaction(api.name, "tx-0", {"point": []})
+
+    with pytest.raises(TimeoutError):
+        await api.wait_for_transaction(lambda i: i.point_count > 0, timeout=0.3, sleep_for=0.01)
+
+    # backs off while nothing new arrives
+    assert len(apigee_stub.requests) < 15
+
+
+@pytest.mark.asyncio
+async def test_tail_stops_when_the_debug_session_ends(apigee_stub):
+    api = await _traced(apigee_stub)
+    apigee_stub.add_transaction(api.name, "tx-0", TRACE)
+
+    transactions = []
+    async for transaction_id, _ in api.tail(sleep_for=0.01):
+        transactions.append(transaction_id)
+        del apigee_stub.debug_sessions[api.name]
+
+    assert transactions == ["tx-0"]
+
+
+def test_index_response_codes_and_asid():
+    index = TraceIndex.from_trace({"point": TRACE["point"] + [
+        {"id": "StateChange", "results": [{"ActionResult": "ResponseMessage", "statusCode": "502"}]},
+        {"id": "StateChange", "results": [{"ActionResult": "ResponseMessage", "statusCode": "200"}]},
+    ]})
+
+    assert index.response_codes == [502, 200]
+    assert index.response_code == 200
+    assert index.asid() == {"request_header": "123456", "application_configured": "123456"}
+    assert TraceIndex.from_trace({"point": []}).asid() == {}
+
+
+@pytest.mark.asyncio
+async def test_get_asid_from_trace_reuses_fetched_trace(apigee_stub):
+    api = await _traced(apigee_stub)
+    apigee_stub.add_transaction(api.name, "tx-1", TRACE)
+
+    assert (await api.get_trace_data())["completed"] is True
+    requests = len(apigee_stub.requests)
+    assert await api.get_asid_from_trace() == {"request_header": "123456", "application_configured": "123456"}
+    assert (await api.get_trace_index()).policy_timings["AssignMessage.Strip"] == pytest.approx([10])
+    assert len(apigee_stub.requests) == requests
+
+
+@pytest.mark.asyncio
+async def test_get_asid_from_trace_without_transactions(apigee_stub):
+    api = await _traced(apigee_stub)
+    assert await api.get_asid_from_trace() == {}
@@ -0,0 +1,150 @@
+import json
+from time import monotonic
+
+import pytest
+
+from api_test_utils.apigee_api_cleanup import cleanup_registry
+from api_test_utils.apigee_warm_pool import WarmPool
+
+
+def _pool(tmp_path, **kwargs) -> WarmPool:
+    return WarmPool(size=2, state_file=str(tmp_path / "pool.json"), org_name="org",
+                    product_spec={"scopes": ["urn:nhsd:apim:app:level3:test"]}, custom_attributes={"foo": "bar"},
+                    **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_pool_leases_ready_apps(apigee_stub, tmp_path):
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.wait_ready()
+
+    assert len(pool) == pool.idle == 2
+    assert len(apigee_stub.apps) == len(apigee_stub.products) == 2
+    assert not {a.name for a in cleanup_registry.resources} & {*apigee_stub.apps, *apigee_stub.products}
+
+    async with pool.leased(timeout=1) as pooled:
+        stored = apigee_stub.apps[pooled.app.name]
+        assert stored["credentials"][0]["apiProducts"] == [{"apiproduct": pooled.product.name, "status": "approved"}]
+        assert stored["attributes"][1] == {"name": "foo", "value": "bar"}
+        assert pool.idle == 1
+        await pooled.app.set_custom_attributes({"changed": "by test"})
+        await pooled.product.update_scopes(["changed"])
+
+    await pool.wait_ready()
+    assert pool.idle == 2
+    assert apigee_stub.apps[pooled.app.name]["attributes"][1] == {"name": "foo", "value": "bar"}
+    assert apigee_stub.products[pooled.product.name]["scopes"] == ["urn:nhsd:apim:app:level3:test"]
+    # reset, not recreated
+    assert len(apigee_stub.apps) == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_survives_sessions(apigee_stub, tmp_path):
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.close()
+    saved = json.loads((tmp_path / "pool.json").read_text())
+    assert len(saved["apps"]) == 2
+
+    # a new test session picks the same apps back up
+    creates = len([r for r in apigee_stub.requests if r[0] == "POST"])
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.wait_ready()
+    assert sorted(p.app.name for p in pool._pool) == sorted(a["name"] for a in saved["apps"])
+    assert len([r for r in apigee_stub.requests if r[0] == "POST"]) - creates == 2  # attribute resets only
+    pooled = await pool.lease(timeout=1)
+    assert pooled.app.client_id == apigee_stub.apps[pooled.app.name]["credentials"][0]["consumerKey"]
+    pool.release(pooled)
+
+    await pool.drain()
+    assert not apigee_stub.apps
+    assert not apigee_stub.products
+    assert not (tmp_path / "pool.json").exists()
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_apps_deleted_elsewhere(apigee_stub, tmp_path):
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.close()
+    apigee_stub.apps.clear()
+
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.wait_ready()
+
+    assert pool.idle == 2
+    assert len(apigee_stub.apps) == 2
+    await pool.drain()
+
+
+@pytest.mark.asyncio
+async def test_pool_retries_apps_it_could_not_create(apigee_stub, tmp_path):
+    apigee_stub.fail_requests = 2
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.wait_ready()
+
+    assert len(pool) == pool.idle == 2
+    await pool.drain()
+
+
+@pytest.mark.asyncio
+async def test_lease_fails_once_no_app_can_be_created(apigee_stub, tmp_path):
+    apigee_stub.fail_requests = 1000
+    pool = _pool(tmp_path, create_attempts=2)
+    await pool.start()
+
+    started = monotonic()
+    with pytest.raises(RuntimeError):
+        await pool.lease()
+    assert monotonic() - started < 5
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_products_added_by_a_test_are_taken_off(apigee_stub, tmp_path):
+    pool = _pool(tmp_path)
+    await pool.start()
+
+    async with pool.leased(timeout=1) as pooled:
+        assert await pooled.app.add_api_product(["added-by-test"]) == [
+            {"apiproduct": pooled.product.name, "status": "approved"},
+            {"apiproduct": "added-by-test", "status": "approved"},
+        ]
+
+    await pool.wait_ready()
+    stored = apigee_stub.apps[pooled.app.name]
+    assert stored["credentials"][0]["apiProducts"] == [{"apiproduct": pooled.product.name, "status": "approved"}]
+    await pool.drain()
+
+
+@pytest.mark.asyncio
+async def test_state_file_is_per_worker_and_holds_no_secrets(apigee_stub, tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw1")
+    pool = _pool(tmp_path)
+    await pool.start()
+    await pool.close()
+
+    assert pool.state_file == str(tmp_path / "pool.gw1.json")
+    saved = (tmp_path / "pool.gw1.json").read_text()
+    assert "secret" not in saved
+    assert not (tmp_path / "pool.json").exists()
+
+    # credentials are fetched again when the next session picks the apps up
+    pool = _pool(tmp_path)
+    await pool.start()
+    pooled = await pool.lease(timeout=1)
+    assert pooled.app.client_secret == apigee_stub.apps[pooled.app.name]["credentials"][0]["consumerSecret"]
+    pool.release(pooled)
+    await pool.drain()
+
+
+def test_default_state_file_is_outside_the_working_tree(tmp_path, monkeypatch):
+    monkeypatch.delenv("PYTEST_XDIST_WORKER", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    assert WarmPool().state_file == str(tmp_path / "apim-test-utils" / "apigee_warm_pool.json")
@@ -1,8 +1,15 @@
 import os
 import pytest
 
-from api_test_utils.fixtures import api_client  # pylint: disable=unused-import
+from api_test_utils.fixtures import (  # pylint: disable=unused-import
+    api_client, api_client_pool, pooled_api_client, pytest_fixture_setup
+)
 from api_test_utils.api_test_session_config import APITestSessionConfig
+from api_test_utils.apigee_revision_cache import revision_cache
+from tests.apigee_stub import ApigeeStub
+from tests.oauth_stub import OauthStub, generate_private_key_pem
+
+pytest_plugins = ["pytester"]
 
 
 @pytest.fixture(scope='function')
@@ -11,3 +18,37 @@ def api_test_config() -> APITestSessionConfig:
     os.environ.setdefault('API_BASE_DOMAIN', 'postman-echo.com')
 
     return APITestSessionConfig()
+
+
+@pytest.fixture(scope='function')
+async def apigee_stub(monkeypatch):
+    """ Point the ApigeeApi* classes at a local in-memory management api """
+    stub = ApigeeStub()
+    monkeypatch.setenv('APIGEE_API_BASE_URI', await stub.start())
+    monkeypatch.setenv('APIGEE_API_TOKEN', 'stub-token')
+
+    yield stub
+
+    await stub.close()
+    revision_cache.invalidate()
+
+
+@pytest.fixture(scope='session')
+def private_key_pem() -> str:
+    return generate_private_key_pem()
+
+
+@pytest.fixture(scope='function')
+async def oauth_stub(monkeypatch, tmp_path, private_key_pem):
+    """ Point OauthHelper at a local token endpoint which accepts client assertions signed with private_key_pem """
+    key_path = tmp_path / "private.key"
+    key_path.write_text(private_key_pem)
+
+    stub = OauthStub(private_key_pem)
+    monkeypatch.setenv('OAUTH_BASE_URI', await stub.start())
+    monkeypatch.setenv('OAUTH_PROXY', 'oauth2')
+    monkeypatch.setenv('JWT_PRIVATE_KEY_ABSOLUTE_PATH', str(key_path))
+
+    yield stub
+
+    await stub.close()
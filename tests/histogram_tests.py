@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from api_test_utils.histogram import LatencyHistogram
+
+
+def test_percentiles_within_precision():
+    values = [random.uniform(0.001, 2) for _ in range(10000)]
+    histogram = LatencyHistogram(precision=0.01)
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for percentile in (50, 90, 99, 99.9):
+        exact = values[int(len(values) * percentile / 100) - 1]
+        assert histogram.percentile(percentile) == pytest.approx(exact, rel=0.02)
+
+    assert histogram.count == 10000
+    assert histogram.min == values[0] and histogram.max == values[-1]
+    assert histogram.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0
+    assert histogram.mean == 0
+
+
+def test_merge():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for value in (0.1, 0.2, 0.3):
+        first.record(value)
+    second.record(5, count=3)
+
+    merged = first.merge(second)
+
+    assert merged.count == 6
+    assert merged.max == 5 and merged.min == 0.1
+    assert merged.percentile(100) == pytest.approx(5, rel=0.01)
+    assert merged.percentile(50) == pytest.approx(0.3, rel=0.01)
+
+    with pytest.raises(ValueError):
+        first.merge(LatencyHistogram(precision=0.1))
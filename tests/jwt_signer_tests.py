@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from api_test_utils.jwt_signer import JwtSigner, clear_signer_cache, signer_for_key, signer_for_path
+from api_test_utils.oauth_helper import OauthHelper
+
+
+@pytest.fixture
+def oauth(monkeypatch, tmp_path, private_key_pem):
+    key_path = tmp_path / "private.key"
+    key_path.write_text(private_key_pem)
+    monkeypatch.setenv('OAUTH_BASE_URI', 'https://example.com')
+    monkeypatch.setenv('OAUTH_PROXY', 'oauth2')
+    monkeypatch.setenv('JWT_PRIVATE_KEY_ABSOLUTE_PATH', str(key_path))
+    clear_signer_cache()
+
+    yield OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+
+    clear_signer_cache()
+
+
+def decode(token: str, private_key_pem: str) -> dict:
+    public_key = load_pem_private_key(private_key_pem.encode(), password=None).public_key()
+    return jwt.decode(token, public_key, algorithms=["RS512"], audience="https://example.com/oauth2/token")
+
+
+def test_key_file_is_read_and_parsed_once(oauth, tmp_path, private_key_pem):
+    first = oauth.create_jwt(kid="test-1")
+    (tmp_path / "private.key").write_text("")  # would fail to load if read again
+    second = oauth.create_jwt(kid="test-1")
+
+    assert decode(first, private_key_pem)["jti"] != decode(second, private_key_pem)["jti"]
+    assert jwt.get_unverified_header(second)["kid"] == "test-1"
+    assert signer_for_path(str(tmp_path / "private.key")) is signer_for_key(private_key_pem)
+
+
+def test_hs_signing_key(oauth):
+    token = oauth.create_jwt(kid=None, signing_key="a-shared-secret-at-least-32-bytes-long", algorithm="HS256")
+    assert jwt.decode(token, "a-shared-secret-at-least-32-bytes-long", algorithms=["HS256"],
+                      audience="https://example.com/oauth2/token")
+
+
+@pytest.mark.parametrize("pool", ["sequential", "threads", "processes"])
+def test_create_jwts(oauth, private_key_pem, pool):
+    if pool == "threads":
+        with ThreadPoolExecutor(4) as executor:
+            tokens = oauth.create_jwts(20, kid="test-1", executor=executor)
+    else:
+        tokens = oauth.create_jwts(20, kid="test-1", processes=2 if pool == "processes" else None)
+
+    claims = [decode(token, private_key_pem) for token in tokens]
+    assert len({c["jti"] for c in claims}) == 20
+    assert {c["iss"] for c in claims} == {"client"}
+    assert {jwt.get_unverified_header(token)["kid"] for token in tokens} == {"test-1"}
+
+
+def test_signer_passes_secret_through():
+    assert JwtSigner("secret").key == "secret"
@@ -0,0 +1,97 @@
+import asyncio
+import weakref
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.load_runner import LoadRunner
+
+
+class StubService:
+
+    def __init__(self):
+        self.requests = 0
+        self.peers = set()
+        self.app = web.Application()
+        self.app.router.add_get("/ok", self.ok)
+        self.app.router.add_get("/flaky", self.flaky)
+
+    async def ok(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(0.005)
+        return web.json_response({"ok": True})
+
+    async def flaky(self, _):
+        self.requests += 1
+        if self.requests % 5 == 0:
+            return web.Response(status=500)
+        return web.Response(text="ok")
+
+
+@pytest.fixture
+async def stub_service():
+    service = StubService()
+    server = TestServer(service.app)
+    await server.start_server()
+    service.uri = str(server.make_url("/"))
+
+    yield service
+
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_mode(stub_service):
+    async with APISessionClient.pooled(stub_service.uri, limit_per_host=4) as session:
+        report = await LoadRunner(lambda: session.get("ok"), duration=0.5, concurrency=4).run()
+
+    assert report.requests == stub_service.requests
+    assert report.errors == 0
+    assert report.status_counts == {200: report.requests}
+    assert report.throughput > 100
+    assert len(stub_service.peers) == 4
+    p50, p99 = report.latency.percentile(50), report.latency.percentile(99)
+    assert 0.005 <= p50 <= p99
+    assert "error rate 0.00%" in report.summary()
+
+
+@pytest.mark.asyncio
+async def test_rps_mode(stub_service):
+    async with APISessionClient.pooled(stub_service.uri) as session:
+        report = await LoadRunner(lambda: session.get("flaky"), duration=0.5, rps=100).run()
+
+    assert report.requests == 50
+    assert report.errors == 10
+    assert report.error_rate == pytest.approx(0.2)
+    assert report.status_counts == {200: 40, 500: 10}
+    assert 0.45 < report.elapsed < 1
+
+
+@pytest.mark.asyncio
+async def test_rps_mode_only_holds_requests_in_flight(stub_service):
+    requests, most_alive = [], 0
+
+    async with APISessionClient.pooled(stub_service.uri) as session:
+        def make_request():
+            nonlocal most_alive
+            requests.append(weakref.ref(asyncio.current_task()))
+            most_alive = max(most_alive, sum(1 for request in requests if request() is not None))
+            return session.get("ok")
+
+        report = await LoadRunner(make_request, duration=0.5, rps=200, concurrency=10).run()
+
+    assert report.requests == 100
+    assert most_alive <= 10
+
+
+@pytest.mark.asyncio
+async def test_connection_errors_are_counted():
+    async with APISessionClient("http://127.0.0.1:9") as session:
+        report = await LoadRunner(lambda: session.get("ok"), duration=0.1, rps=50, concurrency=2).run()
+
+    assert report.requests == 5
+    assert report.errors == 5
+    assert report.status_counts == {None: 5}
@@ -0,0 +1,29 @@
+import pytest
+
+from api_test_utils.oauth_helper import OauthHelper
+
+
+@pytest.fixture
+def oauth(oauth_stub):  # pylint: disable=unused-argument
+    return OauthHelper(client_id="client", client_secret="secret", redirect_uri="https://example.com/callback")
+
+
+@pytest.mark.asyncio
+async def test_mock_auth_async(oauth, oauth_stub):
+    resp = await oauth.get_authenticated_with_mock_auth_async(user="9912003888")
+
+    assert resp["user"] == "9912003888"
+    assert "access_token" in resp
+    assert oauth_stub.token_requests[-1]["redirect_uri"] == "https://example.com/callback"
+    assert not oauth_stub.login_sessions
+
+
+@pytest.mark.asyncio
+async def test_mock_auth_many(oauth, oauth_stub):
+    users = [str(9000000000 + i) for i in range(25)]
+
+    responses = await oauth.get_authenticated_with_mock_auth_many(users, concurrency=5)
+
+    assert [r["user"] for r in responses] == users
+    assert len({r["access_token"] for r in responses}) == 25
+    assert not oauth_stub.codes
@@ -0,0 +1,106 @@
+from uuid import uuid4
+
+import jwt
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+def generate_private_key_pem() -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+class OauthStub:
+    """ Local stand in for the identity service oauth proxy """
+
+    def __init__(self, private_key_pem: str, expires_in: int = 600):
+        self.public_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None).public_key()
+        self.expires_in = expires_in
+        self.token_requests = []
+        self.login_sessions = {}
+        self.codes = {}
+        self.server = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/oauth2/token", self.token)
+        self.app.router.add_get("/oauth2/authorize", self.authorize)
+        self.app.router.add_post("/login", self.login)
+        self.app.router.add_get("/oauth2/callback", self.callback)
+
+    async def start(self) -> str:
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return str(self.server.make_url(""))
+
+    async def close(self):
+        await self.server.close()
+
+    def _token_response(self, **extra):
+        return web.json_response({
+            "access_token": str(uuid4()),
+            "expires_in": str(self.expires_in),
+            "token_type": "Bearer",
+            **extra
+        })
+
+    async def token(self, request):
+        data = await request.post()
+        self.token_requests.append(dict(data))
+
+        if data.get("grant_type") in ("client_credentials", "urn:ietf:params:oauth:grant-type:token-exchange"):
+            try:
+                jwt.decode(data["client_assertion"], self.public_key, algorithms=["RS512"],
+                           audience=str(request.url))
+            except (KeyError, jwt.InvalidTokenError):
+                return web.json_response({"error": "invalid_request"}, status=401)
+            if "subject_token" in data:
+                return self._token_response(subject=data["subject_token"])
+            return self._token_response()
+
+        if data.get("grant_type") == "authorization_code":
+            user = self.codes.pop(data.get("code"), None)
+            if user is None:
+                return web.json_response({"error": "invalid_grant"}, status=400)
+            return self._token_response(refresh_token=str(uuid4()), user=user)
+
+        if data.get("grant_type") == "refresh_token":
+            return self._token_response(refresh_token=str(uuid4()))
+
+        return web.json_response({"error": "unsupported_grant_type"}, status=400)
+
+    async def authorize(self, request):
+        """ A mock auth login page, padded out so the form is only a small part of it """
+        session_id = str(uuid4())
+        self.login_sessions[session_id] = {"redirect_uri": request.query["redirect_uri"],
+                                           "state": request.query["state"]}
+        login_url = request.url.with_path("/login").with_query({"session_code": session_id, "tab_id": "1"})
+        page = (
+            "<html><head><title>Log in</title></head><body>"
+            f'<form id="kc-form-login" action="{str(login_url).replace("&", "&amp;")}" method="post">'
+            '<input name="username"/></form>'
+            f"<p>{'x' * 200000}</p></body></html>"
+        )
+        response = web.Response(text=page, content_type="text/html")
+        response.set_cookie("AUTH_SESSION_ID", session_id)
+        return response
+
+    async def login(self, request):
+        session_id = request.query.get("session_code")
+        if request.cookies.get("AUTH_SESSION_ID") != session_id or session_id not in self.login_sessions:
+            return web.Response(status=400, text="cookie not found")
+        self.login_sessions[session_id]["user"] = (await request.post())["username"]
+        raise web.HTTPFound(request.url.with_path("/oauth2/callback").with_query(
+            {"code": f"keycloak-{session_id}", "session_code": session_id}
+        ))
+
+    async def callback(self, request):
+        session = self.login_sessions.pop(request.query["session_code"])
+        code = str(uuid4())
+        self.codes[code] = session["user"]
+        raise web.HTTPFound(f"{session['redirect_uri']}?code={code}&state={session['state']}")
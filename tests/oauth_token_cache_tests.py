@@ -0,0 +1,156 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from api_test_utils.oauth_helper import OauthHelper
+from api_test_utils.oauth_token_cache import TokenCache, token_cache
+
+
+def token_response(expires_in: float = 600, refresh_token: str = None, status_code: int = 200):
+    body = {"access_token": str(uuid4()), "expires_in": str(expires_in)}
+    if refresh_token:
+        body["refresh_token"] = refresh_token
+    return {"status_code": status_code, "body": body}
+
+
+class CountingFetch:
+
+    def __init__(self, delay: float = 0, **kwargs):
+        self.delay = delay
+        self.kwargs = kwargs
+        self.calls = 0
+
+    async def __call__(self, *args):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return token_response(**self.kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_request():
+    cache = TokenCache()
+    fetch = CountingFetch(delay=0.05)
+
+    responses = await asyncio.gather(*(cache.get("key", fetch) for _ in range(20)))
+
+    assert fetch.calls == 1
+    assert len({r["body"]["access_token"] for r in responses}) == 1
+
+    await cache.get("key", fetch)
+    await cache.get("other-key", fetch)
+    assert fetch.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_tokens_are_fetched_again():
+    cache = TokenCache(expiry_margin=0.1)
+    fetch = CountingFetch(expires_in=0.2)
+
+    first = await cache.get("key", fetch)
+    await asyncio.sleep(0.15)
+    second = await cache.get("key", fetch)
+
+    assert fetch.calls == 2
+    assert first != second
+
+
+@pytest.mark.asyncio
+async def test_token_is_refreshed_in_the_background_with_refresh_token():
+    cache = TokenCache(expiry_margin=0, refresh_ratio=0.5)
+    fetch = CountingFetch(expires_in=1, refresh_token="refresh-me")
+    refreshed_with = []
+
+    async def refresh(refresh_token):
+        refreshed_with.append(refresh_token)
+        await asyncio.sleep(0.05)
+        return token_response(expires_in=1, refresh_token="refresh-me-again")
+
+    first = await cache.get("key", fetch, refresh)
+    await asyncio.sleep(0.6)
+
+    # past half its lifetime, still handed out while the refresh runs
+    assert await cache.get("key", fetch, refresh) == first
+    await asyncio.sleep(0.1)
+
+    refreshed = await cache.get("key", fetch, refresh)
+    assert refreshed != first
+    assert refreshed["body"]["refresh_token"] == "refresh-me-again"
+    assert refreshed_with == ["refresh-me"]
+    assert fetch.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_responses_are_not_cached():
+    cache = TokenCache()
+    fetch = CountingFetch(status_code=401)
+
+    await cache.get("key", fetch)
+    await cache.get("key", fetch)
+    assert fetch.calls == 2
+
+
+def test_refresh_left_pending_on_a_closed_loop_is_not_reused():
+    cache = TokenCache(expiry_margin=0, refresh_ratio=0)
+    fetch = CountingFetch()
+
+    first_loop = asyncio.new_event_loop()
+    first_loop.run_until_complete(cache.get("key", fetch))
+    # past refresh_at, starts a refresh which is still pending when the loop is closed
+    first_loop.run_until_complete(cache.get("key", CountingFetch(delay=10)))
+    first_loop.close()
+
+    cache.invalidate("key")
+    second_loop = asyncio.new_event_loop()
+    try:
+        response = second_loop.run_until_complete(asyncio.wait_for(cache.get("key", fetch), timeout=1))
+        assert response["status_code"] == 200
+        assert fetch.calls == 2
+    finally:
+        second_loop.close()
+
+
+@pytest.mark.asyncio
+async def test_oauth_helper_caches_client_credentials(oauth_stub):
+    token_cache.invalidate()
+    oauth = OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+
+    responses = await asyncio.gather(*(
+        oauth.get_cached_token_response("client_credentials", kid="test-1") for _ in range(10)
+    ))
+    other_kid = await oauth.get_cached_token_response("client_credentials", kid="test-2")
+
+    assert {r["status_code"] for r in responses} == {200}
+    assert len({r["body"]["access_token"] for r in responses}) == 1
+    assert other_kid["body"]["access_token"] != responses[0]["body"]["access_token"]
+    assert len(oauth_stub.token_requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_oauth_helper_does_not_share_tokens_between_subjects(oauth_stub):
+    token_cache.invalidate()
+    oauth = OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+
+    alice = await oauth.get_cached_token_response("token_exchange", kid="test-1", id_token_jwt="alice")
+    bob = await oauth.get_cached_token_response("token_exchange", kid="test-1", id_token_jwt="bob")
+    alice_again = await oauth.get_cached_token_response("token_exchange", kid="test-1", id_token_jwt="alice")
+
+    assert (alice["body"]["subject"], bob["body"]["subject"]) == ("alice", "bob")
+    assert alice_again["body"]["access_token"] == alice["body"]["access_token"]
+    assert bob["body"]["access_token"] != alice["body"]["access_token"]
+    assert len(oauth_stub.token_requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_oauth_helper_does_not_share_tokens_between_token_endpoints(oauth_stub):
+    token_cache.invalidate()
+    oauth = OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+    other = OauthHelper(client_id="client", client_secret="secret", redirect_uri="http://example.com")
+    # the same stub under another name
+    other.base_uri = oauth.base_uri.replace("127.0.0.1", "localhost")
+
+    first = await oauth.get_cached_token_response("client_credentials", kid="test-1")
+    second = await other.get_cached_token_response("client_credentials", kid="test-1")
+
+    assert first["body"]["access_token"] != second["body"]["access_token"]
+    assert len(oauth_stub.token_requests) == 2
@@ -1,7 +1,15 @@
+import socket
+from time import monotonic
+
+import aiohttp
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 from api_test_utils.api_test_session_config import APITestSessionConfig
-from api_test_utils import poll_until, PollTimeoutError
+from api_test_utils import poll_until, poll_until_all, poll_until_any, PollTimeoutError, MultiPollTimeoutError
+from api_test_utils import lazy_body
+from api_test_utils.poll_history import LazyBody
 
 from api_test_utils.api_session_client import APISessionClient
 
@@ -107,3 +115,140 @@ async def test_wait_for_200_json_brotli(api_client: APISessionClient):
     assert status == 200
     assert headers.get('Content-Type').split(';')[0] == 'application/json'
     assert body['brotli'] is True
+
+
+@pytest.fixture
+async def ready_after_client():
+    """ /ready-after/{n} answers 404 until it has been called n times, /retry-after/{s} sends a Retry-After """
+    calls = {}
+
+    async def ready_after(request):
+        calls[request.path] = calls.get(request.path, 0) + 1
+        if calls[request.path] < int(request.match_info["n"]):
+            return web.json_response({"calls": calls[request.path]}, status=404)
+        return web.json_response({"calls": calls[request.path]})
+
+    async def retry_after(request):
+        calls[request.path] = calls.get(request.path, 0) + 1
+        if calls[request.path] == 1:
+            return web.Response(status=503, headers={"Retry-After": request.match_info["s"]})
+        return web.json_response({"calls": calls[request.path]})
+
+    app = web.Application()
+    app.router.add_get("/ready-after/{n}", ready_after)
+    app.router.add_get("/retry-after/{s}", retry_after)
+    server = TestServer(app)
+    await server.start_server()
+
+    async with APISessionClient(str(server.make_url("/"))) as session:
+        yield session
+
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_poll_until_all_polls_targets_concurrently(ready_after_client: APISessionClient):
+
+    targets = [lambda n=n: ready_after_client.get(f"ready-after/{n}") for n in (1, 3, 5)]
+
+    all_responses = await poll_until_all(targets, timeout=5, sleep_for=0.01, max_sleep_for=0.05)
+
+    assert [len(responses) for responses in all_responses] == [1, 3, 5]
+    assert [responses[-1][2]["calls"] for responses in all_responses] == [1, 3, 5]
+    assert all(status == 404 for status, _, _ in all_responses[2][:-1])
+
+
+@pytest.mark.asyncio
+async def test_poll_until_all_timeout_reports_pending_targets(ready_after_client: APISessionClient):
+
+    targets = [lambda n=n: ready_after_client.get(f"ready-after/{n}") for n in (1, 1000, 2)]
+
+    with pytest.raises(MultiPollTimeoutError) as exec_info:
+        await poll_until_all(targets, timeout=0.5, sleep_for=0.01, max_sleep_for=0.05)
+
+    error = exec_info.value  # type: MultiPollTimeoutError
+    assert isinstance(error, PollTimeoutError)
+    assert error.pending == [1]
+    assert error.responses[-1][0] == 404
+    assert len(error.all_responses[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_poll_until_all_raises_a_target_error_straight_away(ready_after_client: APISessionClient):
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        # nothing is listening, the connection is refused
+        refused = f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+    targets = [lambda: ready_after_client.get("ready-after/1000"), lambda: ready_after_client.get(refused)]
+
+    started = monotonic()
+    with pytest.raises(aiohttp.ClientConnectionError):
+        await poll_until_all(targets, timeout=3, sleep_for=0.01, max_sleep_for=0.05)
+
+    assert monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_poll_until_any_returns_first_satisfied(ready_after_client: APISessionClient):
+
+    targets = [lambda n=n: ready_after_client.get(f"ready-after/{n}") for n in (1000, 2, 1000)]
+
+    index, responses = await poll_until_any(targets, timeout=5, sleep_for=0.01, max_sleep_for=0.05)
+
+    assert index == 1
+    assert [status for status, _, _ in responses] == [404, 200]
+
+
+@pytest.mark.asyncio
+async def test_poll_until_all_honours_retry_after(ready_after_client: APISessionClient):
+
+    started = monotonic()
+    all_responses = await poll_until_all([lambda: ready_after_client.get("retry-after/1")], sleep_for=0.01)
+
+    assert monotonic() - started >= 1
+    assert [status for status, _, _ in all_responses[0]] == [503, 200]
+
+
+@pytest.mark.asyncio
+async def test_poll_until_returns_a_list(ready_after_client: APISessionClient):
+
+    responses = await poll_until(lambda: ready_after_client.get("ready-after/3"), sleep_for=0.01)
+
+    assert isinstance(responses, list)
+    assert responses == [(404, responses[0][1], {"calls": 1}), (404, responses[1][1], {"calls": 2}),
+                         (200, responses[2][1], {"calls": 3})]
+    assert responses + [] == list(responses)
+    assert responses.received == 3 and responses.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_poll_until_history_is_bounded(ready_after_client: APISessionClient):
+
+    responses = await poll_until(lambda: ready_after_client.get("ready-after/10"), sleep_for=0.01, max_history=3)
+
+    assert len(responses) == 3
+    assert responses.received == 10
+    assert responses.dropped == 7
+    assert responses[-1][2] == {"calls": 10}
+    assert responses.status_counts == {404: 9, 200: 1}
+    assert responses.latency.count == 10
+    assert 0 < responses.latency.percentile(50) <= responses.latency.percentile(99)
+
+
+@pytest.mark.asyncio
+async def test_poll_until_lazy_bodies_within_byte_budget(ready_after_client: APISessionClient):
+
+    with pytest.raises(PollTimeoutError) as exec_info:
+        await poll_until(lambda: ready_after_client.get("ready-after/1000"), body_resolver=lazy_body,
+                         timeout=0.5, sleep_for=0.01, max_history_bytes=40)
+
+    responses = exec_info.value.responses
+    assert responses.received > 5
+    assert len(responses) == 3  # each body is {"calls": n} i.e. 12 or 13 bytes
+    status, _, body = responses[-1]
+    assert status == 404
+    assert isinstance(body, LazyBody)
+    assert body.value == {"calls": responses.received}
+    assert f"last body:{{'calls': {responses.received}}}" in str(exec_info.value)
@@ -0,0 +1,197 @@
+import asyncio
+from time import monotonic, time
+from email.utils import formatdate
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.backoff import full_jitter, retry_after
+from api_test_utils.rate_limiter import RateLimiter
+
+
+class ThrottlingServer:
+    """ Answers 429 whenever more than capacity requests are in flight """
+
+    def __init__(self, capacity: int = 3, retry_after_first: int = None):
+        self.capacity = capacity
+        self.retry_after_first = retry_after_first
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_get("/", self.handle)
+
+    async def handle(self, _):
+        self.requests += 1
+        if self.retry_after_first and self.requests == 1:
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after_first)})
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.in_flight > self.capacity:
+                return web.Response(status=429)
+            await asyncio.sleep(0.01)
+            return web.Response(text="ok")
+        finally:
+            self.in_flight -= 1
+
+
+def server_host(uri: str) -> str:
+    return uri.split("//")[1].split(":")[0]
+
+
+@pytest.fixture
+async def throttling_server():
+    servers = []
+
+    async def _start(**kwargs):
+        throttling = ThrottlingServer(**kwargs)
+        server = TestServer(throttling.app)
+        await server.start_server()
+        servers.append(server)
+        return throttling, str(server.make_url("/"))
+
+    yield _start
+
+    for server in servers:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_backs_off_on_429(throttling_server):
+    server, uri = await throttling_server(capacity=3)
+    limiter = RateLimiter(rate=1000, concurrency=12)
+
+    async with APISessionClient(uri, rate_limiter=limiter) as session:
+        async def _get():
+            async with session.get("", allow_retries=True, max_retries=10) as resp:
+                return resp.status
+
+        statuses = await asyncio.gather(*(_get() for _ in range(60)))
+
+    assert set(statuses) == {200}
+    stats = limiter.stats()[server_host(uri)]
+    assert stats.throttled > 0
+    assert stats.concurrency_limit < 12
+    assert stats.in_flight == 0
+    assert stats.requests == server.requests
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_is_respected(throttling_server):
+    server, uri = await throttling_server(capacity=3)
+    limiter = RateLimiter(rate=1000, concurrency=3, max_concurrency=3)
+
+    async with APISessionClient(uri, rate_limiter=limiter) as session:
+        async def _get():
+            async with session.get("") as resp:
+                return resp.status
+
+        statuses = await asyncio.gather(*(_get() for _ in range(30)))
+
+    assert set(statuses) == {200}
+    assert server.max_in_flight <= 3
+    assert limiter.stats()[server_host(uri)].throttled == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_is_held_until_the_body_is_read():
+    in_flight = max_in_flight = 0
+
+    async def _slow_body(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            response = web.StreamResponse()
+            await response.prepare(request)
+            await asyncio.sleep(0.05)
+            await response.write(b"slow body")
+            await response.write_eof()
+            return response
+        finally:
+            in_flight -= 1
+
+    app = web.Application()
+    app.router.add_get("/", _slow_body)
+    server = TestServer(app)
+    await server.start_server()
+    uri = str(server.make_url("/"))
+    limiter = RateLimiter(rate=1000, concurrency=1, max_concurrency=1)
+
+    async with APISessionClient(uri, rate_limiter=limiter) as session:
+        async def _get():
+            async with session.get("") as resp:
+                assert limiter.stats()[server_host(uri)].in_flight == 1
+                return await resp.text()
+
+        bodies = await asyncio.gather(*(_get() for _ in range(3)))
+
+    await server.close()
+    assert bodies == ["slow body"] * 3
+    assert max_in_flight == 1
+    assert limiter.stats()[server_host(uri)].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_is_given_back_when_retries_run_out(throttling_server):
+    _, uri = await throttling_server(capacity=0)
+    limiter = RateLimiter(rate=1000, concurrency=1, max_concurrency=1)
+
+    async with APISessionClient(uri, rate_limiter=limiter) as session:
+        with pytest.raises(TimeoutError):
+            async with session.get("", allow_retries=True, max_retries=2):
+                pass
+        assert limiter.stats()[server_host(uri)].in_flight == 0
+
+        async def _get():
+            async with session.get("") as resp:
+                return resp.status
+
+        assert await asyncio.wait_for(_get(), timeout=1) == 429
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate(throttling_server):
+    _, uri = await throttling_server(capacity=100)
+    limiter = RateLimiter(rate=20, burst=1, concurrency=10)
+
+    started = monotonic()
+    async with APISessionClient(uri, rate_limiter=limiter) as session:
+        async def _get():
+            async with session.get("") as resp:
+                return resp.status
+
+        await asyncio.gather(*(_get() for _ in range(6)))
+
+    assert monotonic() - started >= 0.24
+    assert limiter.stats()[server_host(uri)].waited > 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured(throttling_server):
+    _, uri = await throttling_server(retry_after_first=1)
+
+    started = monotonic()
+    async with APISessionClient(uri, rate_limiter=RateLimiter()) as session:
+        async with session.get("", allow_retries=True) as resp:
+            assert resp.status == 200
+
+    assert monotonic() - started >= 1
+
+
+def test_retry_after_parsing():
+    assert retry_after({"Retry-After": "3"}) == 3
+    assert 8 < retry_after({"Retry-After": formatdate(time() + 10, usegmt=True)}) <= 10
+    assert retry_after({"Retry-After": "soon"}) is None
+    assert retry_after({}) is None
+    assert retry_after(None) is None
+
+
+def test_full_jitter_is_bounded():
+    delays = [full_jitter(attempt, base=0.5, cap=4) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= d <= 4 for d in delays)
+    assert len(set(delays)) > 1
@@ -0,0 +1,92 @@
+import socket
+from time import monotonic
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_test_utils import poll_until
+from api_test_utils.readiness import ReadinessProbe, ServiceNotReadyError, wait_until_ready
+from api_test_utils.api_session_client import APISessionClient
+
+
+def _starting_app(ready_after: float) -> web.Application:
+    started = monotonic()
+
+    async def _status(request):  # pylint: disable=unused-argument
+        if monotonic() - started < ready_after:
+            return web.json_response({"value": {"ready": False}}, status=503)
+        return web.json_response({"value": {"ready": True}})
+
+    app = web.Application()
+    app.router.add_get("/status", _status)
+    return app
+
+
+@pytest.fixture
+async def starting_server():
+    server = TestServer(_starting_app(ready_after=0.3))
+    await server.start_server()
+
+    yield str(server.make_url("/status"))
+
+    await server.close()
+
+
+@pytest.fixture
+def unused_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # nothing is listening, every connection is refused
+    return f"http://127.0.0.1:{port}/status"
+
+
+@pytest.mark.asyncio
+async def test_wait_until_ready_reports_time_to_ready(starting_server):
+    results = await wait_until_ready(
+        [ReadinessProbe("starting", starting_server), ReadinessProbe("again", starting_server)],
+        timeout=5, sleep_for=0.01, max_sleep_for=0.1
+    )
+
+    for result in results:
+        assert result.ready
+        assert 0.3 <= result.time_to_ready < 2
+        assert result.attempts > 1
+        assert result.last_status == 200
+    assert str(results[0]).startswith("starting ready in ")
+
+
+@pytest.mark.asyncio
+async def test_wait_until_ready_keeps_probing_a_refused_connection(unused_url, starting_server):
+    with pytest.raises(ServiceNotReadyError) as e:
+        await wait_until_ready(
+            [ReadinessProbe("down", unused_url), ReadinessProbe("starting", starting_server)],
+            timeout=1, sleep_for=0.01, max_sleep_for=0.1
+        )
+
+    down, starting = e.value.results
+    assert not down.ready
+    assert down.attempts > 1
+    assert down.last_status is None
+    assert starting.ready
+    assert str(e.value) == str(down)
+
+
+@pytest.mark.asyncio
+async def test_poll_until_backs_off_up_to_max_sleep_for(unused_url):
+    attempts = []
+
+    async with APISessionClient("") as session:
+        def make_request():
+            attempts.append(monotonic())
+            return session.get(unused_url)
+
+        with pytest.raises(TimeoutError):
+            await poll_until(make_request, timeout=1, sleep_for=0.05, max_sleep_for=0.2,
+                             retry_on=(OSError,))
+
+    gaps = [b - a for a, b in zip(attempts, attempts[1:])]
+    assert 4 <= len(attempts) <= 8
+    assert gaps[0] < 0.15
+    assert max(gaps) < 0.35
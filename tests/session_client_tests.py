@@ -90,6 +90,10 @@ class MockStatus:
     """Mocks a Response status"""
     def __init__(self, status):
         self.status = status
+        self.headers = {}
+
+    def release(self):
+        pass
 
 
 def mock_response(code):
@@ -120,3 +124,27 @@ async def test_retry_request_varying_error():
             await session._retry_requests(requester, max_retries=3) # pylint: disable=W0212
             error = excinfo.value
             assert error == "Maximum retry limit hit."
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("base_uri, url, expected", [
+    ("https://example.com/api", "apps/my-app?x=1", "https://example.com/api/apps/my-app?x=1"),
+    ("https://example.com/api/", "apps/my-app", "https://example.com/api/apps/my-app"),
+    ("https://example.com/api", "", "https://example.com/api/"),
+    ("https://example.com/api", "/status", "https://example.com/status"),
+    ("https://example.com/api", "http://other.com/ping", "http://other.com/ping"),
+])
+async def test_full_url_joins_to_base_uri(base_uri, url, expected):
+    async with APISessionClient(base_uri) as session:
+        assert str(session._full_url(url)) == expected  # pylint: disable=W0212
+        # memoized
+        assert session._full_url(url) == session._full_url(url)  # pylint: disable=W0212
+
+
+@pytest.mark.asyncio
+async def test_full_url_cache_follows_base_uri():
+    async with APISessionClient("https://example.com/a") as session:
+        assert str(session._full_url("ping")) == "https://example.com/a/ping"  # pylint: disable=W0212
+        session.base_uri = "https://example.com/b"
+        assert str(session._full_url("ping")) == "https://example.com/b/ping"  # pylint: disable=W0212
+        assert session.base_url.host == "example.com"
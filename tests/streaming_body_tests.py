@@ -0,0 +1,174 @@
+import hashlib
+import json
+from time import monotonic
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_test_utils import poll_until, PollTimeoutError
+from api_test_utils.api_session_client import APISessionClient
+from api_test_utils.streaming_body import (
+    body_hash, first_bytes, json_path_body, streamed_body, _JsonPathScanner, _split_path
+)
+
+_BUNDLE = {
+    "resourceType": "Bundle",
+    "type": "searchset",
+    "total": 2,
+    "entry": [
+        {"resource": {"id": "a.1", "name": [{"given": ["Joë", "\"quoted\""]}], "active": True}},
+        {"resource": {"id": "b", "empty": {}, "none": [], "score": -1.5e3}},
+    ],
+    "padding": ["x" * 1000] * 2000,
+}
+
+
+async def _html(request):  # pylint: disable=unused-argument
+    response = web.StreamResponse(headers={"Content-Type": "text/html"})
+    await response.prepare(request)
+    for _ in range(200):
+        await response.write(b"<html>" + b"x" * 65530)
+    await response.write_eof()
+    return response
+
+
+async def _bundle(request):  # pylint: disable=unused-argument
+    body = json.dumps(_BUNDLE).encode("utf-8")
+    response = web.StreamResponse(headers={"Content-Type": "application/fhir+json; charset=utf-8"})
+    response.content_length = len(body)
+    await response.prepare(request)
+    for i in range(0, len(body), 4096):
+        await response.write(body[i:i + 4096])
+    await response.write_eof()
+    return response
+
+
+@pytest.fixture
+async def bundle_client():
+    app = web.Application()
+    app.router.add_get("/bundle", _bundle)
+    app.router.add_get("/html", _html)
+    server = TestServer(app)
+    await server.start_server()
+
+    async with APISessionClient(str(server.make_url("/"))) as session:
+        yield session
+
+    await server.close()
+
+
+def _scan(text: str, *paths, chunk: int = 1) -> _JsonPathScanner:
+    scanner = _JsonPathScanner({_split_path(path): path for path in paths})
+    for i in range(0, len(text), chunk):
+        if scanner.feed(text[i:i + chunk]):
+            return scanner
+    scanner.feed("", final=True)
+    return scanner
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 7, 100000])
+def test_scanner_finds_values_however_the_document_is_split(chunk):
+    text = json.dumps(_BUNDLE, indent=1)
+    scanner = _scan(text, "total", "entry.0.resource.name.0.given", "entry.1.resource.score", "entry.1.resource.id",
+                    chunk=chunk)
+
+    assert scanner.values == {
+        "total": 2,
+        "entry.0.resource.name.0.given": ["Joë", "\"quoted\""],
+        "entry.1.resource.score": -1500.0,
+        "entry.1.resource.id": "b",
+    }
+    # stopped before the padding
+    assert not scanner.complete
+
+
+def test_scanner_reads_to_the_end_for_missing_paths():
+    scanner = _scan('{"a": [1, {"b": null}], "c": {}}', "a.1.b", "missing", chunk=2)
+
+    assert scanner.values == {"a.1.b": None}
+    assert scanner.complete
+
+
+def test_scanner_decodes_a_number_cut_short():
+    assert _scan('{"total": 12345}', "total", chunk=2).values == {"total": 12345}
+
+
+@pytest.mark.parametrize("text", ["<html><body>", '{"a": 1, <', '{"a": [1, 2 3]}', '{"a": tru}', '{"a": 1]'])
+def test_scanner_raises_as_soon_as_the_document_is_not_json(text):
+    scanner = _JsonPathScanner({("missing",): "missing"})
+
+    with pytest.raises(json.JSONDecodeError):
+        for i in range(len(text)):
+            scanner.feed(text[i])
+        scanner.feed("", final=True)
+
+
+@pytest.mark.asyncio
+async def test_json_path_body_stops_reading_a_body_which_is_not_json(bundle_client):
+    started = monotonic()
+    async with bundle_client.get("html") as resp:
+        body = await json_path_body("total")(resp)
+
+    assert not body.is_json
+    assert body.values == {}
+    assert body.bytes_read <= 2 * 65536
+    assert "not json" in repr(body)
+    assert monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_json_path_body_stops_reading_early(bundle_client):
+    async with bundle_client.get("bundle") as resp:
+        body = await json_path_body("total", ("entry", 0, "resource", "id"), chunk_size=4096)(resp)
+        size = resp.content_length
+
+    assert body.values == {"total": 2, "entry.0.resource.id": "a.1"}
+    assert body["total"] == 2
+    assert not body.complete
+    assert body.bytes_read < size / 100
+
+
+@pytest.mark.asyncio
+async def test_first_bytes(bundle_client):
+    async with bundle_client.get("bundle") as resp:
+        body = await first_bytes(10)(resp)
+
+    assert body.raw == b'{"resource'
+    assert body.text == '{"resource'
+    assert not body.complete
+    assert "truncated" in repr(body)
+
+
+@pytest.mark.asyncio
+async def test_body_hash(bundle_client):
+    expected = hashlib.sha256(json.dumps(_BUNDLE).encode("utf-8")).hexdigest()
+
+    async with bundle_client.get("bundle") as resp:
+        body = await body_hash(chunk_size=1024)(resp)
+
+    assert body == expected
+    assert body.complete
+    assert body.bytes_read == resp.content_length
+    assert body.size == 0
+
+
+@pytest.mark.asyncio
+async def test_poll_until_decides_from_a_partial_body(bundle_client):
+
+    async def has_two_results(resp):
+        return streamed_body(resp).get("total") == 2
+
+    responses = await poll_until(lambda: bundle_client.get("bundle"), until=has_two_results,
+                                 body_resolver=json_path_body("total"), max_history_bytes=1)
+
+    assert len(responses) == 1
+    assert responses[0][2]["total"] == 2
+
+    async def has_three_results(resp):
+        return streamed_body(resp).get("total") == 3
+
+    with pytest.raises(PollTimeoutError) as e:
+        await poll_until(lambda: bundle_client.get("bundle"), until=has_three_results,
+                         body_resolver=json_path_body("total"), timeout=0.5, sleep_for=0.1)
+    assert "JsonPathBody({'total': 2}" in str(e.value)
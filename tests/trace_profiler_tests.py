@@ -0,0 +1,90 @@
+import pytest
+
+from api_test_utils.apigee_api_trace import ApigeeApiTraceDebug
+from api_test_utils.apigee_trace_index import TraceIndex
+from api_test_utils.trace_profiler import TraceProfile
+
+
+def _state(millis: int, state: str) -> dict:
+    return {"id": "StateChange", "results": [{
+        "ActionResult": "DebugInfo",
+        "timestamp": f"17-10-26 10:15:20:{millis:03d}",
+        "properties": {"property": [{"name": "To", "value": state}]},
+    }]}
+
+
+def _policy(millis: int, name: str) -> dict:
+    return {"id": "Execution", "results": [{
+        "ActionResult": "DebugInfo",
+        "timestamp": f"17-10-26 10:15:20:{millis:03d}",
+        "properties": {"property": [{"name": "stepDefinition-name", "value": name}]},
+    }]}
+
+
+def _trace(target_ms: int) -> dict:
+    return {"point": [
+        _state(0, "PROXY_REQ_FLOW"),
+        _policy(0, "VerifyAccessToken"),
+        _policy(20, "AssignMessage"),
+        _state(25, "REQ_SENT"),
+        _state(25 + target_ms, "PROXY_RESP_FLOW"),
+        _policy(25 + target_ms, "FlowCallout"),
+        _state(35 + target_ms, "END"),
+    ]}
+
+
+def test_index_timings():
+    index = TraceIndex.from_trace(_trace(100))
+
+    assert index.total_time == pytest.approx(135)
+    assert index.target_time == pytest.approx(100)
+    assert index.proxy_overhead == pytest.approx(35)
+    assert index.flow_timings == {
+        "PROXY_REQ_FLOW": pytest.approx([25]), "REQ_SENT": pytest.approx([100]),
+        "PROXY_RESP_FLOW": pytest.approx([10]), "END": [0],
+    }
+    assert index.policy_timings == {
+        "VerifyAccessToken": pytest.approx([20]), "AssignMessage": pytest.approx([5]),
+        "FlowCallout": pytest.approx([10]),
+    }
+    assert index.slowest_policy == ("VerifyAccessToken", pytest.approx(20))
+
+
+def test_profile_percentiles_across_transactions():
+    profile = TraceProfile.from_indexes(TraceIndex.from_trace(_trace(target)) for target in range(1, 101))
+
+    assert profile.transactions == 100
+    assert profile.target.percentile(50) == pytest.approx(50, rel=0.02)
+    assert profile.target.percentile(95) == pytest.approx(95, rel=0.02)
+    assert profile.proxy_overhead.percentile(95) == pytest.approx(35, rel=0.02)
+    assert profile.policies["AssignMessage"].count == 100
+    assert profile.slowest_policies == {"VerifyAccessToken": 100}
+
+    table = profile.table([50, 99])
+    assert list(table)[:4] == ["total", "target", "proxy overhead", "policy VerifyAccessToken"]
+    assert table["flow REQ_SENT"][99] == pytest.approx(99, rel=0.02)
+    assert "policy FlowCallout" in profile.format_table()
+
+
+def test_profile_merge():
+    first = TraceProfile.from_indexes([TraceIndex.from_trace(_trace(10))])
+    second = TraceProfile.from_indexes([TraceIndex.from_trace(_trace(30)), TraceIndex.from_trace({"point": []})])
+
+    merged = first.merge(second)
+    assert merged.transactions == 2
+    assert merged.target.max == pytest.approx(30)
+    assert merged.flows["REQ_SENT"].count == 2
+
+
+@pytest.mark.asyncio
+async def test_profile_traces_of_a_debug_session(apigee_stub):
+    apigee_stub.proxies["apim-test"] = {"name": "apim-test", "revision": ["1"]}
+    api = ApigeeApiTraceDebug(proxy="apim-test", org_name="org")
+    await api.start_trace()
+    for n in range(10):
+        apigee_stub.add_transaction(api.name, f"tx-{n}", _trace(10 * (n + 1)))
+
+    profile = await api.profile_traces(concurrency=3)
+
+    assert profile.transactions == 10
+    assert profile.target.max == pytest.approx(100)
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from api_test_utils import fixtures
+from api_test_utils.webdriver_pool import WebDriverPool
+
+
+class FakeDriver:
+    """ Records the calls the pool makes on a webdriver session """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.calls = []
+        self.quit_called = False
+        self.broken = False
+
+    def execute(self, command, params):
+        self.calls.append((command, params["cmd"]))
+
+    def delete_all_cookies(self):
+        self.calls.append("delete_all_cookies")
+
+    def execute_script(self, script):
+        self.calls.append("execute_script")
+
+    def get(self, url):
+        if self.broken:
+            raise WebDriverException("session deleted")
+        self.calls.append(("get", url))
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_sessions_are_reused_and_reset():
+    pool = WebDriverPool(["http://chromedriver:4444"], factory=FakeDriver)
+
+    with pool.leased() as first:
+        pass
+    with pool.leased() as second:
+        pass
+
+    assert first is second
+    assert pool.started == 1
+    assert first.calls[:3] == [("executeCdpCommand", "Network.clearBrowserCookies"), "execute_script",
+                               ("get", "about:blank")]
+
+
+def test_sessions_are_recycled():
+    pool = WebDriverPool(["http://chromedriver:4444"], max_uses=2, factory=FakeDriver)
+
+    drivers = []
+    for _ in range(3):
+        with pool.leased() as driver:
+            drivers.append(driver)
+    assert drivers[0] is drivers[1] is not drivers[2]
+    assert drivers[0].quit_called
+
+    # failed, or could not be reset
+    with pytest.raises(ValueError):
+        with pool.leased() as driver:
+            raise ValueError("test failed")
+    assert driver.quit_called
+
+    with pool.leased() as driver:
+        driver.broken = True
+    assert driver.quit_called
+    assert pool.started == 3
+    assert pool.recycled == 3
+
+
+def test_sessions_spread_over_urls_and_wait_when_full():
+    pool = WebDriverPool(["http://one:4444", "http://two:4444"], factory=FakeDriver)
+
+    first, second = pool.lease(), pool.lease()
+    assert {first.url, second.url} == {"http://one:4444", "http://two:4444"}
+
+    with pytest.raises(TimeoutError):
+        pool.lease(timeout=0.05)
+
+    threading.Timer(0.05, pool.release, args=(first, True)).start()
+    started = time.monotonic()
+    third = pool.lease(timeout=5)
+    assert time.monotonic() - started < 1
+    assert third.url == first.url
+
+    pool.release(second)
+    pool.close()
+    assert second.quit_called
+    pool.release(third)
+    assert third.quit_called
+
+
+_SESSION_TESTS = """
+    drivers = []
+
+
+    def test_passes(webdriver_session):
+        drivers.append(webdriver_session)
+
+
+    def test_reuses_the_session(webdriver_session):
+        assert webdriver_session is drivers[0]
+
+
+    def test_fails(webdriver_session):
+        assert False
+
+
+    def test_gets_a_new_session(webdriver_session, pool):
+        assert drivers[0].quit_called
+        assert webdriver_session is not drivers[0]
+        assert (pool.started, pool.recycled) == (2, 1)
+"""
+
+
+def test_webdriver_session_fixture_quits_the_session_of_a_failed_test(pytester):
+    pytester.makeconftest("""
+        import pytest
+
+        from api_test_utils.fixtures import webdriver_session
+        from api_test_utils.webdriver_pool import WebDriverPool
+        from tests.webdriver_pool_tests import FakeDriver
+
+        shared = WebDriverPool(["http://chromedriver:4444"], factory=FakeDriver)
+
+
+        @pytest.fixture
+        def webdriver_service():
+            return "http://chromedriver:4444"
+
+
+        @pytest.fixture
+        def webdriver_pool():
+            return shared
+
+
+        @pytest.fixture
+        def pool():
+            return shared
+    """)
+    pytester.makepyfile(test_sessions=_SESSION_TESTS)
+
+    pytester.runpytest("-p", "no:cacheprovider").assert_outcomes(passed=3, failed=1)
+
+
+def test_webdriver_session_fixture_has_a_pool_of_its_own(pytester):
+    pytester.makeconftest("""
+        import functools
+
+        import pytest
+
+        from api_test_utils import fixtures
+        from api_test_utils.fixtures import webdriver_session
+        from api_test_utils.webdriver_pool import WebDriverPool
+        from tests.webdriver_pool_tests import FakeDriver
+
+
+        @pytest.fixture
+        def webdriver_service():
+            return "http://chromedriver:4444"
+
+
+        @pytest.fixture(autouse=True)
+        def fake_chrome(monkeypatch):
+            monkeypatch.setattr(fixtures, "WebDriverPool", functools.partial(WebDriverPool, factory=FakeDriver))
+
+
+        @pytest.fixture
+        def pool(webdriver_session):
+            return fixtures._default_webdriver_pools["http://chromedriver:4444"]
+    """)
+    pytester.makepyfile(test_sessions=_SESSION_TESTS)
+
+    pytester.runpytest("-p", "no:cacheprovider").assert_outcomes(passed=3, failed=1)
+    # closed when pytest exits
+    assert not fixtures._default_webdriver_pools  # pylint: disable=protected-access